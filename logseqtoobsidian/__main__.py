@@ -1,15 +1,44 @@
 import argparse
+import json
 import logging
 import os
 import re
 import shutil
+import sys
 
 import logseqtoobsidian.convert_notes
+from logseqtoobsidian.attachments import ATTACHMENT_LAYOUTS, attachment_store
+from logseqtoobsidian.batch import load_manifest, run_batch
+from logseqtoobsidian.checkpoint import RESUME_CHECKPOINT_EVERY, Checkpoint
 from logseqtoobsidian.convert_notes import (
+    add_aliases_to_page_names,
+    build_alias_index,
     convert_contents,
+    convert_page,
     copy_journals,
     copy_pages,
+    decode_page,
+    is_unaffected_by_rules,
+    journal_path_and_names,
+    page_path_and_names,
 )
+from logseqtoobsidian.graph_input import ArchiveGraph, open_graph
+from logseqtoobsidian.memory import MemoryTracker
+from logseqtoobsidian.output import ArchiveOutput, DirectoryOutput, DryRunOutput, parse_archive_path
+from logseqtoobsidian.page_index import load_page_index, save_page_index
+from logseqtoobsidian.page_table import PageTable
+from logseqtoobsidian.server import ConversionServer
+from logseqtoobsidian.subgraph import select_pages
+from logseqtoobsidian.pipeline import convert_contents_pipelined
+from logseqtoobsidian.processes import convert_contents_in_processes
+from logseqtoobsidian.shards import (
+    in_shard,
+    merge_shards,
+    page_map_digest,
+    parse_shard,
+    write_shard_manifest,
+)
+from logseqtoobsidian.verify import verify_vault
 
 
 class CustomFormatter(logging.Formatter):
@@ -31,25 +60,45 @@ class CustomFormatter(logging.Formatter):
         return super().format(record)
 
 
-def main():
-    # Set up logging with custom formatter
-    handler = logging.StreamHandler()
-    handler.setFormatter(CustomFormatter("%(levelname)s: %(message)s"))
-    logger = logging.getLogger()
-    logger.addHandler(handler)
-    logger.setLevel(logging.DEBUG)
+def positive_int(value: str) -> int:
+    """Parses an integer of at least 1, for use as an argparse type"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got '{value}'")
+    return number
 
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "--logseq", help="base directory of logseq graph", required=True
+        "--logseq",
+        help="base directory of logseq graph, or a zip or tar archive of it which is read without extracting it",
+        required=True,
     )
-    parser.add_argument(
-        "--output", help="base directory where output should go", required=True
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument(
+        "--output", help="base directory where output should go"
+    )
+    output.add_argument(
+        "--output_archive",
+        type=parse_archive_path,
+        help="write the output straight into this archive instead of a directory - .zip, .tar, .tar.gz, .tar.bz2, "
+        + ".tar.xz or .tar.zst (which needs Python 3.14 or the zstandard package)",
     )
     parser.add_argument(
         "--assets_dir", help="directory where assets are copied", default="attachments", required=False
     )
+    parser.add_argument(
+        "--attachment_layout",
+        choices=ATTACHMENT_LAYOUTS,
+        default="per_page",
+        help="where assets are copied: 'per_page' puts them in the assets directory next to each page embedding them, "
+        + "'shared' stores each asset once in the assets directory at the root of the output",
+    )
     parser.add_argument(
         "--dryrun",
         help="don't actually do anything, just see what would happen",
@@ -63,6 +112,26 @@ def main():
         action="store_true",
         help="overwrites output directory if included",
     )
+    parser.add_argument(
+        "--update_output",
+        default=False,
+        action="store_true",
+        help="writes into an existing output directory, only copying assets and files that changed since the last run",
+    )
+    parser.add_argument(
+        "--copy_hash",
+        default=False,
+        action="store_true",
+        help="compare the contents of assets and files with a hash, rather than their size and modification time, "
+        + "to decide if they changed since the last run",
+    )
+    parser.add_argument(
+        "--write_if_changed",
+        default=False,
+        action="store_true",
+        help="writes into an existing output directory, leaving every page, asset and file whose contents didn't "
+        + "change untouched, so that their modification time isn't bumped",
+    )
     parser.add_argument(
         "--unindent_once",
         default=False,
@@ -93,73 +162,569 @@ def main():
         action="store_true",
         help="Convert #[[long tags]] to [[long tags]]",
     )
+    parser.add_argument(
+        "--engine",
+        choices=sorted(logseqtoobsidian.convert_notes.ENGINES),
+        default="lines",
+        help="how pages are converted: 'lines' applies every rule to every line, 'outline' parses each page into "
+        + "blocks first, leaving code blocks untouched and only converting spaces to tabs in indentation, 'multiline' "
+        + "gives the same output as 'lines' but applies each rule to the whole page at once, which is faster",
+    )
+    parser.add_argument(
+        "--resume",
+        default=False,
+        action="store_true",
+        help="resume an interrupted run into the same output directory, only converting the pages it hadn't finished",
+    )
+    parser.add_argument(
+        "--checkpoint_every",
+        type=int,
+        default=0,
+        help="record the progress of the run in the output directory every this many pages, so that it can be "
+        + "resumed with --resume - 0, the default, disables checkpoints, and --resume records one every "
+        + f"{RESUME_CHECKPOINT_EVERY} pages unless given",
+    )
+    parser.add_argument(
+        "--page_timeout",
+        type=float,
+        default=None,
+        help="seconds a page may take to convert - pages taking longer are reported and left unconverted "
+        + "(not enforced with --pipeline_offload_convert or on Windows)",
+    )
+    parser.add_argument(
+        "--save_index",
+        default=None,
+        help="save the page names and paths of the graph to this JSON file, so that the filter command can convert "
+        + "single pages against them later",
+    )
+    parser.add_argument(
+        "--scan_workers",
+        type=int,
+        default=1,
+        help="number of threads checking and copying the files of the graph when scanning it - helps on slow or "
+        + "network storage",
+    )
+    parser.add_argument(
+        "--memory_report",
+        default=False,
+        action="store_true",
+        help="report the peak memory use of each phase of the conversion, and of the pages that needed the most memory",
+    )
+    parser.add_argument(
+        "--max_memory",
+        type=int,
+        default=None,
+        help="memory budget in MiB - pages that would go over it are converted one line at a time instead of in memory",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="only convert the pages in shard i of N, given as i/N - combine the shards' outputs with the merge command",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=None,
+        help="only convert the pages matching this glob, given as their path in the graph, eg pages/project___*.md, "
+        + "or their name, eg project/* - can be given several times",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=None,
+        help="don't convert the pages matching this glob, like --include - can be given several times",
+    )
+    parser.add_argument(
+        "--from_page",
+        action="append",
+        default=None,
+        help="only convert this page and the pages reachable from it by following links, given as its path in the "
+        + "graph or its name - can be given several times. Links to pages that aren't converted are left like links "
+        + "to pages that don't exist",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help="with --from_page, the number of links followed from its pages - by default, every reachable page",
+    )
+    parser.add_argument(
+        "--scan_aliases",
+        action="store_true",
+        help="with --from_page, read the aliases of every page of the graph first, so that a link to an alias is "
+        + "followed even if no page reached declares it",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="number of worker processes converting pages, which share one memory-mapped copy of the page index - "
+        + "with 1, pages are converted in this process",
+    )
+    parser.add_argument(
+        "--pipeline",
+        default=False,
+        action="store_true",
+        help="overlap reading, converting and writing pages - helps on slow or network storage",
+    )
+    parser.add_argument(
+        "--pipeline_depth",
+        type=positive_int,
+        default=16,
+        help="with --pipeline, the number of pages that can be read ahead or waiting to be written",
+    )
+    parser.add_argument(
+        "--pipeline_io_threads",
+        type=positive_int,
+        default=8,
+        help="with --pipeline, the number of threads reading and writing pages",
+    )
+    parser.add_argument(
+        "--pipeline_offload_convert",
+        default=False,
+        action="store_true",
+        help="with --pipeline, convert pages on a worker thread instead of the event loop",
+    )
 
-    args = parser.parse_args()
+    return parser
 
+
+def convert(args):
     old_base = args.logseq
     new_base = args.output
 
-    old_to_new_paths = {}
-    new_to_old_paths = {}
-    new_paths = set()
+    # The path maps are all views onto one compact table, so large graphs don't store every path several times
+    pages = PageTable()
+    old_to_new_paths = pages.old_to_new
+    new_to_old_paths = pages.new_to_old
+    new_paths = pages.new_paths
     pages_that_were_empty = set()
-    old_pagenames_to_new_paths = {}
+    old_pagenames_to_new_paths = pages.names
 
     # First loop: copy files to their new location, populate the maps and list of paths
 
-    if not os.path.exists(old_base) or not os.path.isdir(old_base):
-        raise ValueError(
-            f"The directory '{old_base}' does not exist or is not a valid directory."
+    if args.resume and args.overwrite_output:
+        raise ValueError("--resume continues the run in the output directory, it can't be combined with --overwrite_output")
+
+    if args.attachment_layout == "shared":
+        # Colliding assets are named in the order they're placed, which neither shards nor a resumed run see all of
+        for option in ["shard", "resume"]:
+            if getattr(args, option):
+                raise ValueError(
+                    "--attachment_layout shared names colliding assets in one run, "
+                    + f"it can't be combined with --{option}"
+                )
+
+    if args.processes > 1:
+        for option in ["output_archive", "pipeline", "memory_report"]:
+            if getattr(args, option):
+                raise ValueError(f"--{option} can't be combined with --processes")
+        if args.attachment_layout == "shared":
+            raise ValueError("--attachment_layout shared can't be combined with --processes")
+
+    if args.output_archive is not None:
+        for option in ["update_output", "write_if_changed", "resume", "shard", "dryrun"]:
+            if getattr(args, option):
+                raise ValueError(f"--{option} needs an output directory, it can't be combined with --output_archive")
+
+    # The graph is checked before anything is written, so that a failed check leaves no output behind
+    with open_graph(old_base) as graph:
+        if isinstance(graph, ArchiveGraph):
+            directory_options = [
+                ("resume", args.resume),
+                ("attachment_layout shared", args.attachment_layout == "shared"),
+            ]
+            for option, value in directory_options:
+                if value:
+                    raise ValueError(
+                        f"--{option} needs the graph in a directory, it can't be used with an archived graph"
+                    )
+            if args.processes > 1 and graph.pages_in_memory:
+                # Every worker opens the graph, and would read all of its pages into memory again
+                raise ValueError(
+                    "--processes can't be used with a tar archive of the graph, whose pages every worker would read "
+                    + "into memory - use a zip archive or a directory"
+                )
+
+        # Journals pages go to their own subfolder, and other pages to the new base folder
+        old_journals = os.path.join(old_base, "journals")
+        old_pages = os.path.join(old_base, "pages")
+        for folder in [old_journals, old_pages]:
+            if not graph.isdir(folder):
+                raise ValueError(f"'{old_base}' is not a logseq graph, it has no {os.path.basename(folder)} folder.")
+
+        if args.output_archive is not None:
+            output = ArchiveOutput(args.output_archive, overwrite=args.overwrite_output, graph=graph)
+            # Where the pages would be in a directory, which is what their paths in the archive are relative to
+            new_base = output.base
+            output.attachments = attachment_store(args, new_base)
+        elif args.dryrun:
+            # The pages are converted as usual, but neither they nor their assets are written
+            output = DryRunOutput(attachments=attachment_store(args, new_base), graph=graph)
+        else:
+            output = DirectoryOutput(
+                copy_hash=args.copy_hash,
+                attachments=attachment_store(args, new_base),
+                write_if_changed=args.write_if_changed,
+                graph=graph,
+            )
+
+        # An archive is only kept if the conversion completes
+        with output:
+            new_journals = os.path.join(new_base, "journals")
+            if args.output_archive is None:
+                if args.overwrite_output and os.path.exists(new_base):
+                    shutil.rmtree(new_base)
+                os.makedirs(
+                    new_base,
+                    exist_ok=args.overwrite_output or args.update_output or args.write_if_changed or args.resume,
+                )
+                os.makedirs(new_journals, exist_ok=args.update_output or args.write_if_changed or args.resume)
+
+            checkpoint = None
+            resumed = None
+            if args.resume:
+                checkpoint = Checkpoint(old_base, new_base, every=args.checkpoint_every or RESUME_CHECKPOINT_EVERY)
+                resumed = checkpoint.load(args)
+                if not resumed["scanned"]:
+                    # Interrupted while scanning, which starts over. Files that were already copied aren't copied again
+                    resumed = None
+                    checkpoint.start(args)
+            elif (
+                args.checkpoint_every > 0
+                and not args.dryrun
+                and args.output_archive is None
+                and not isinstance(graph, ArchiveGraph)
+            ):
+                checkpoint = Checkpoint(old_base, new_base, every=args.checkpoint_every)
+                checkpoint.start(args)
+
+            memory = MemoryTracker(
+                report=args.memory_report,
+                max_memory=args.max_memory * 1024 * 1024 if args.max_memory is not None else None,
+            )
+            # The scan copies the pages and files as it goes
+            if resumed is not None:
+                logging.info("resuming: reusing the scan of the graph from the checkpoint")
+                checkpoint.restore_pages(resumed, pages, pages_that_were_empty)
+            else:
+                with memory.phase("scan"):
+                    # Only the pages selected by --include, --exclude and --from_page are scanned
+                    selected = select_pages(args, old_base, graph)
+                    # The aliases declared by each page, collected while scanning it
+                    page_aliases = {}
+
+                    logging.debug("Beginning to copy the journal pages")
+                    copy_journals(
+                        args,
+                        old_journals,
+                        new_journals,
+                        old_to_new_paths,
+                        new_to_old_paths,
+                        new_paths,
+                        pages_that_were_empty,
+                        old_pagenames_to_new_paths,
+                        shard=args.shard,
+                        output=output,
+                        workers=args.scan_workers,
+                        selected=selected,
+                        graph=graph,
+                        page_aliases=page_aliases,
+                    )
+
+                    # Copy other markdown files to the new base folder, creating subfolders for namespaces
+                    logging.debug("Beginning to copy the non-journal pages")
+                    copy_pages(
+                        args,
+                        old_pages,
+                        new_base,
+                        old_to_new_paths,
+                        new_to_old_paths,
+                        new_paths,
+                        pages_that_were_empty,
+                        old_pagenames_to_new_paths,
+                        shard=args.shard,
+                        output=output,
+                        workers=args.scan_workers,
+                        selected=selected,
+                        graph=graph,
+                        page_aliases=page_aliases,
+                    )
+
+                    # Links to the alias:: of a page go to that page
+                    add_aliases_to_page_names(build_alias_index(page_aliases), old_pagenames_to_new_paths)
+
+                if checkpoint is not None:
+                    checkpoint.save_scan(args, pages, pages_that_were_empty)
+
+            if args.save_index is not None:
+                save_page_index(args.save_index, args, old_base, new_base, pages)
+
+            # Second loop: for each new file, reformat its content appropriately
+            # Every shard knows about every page so that links resolve, but only converts its own
+            shard_paths = new_paths
+            if args.shard is not None:
+                shard_paths = {path for path in new_paths if in_shard(args.shard, new_to_old_paths[path])}
+            if resumed is not None:
+                shard_paths = checkpoint.remaining(shard_paths, new_to_old_paths)
+            with memory.phase("convert"):
+                try:
+                    if args.processes > 1:
+                        convert_contents_in_processes(
+                            args,
+                            shard_paths,
+                            old_pagenames_to_new_paths,
+                            new_to_old_paths,
+                            processes=args.processes,
+                            checkpoint=checkpoint,
+                            output=output,
+                        )
+                    elif args.pipeline:
+                        convert_contents_pipelined(
+                            args,
+                            shard_paths,
+                            old_pagenames_to_new_paths,
+                            new_to_old_paths,
+                            depth=args.pipeline_depth,
+                            io_threads=args.pipeline_io_threads,
+                            offload_convert=args.pipeline_offload_convert,
+                            memory=memory,
+                            checkpoint=checkpoint,
+                            output=output,
+                            graph=graph,
+                        )
+                    else:
+                        convert_contents(
+                            args,
+                            shard_paths,
+                            old_pagenames_to_new_paths,
+                            new_to_old_paths,
+                            memory=memory,
+                            checkpoint=checkpoint,
+                            output=output,
+                            graph=graph,
+                        )
+                finally:
+                    # Keep what was converted when the run fails or is interrupted
+                    if checkpoint is not None:
+                        checkpoint.close()
+            memory.log_report()
+            memory.stop()
+
+            if checkpoint is not None:
+                checkpoint.remove()
+
+    if args.write_if_changed:
+        logging.info(
+            f"{output.unchanged} writes avoided, as the files were already up to date - {output.written} files written"
         )
 
-    if args.overwrite_output and os.path.exists(new_base):
-        shutil.rmtree(new_base)
+    if args.shard is not None:
+        write_shard_manifest(new_base, args.shard, page_map_digest(new_base, new_to_old_paths))
+
+
+def merge(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="logseqtoobsidian merge",
+        description="combine the outputs of a sharded conversion into a single vault",
+    )
+    parser.add_argument(
+        "--output", help="base directory where the merged output should go", required=True
+    )
+    parser.add_argument(
+        "--overwrite_output",
+        dest="overwrite_output",
+        default=False,
+        action="store_true",
+        help="overwrites output directory if included",
+    )
+    parser.add_argument("shards", nargs="+", help="output directories of every shard of the run")
+
+    args = parser.parse_args(argv)
+
+    if args.overwrite_output and os.path.exists(args.output):
+        shutil.rmtree(args.output)
+
+    os.makedirs(args.output, exist_ok=args.overwrite_output)
+    merge_shards(args.shards, args.output)
+
+
+def batch(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="logseqtoobsidian batch",
+        description="convert many graphs in one go - a graph that fails to convert doesn't stop the others",
+    )
+    parser.add_argument(
+        "manifest",
+        help="JSON list of jobs, eg "
+        + '[{"logseq": "graph", "output": "vault", "options": {"journal_dashes": true}}] - the options are the '
+        + "arguments of a single conversion, without their dashes",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes converting graphs - with 1, the graphs are converted in this process",
+    )
+    parser.add_argument("--report", default=None, help="write the result of each job to this JSON file")
+
+    args = parser.parse_args(argv)
 
-    os.makedirs(new_base, exist_ok=args.overwrite_output)
+    results = run_batch(load_manifest(args.manifest), workers=args.jobs)
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
 
-    # Copy journals pages to their own subfolder
-    old_journals = os.path.join(old_base, "journals")
-    assert os.path.isdir(old_journals)
+    failed = sum(1 for result in results if result["status"] != "ok")
+    logging.info(f"batch done: {len(results) - failed} graphs converted, {failed} failed")
+    return 1 if failed else 0
 
-    new_journals = os.path.join(new_base, "journals")
-    os.mkdir(new_journals)
 
-    logging.debug("Beginning to copy the journal pages")
-    copy_journals(
-        args,
-        old_journals,
-        new_journals,
-        old_to_new_paths,
-        new_to_old_paths,
-        new_paths,
-        pages_that_were_empty,
-        old_pagenames_to_new_paths,
+def serve(argv: list[str]):
+    parser = build_parser()
+    parser.prog = "logseqtoobsidian serve"
+    parser.description = (
+        "index a graph once, then convert its pages on request over a Unix socket - requests are JSON lines, eg "
+        + '{"op": "convert", "page": "pages/foo.md"} or {"op": "reindex", "paths": ["pages/foo.md"]}'
     )
+    parser.add_argument("--socket", help="path of the Unix socket to listen on", required=True)
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=1.0,
+        help="seconds between checks of the graph for added, changed and removed pages - 0 only reindexes on request",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.output_archive is not None:
+        raise ValueError("serve writes pages into an output directory, it can't be combined with --output_archive")
+    if not os.path.isdir(os.path.join(args.logseq, "journals")) or not os.path.isdir(os.path.join(args.logseq, "pages")):
+        raise ValueError(f"The directory '{args.logseq}' is not a logseq graph, it has no journals and pages folders.")
 
-    # Copy other markdown files to the new base folder, creating subfolders for namespaces
-    old_pages = os.path.join(old_base, "pages")
-    assert os.path.isdir(old_pages)
+    ConversionServer(args).serve(args.socket, poll_interval=args.poll_interval)
 
-    logging.debug("Beginning to copy the non-journal pages")
-    copy_pages(
-        args,
-        old_pages,
-        new_base,
-        old_to_new_paths,
-        new_to_old_paths,
-        new_paths,
-        pages_that_were_empty,
-        old_pagenames_to_new_paths,
+
+def filter_page(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="logseqtoobsidian filter",
+        description="convert a single page, read from stdin, and write it to stdout - links are resolved with the "
+        + "page index saved by a full run with --save_index, and the page is converted with that run's options",
+    )
+    parser.add_argument("--index", help="page index saved with --save_index", required=True)
+    parser.add_argument(
+        "--page",
+        help="path of the page in the graph, eg pages/foo.md, or its name - links are made relative to where it is in "
+        + "the output",
+        required=True,
     )
 
-    # Second loop: for each new file, reformat its content appropriately
-    convert_contents(
-        args,
-        new_paths,
-        old_pagenames_to_new_paths,
-        new_to_old_paths,
+    args = parser.parse_args(argv)
+
+    index, old_to_new_paths, old_pagenames_to_new_paths = load_page_index(args.index)
+    old_base = index["logseq"]
+    new_base = index["output"]
+    conversion = build_parser().parse_args(["--logseq", old_base, "--output", new_base])
+    for name, value in index["options"].items():
+        setattr(conversion, name, value)
+    if conversion.attachment_layout == "shared":
+        # A single page would name its assets without knowing the other assets of the run, and could overwrite them
+        raise ValueError("the index is of a run with --attachment_layout shared, whose pages can't be converted alone")
+
+    old_fpath = os.path.join(old_base, args.page)
+    folder = os.path.dirname(old_fpath)
+    if old_fpath in old_to_new_paths:
+        fpath = old_to_new_paths[old_fpath]
+    elif args.page in old_pagenames_to_new_paths:
+        fpath = old_pagenames_to_new_paths[args.page]
+        old_fpath = {new: old for old, new in old_to_new_paths.items()}[fpath]
+    elif folder == os.path.join(old_base, "journals"):
+        # A page added to the graph since the index was saved
+        fpath, _ = journal_path_and_names(conversion, os.path.join(new_base, "journals"), os.path.basename(old_fpath))
+    elif folder == os.path.join(old_base, "pages"):
+        fpath, _ = page_path_and_names(conversion, new_base, os.path.basename(old_fpath))
+    else:
+        raise ValueError(f"'{args.page}' is neither a page of {old_base} nor the name of one")
+
+    data = sys.stdin.buffer.read()
+    if is_unaffected_by_rules(conversion, data):
+        newlines = decode_page(data)
+    else:
+        with open_graph(old_base) as graph:
+            output = DirectoryOutput(attachments=attachment_store(conversion, new_base), graph=graph)
+            newlines = convert_page(
+                conversion, decode_page(data), fpath, old_pagenames_to_new_paths, {fpath: old_fpath}, output=output
+            )
+    sys.stdout.buffer.write("".join(newlines).encode("utf-8"))
+    sys.stdout.buffer.flush()
+
+
+def verify(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="logseqtoobsidian verify",
+        description="check that every link and embed of a converted vault points to a file of the vault",
     )
+    parser.add_argument("vault", help="output directory of a conversion")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes checking pages - with 1, the pages are checked in this process",
+    )
+    parser.add_argument("--report", default=None, help="write the broken links of each page to this JSON file")
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.vault):
+        raise ValueError(f"The directory '{args.vault}' does not exist.")
+
+    broken = verify_vault(args.vault, workers=args.jobs)
+    for page, targets in broken.items():
+        logging.warning(f"{page}: {len(targets)} broken links")
+        for target in targets:
+            logging.warning(f"    {target}")
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(broken, f, indent=1)
+
+    count = sum(len(targets) for targets in broken.values())
+    logging.info(f"verify done: {count} broken links in {len(broken)} pages")
+    return 1 if broken else 0
+
+
+# Subcommands, given as the first argument. Without one, the graph is converted
+COMMANDS = {
+    "merge": merge,
+    "batch": batch,
+    "serve": serve,
+    "filter": filter_page,
+    "verify": verify,
+}
+
+
+def setup_logging():
+    """Sets up logging with custom formatter, once however many times main is called"""
+    logger = logging.getLogger()
+    if not any(isinstance(handler.formatter, CustomFormatter) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(CustomFormatter("%(levelname)s: %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+
+
+def main(argv: list[str] = None):
+    setup_logging()
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    args = build_parser().parse_args(argv)
+    convert(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import os
+import threading
+
+from logseqtoobsidian.copying import file_digest, files_match
+
+# Where assets embedded in pages go, selected with --attachment_layout
+ATTACHMENT_LAYOUTS = ["per_page", "shared"]
+
+
+class SharedAttachments:
+    """Stores every asset once, in a single attachments folder at the root of the output, rather than next to every
+    page that embeds it
+
+    Assets keep their name in the store. When two different assets have the same name, the first one placed keeps it
+    and the others are named after a digest of their contents, eg image-1f2e3d4c5b6a.png. Files are only hashed to
+    resolve such a collision, and assets with the same name and contents are stored once
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Name in the store -> path of the asset that has it
+        self._owners = {}
+        # Path of an asset -> where it is in the store
+        self._placed = {}
+        self._lock = threading.Lock()
+
+    def place(self, src: str, page_fpath: str = None) -> str:
+        """Returns where the asset at src goes in the store. Where the page embedding it is doesn't matter"""
+        with self._lock:
+            dst = self._placed.get(src)
+            if dst is not None:
+                return dst
+            if not os.path.isfile(src):
+                raise FileNotFoundError(src)
+
+            name = os.path.basename(src)
+            owner = self._owners.setdefault(name, src)
+            if owner != src and not files_match(owner, src, compare_hash=True):
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}-{file_digest(src)[:12]}{ext}"
+                self._owners.setdefault(name, src)
+
+            dst = os.path.join(self.directory, name)
+            self._placed[src] = dst
+            return dst
+
+
+def attachment_store(args, new_base: str) -> SharedAttachments:
+    """Returns the shared attachments store of a run, or None if assets go next to the pages embedding them"""
+    if args.attachment_layout != "shared":
+        return None
+    return SharedAttachments(os.path.join(new_base, args.assets_dir))
@@ -0,0 +1,110 @@
+import concurrent.futures
+import json
+import logging
+import time
+import traceback
+
+import logseqtoobsidian.convert_notes
+
+
+def load_manifest(fpath: str) -> list[dict]:
+    """Reads a batch manifest: a JSON list of jobs, each with the "logseq" graph to convert, its "output" directory
+    (or "output_archive"), and optionally the "options" of the conversion, eg {"journal_dashes": true}
+    """
+    with open(fpath, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+
+    if not isinstance(jobs, list):
+        raise ValueError(f"the batch manifest '{fpath}' must be a list of jobs")
+    for idx, job in enumerate(jobs):
+        if not isinstance(job, dict) or "logseq" not in job:
+            raise ValueError(f"job {idx} of the batch manifest '{fpath}' has no 'logseq' graph")
+    return jobs
+
+
+def job_argv(job: dict) -> list[str]:
+    """Returns the command line arguments that convert the graph of a job"""
+    argv = ["--logseq", job["logseq"]]
+    for key in ["output", "output_archive"]:
+        if job.get(key) is not None:
+            argv += [f"--{key}", job[key]]
+
+    for key, value in job.get("options", {}).items():
+        if value is True:
+            argv.append(f"--{key}")
+        elif isinstance(value, list):
+            # Options that can be given several times, eg --include
+            for item in value:
+                argv += [f"--{key}", str(item)]
+        elif value is not False and value is not None:
+            argv += [f"--{key}", str(value)]
+    return argv
+
+
+def run_job(job: dict) -> dict:
+    """Converts the graph of a job, and returns its entry in the report. Errors are reported rather than raised"""
+    # Imported here so that worker processes import it under its own name, even when run as python -m
+    from logseqtoobsidian.__main__ import build_parser, convert
+
+    result = {"logseq": job.get("logseq"), "output": job.get("output") or job.get("output_archive")}
+    start = time.perf_counter()
+    try:
+        args = build_parser().parse_args(job_argv(job))
+        # Jobs run one after the other in the same process, so none of the state of the previous one can be left
+        logseqtoobsidian.convert_notes.INSIDE_CODE_BLOCK = False
+        convert(args)
+        result["status"] = "ok"
+    except SystemExit:
+        # argparse exits on invalid options, after logging why
+        result["status"] = "failed"
+        result["error"] = "invalid options: " + " ".join(job_argv(job))
+    except Exception as e:
+        logging.debug(traceback.format_exc())
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+
+    if result["status"] == "ok":
+        logging.info(f"converted {result['logseq']} in {result['seconds']}s")
+    else:
+        logging.error(f"converting {result['logseq']} failed: {result['error']}")
+    return result
+
+
+def run_batch(jobs: list[dict], workers: int = 1) -> list[dict]:
+    """Runs the jobs of a batch and returns their report, in the order of the jobs
+
+    With a single worker the jobs run in this process, one after the other. Otherwise they run on a pool of worker
+    processes, each converting many graphs, so interpreter startup and compiling the rules' regexes is paid once per
+    worker rather than once per graph. If a worker process dies, the jobs it may have been running are retried in a
+    process of their own, so that only the job that killed it fails
+    """
+    if workers <= 1:
+        return [run_job(job) for job in jobs]
+
+    results = [None] * len(jobs)
+    retry = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_job, job): idx for idx, job in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except concurrent.futures.process.BrokenProcessPool:
+                retry.append(idx)
+
+    for idx in sorted(retry):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                results[idx] = pool.submit(run_job, jobs[idx]).result()
+            except concurrent.futures.process.BrokenProcessPool:
+                job = jobs[idx]
+                logging.error(f"converting {job.get('logseq')} failed: its worker process died")
+                results[idx] = {
+                    "logseq": job.get("logseq"),
+                    "output": job.get("output") or job.get("output_archive"),
+                    "status": "failed",
+                    "error": "the worker process died",
+                }
+
+    return results
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from logseqtoobsidian.page_table import PageTable
+
+
+# Written to the root of the output tree while converting, and removed once the run completes
+CHECKPOINT = "logseqtoobsidian_checkpoint.json"
+# Pages converted since the checkpoint was written, one JSON list per line, appended to as the run goes
+CHECKPOINT_LOG = "logseqtoobsidian_checkpoint.log"
+CHECKPOINT_VERSION = 1
+# Pages converted between checkpoints when resuming a run without --checkpoint_every
+RESUME_CHECKPOINT_EVERY = 100
+
+# Options that change the output, which must be the same when resuming a run
+OUTPUT_OPTIONS = (
+    "assets_dir",
+    "unindent_once",
+    "journal_dashes",
+    "tag_prop_to_taglist",
+    "ignore_dot_for_namespaces",
+    "convert_tags_to_links",
+    "engine",
+    "attachment_layout",
+    "shard",
+    "include",
+    "exclude",
+    "from_page",
+    "depth",
+    "scan_aliases",
+)
+
+
+def output_options(args) -> dict:
+    return {name: getattr(args, name) for name in OUTPUT_OPTIONS}
+
+
+def graph_listing_digest(old_base: str) -> str:
+    """Returns a digest of the names in the journals and pages folders of a graph, which only changes when pages are
+    added, removed or renamed"""
+    digest = hashlib.sha256()
+    for folder in ["journals", "pages"]:
+        for fname in sorted(os.listdir(os.path.join(old_base, folder))):
+            digest.update(f"{folder}/{fname}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_state(fpath: str) -> list:
+    """Returns the size and modification time of a file, which is what a resumed run checks to see if it changed"""
+    st = os.stat(fpath)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class Checkpoint:
+    """Records the progress of a conversion in its output folder, so that an interrupted run can be resumed
+
+    Once the graph has been scanned, the path maps are saved to the checkpoint. Every converted page is then appended
+    to the log along with the state of its source and of its output, and the log is flushed to disk every `every`
+    pages. A resumed run reloads the path maps instead of scanning the graph again, and only converts the pages that
+    aren't in the log, or whose source or output changed since. Assets don't need to be recorded: they are only
+    copied by converting the pages that embed them, and copies of unchanged assets are skipped anyway
+    """
+
+    def __init__(self, old_base: str, new_base: str, every: int = 100):
+        self.old_base = old_base
+        self.new_base = new_base
+        self.every = every
+        self.path = os.path.join(new_base, CHECKPOINT)
+        self.log_path = os.path.join(new_base, CHECKPOINT_LOG)
+        self._log = None
+        self._unflushed = 0
+
+    def _write(self, data: dict):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def start(self, args):
+        """Records that a run with these options started, before scanning the graph"""
+        self._write({"version": CHECKPOINT_VERSION, "options": output_options(args), "scanned": False})
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def save_scan(self, args, pages: PageTable, pages_that_were_empty: set):
+        """Records the path maps built by scanning the graph"""
+        old_to_new = []
+        for new_path in pages.new_paths:
+            old_path = pages.new_to_old.get(new_path)
+            old_to_new.append(
+                [
+                    os.path.relpath(old_path, self.old_base) if old_path is not None else None,
+                    os.path.relpath(new_path, self.new_base),
+                ]
+            )
+        names = {name: os.path.relpath(new_path, self.new_base) for name, new_path in pages.names.items()}
+
+        self._write(
+            {
+                "version": CHECKPOINT_VERSION,
+                "options": output_options(args),
+                "scanned": True,
+                "graph_listing_digest": graph_listing_digest(self.old_base),
+                "old_to_new": old_to_new,
+                "names": names,
+                "pages_that_were_empty": sorted(pages_that_were_empty),
+            }
+        )
+
+    def load(self, args) -> dict:
+        """Reads the checkpoint of the run to resume, checking that it can be resumed with these options"""
+        if not os.path.isfile(self.path):
+            raise ValueError(f"there is no run to resume in '{self.new_base}', it has no {CHECKPOINT}")
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"unsupported checkpoint version in '{self.path}'")
+        # Shards are saved as lists in JSON
+        options = output_options(args)
+        if options["shard"] is not None:
+            options["shard"] = list(options["shard"])
+        if data["options"] != options:
+            raise ValueError(
+                f"the run in '{self.new_base}' can't be resumed with different options, it used {data['options']}"
+            )
+        if data["scanned"] and data["graph_listing_digest"] != graph_listing_digest(self.old_base):
+            raise ValueError(
+                f"pages were added, removed or renamed in '{self.old_base}' since the run in '{self.new_base}' "
+                + "started, it can't be resumed"
+            )
+
+        return data
+
+    def restore_pages(self, data: dict, pages: PageTable, pages_that_were_empty: set):
+        """Fills the path maps with the ones saved after scanning the graph"""
+        for old_relpath, new_relpath in data["old_to_new"]:
+            new_path = os.path.join(self.new_base, new_relpath)
+            if old_relpath is None:
+                pages.new_paths.add(new_path)
+            else:
+                pages.add_page(os.path.join(self.old_base, old_relpath), new_path)
+        for name, new_relpath in data["names"].items():
+            pages.names[name] = os.path.join(self.new_base, new_relpath)
+        pages_that_were_empty.update(data["pages_that_were_empty"])
+
+    def remaining(self, new_paths: set, new_to_old_paths: dict) -> set:
+        """Returns the pages that still need converting, leaving out those logged as converted whose source and
+        output are still the way they were when they were converted
+
+        Pages that were logged but changed since are copied again first, since pages that no rule applies to are left
+        as their verbatim copy rather than converted
+        """
+        done = {}
+        if os.path.isfile(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        new_relpath, source_state, output_state = json.loads(line)
+                    except ValueError:
+                        # The run was interrupted while writing this line
+                        continue
+                    done[os.path.join(self.new_base, new_relpath)] = (source_state, output_state)
+
+        remaining = set()
+        for fpath in new_paths:
+            states = done.get(fpath)
+            try:
+                if states is not None and states == (file_state(new_to_old_paths[fpath]), file_state(fpath)):
+                    continue
+            except FileNotFoundError:
+                pass
+            if states is not None:
+                shutil.copyfile(new_to_old_paths[fpath], fpath)
+            remaining.add(fpath)
+
+        logging.info(f"resuming: {len(new_paths) - len(remaining)} pages already converted, {len(remaining)} to go")
+        return remaining
+
+    def page_done(self, fpath: str, old_path: str):
+        """Records that the page at fpath was converted from old_path"""
+        if self._log is None:
+            self._log = open(self.log_path, "a", encoding="utf-8")
+
+        entry = [os.path.relpath(fpath, self.new_base), file_state(old_path), file_state(fpath)]
+        self._log.write(json.dumps(entry) + "\n")
+        self._unflushed += 1
+        if self._unflushed >= self.every:
+            self.flush()
+
+    def flush(self):
+        if self._log is None:
+            return
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unflushed = 0
+
+    def close(self):
+        if self._log is not None:
+            self.flush()
+            self._log.close()
+            self._log = None
+
+    def remove(self):
+        """Removes the checkpoint once the run completed"""
+        self.close()
+        for fpath in [self.path, self.log_path]:
+            if os.path.exists(fpath):
+                os.remove(fpath)
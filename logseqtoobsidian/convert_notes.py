@@ -1,10 +1,20 @@
 import argparse
+import concurrent.futures
+import io
+import itertools
 import logging
 import os
 import re
-import shutil
 import typing
 
+from logseqtoobsidian.checkpoint import Checkpoint
+from logseqtoobsidian.graph_input import DirectoryGraph
+from logseqtoobsidian.matching import sub_asset_embeds, sub_delimited, sub_image_dimensions
+from logseqtoobsidian.memory import PAGE_MEMORY_FACTOR, MemoryTracker
+from logseqtoobsidian.outline import CODE, Block, iter_blocks, parse_outline, split_indentation
+from logseqtoobsidian.output import DirectoryOutput
+from logseqtoobsidian.shards import in_shard
+from logseqtoobsidian.time_limit import PageTimeout, page_time_limit, page_time_limit_paused
 
 # Global state isn't always bad mmkay
 ORIGINAL_LINE = ""
@@ -34,30 +44,60 @@ OBSIDIAN_ACCEPTED_FILE_FORMATS = [
     ".webm",
     ".pdf",
 ]
+# Anything that one of the rules in convert_page could change: links, tags, assets, block refs and embeds, < and >,
+# properties, todos, runs of spaces, code blocks, empty bullets, lines ending with a hyphen and \r line endings
+RULE_TRIGGERS = re.compile(
+    rb"\[\[|#|!\[|\(\(|\{\{|<|>|::|TODO|DONE|  |```|\r|-$|^- *$",
+    re.MULTILINE,
+)
 
 
 def is_markdown_file(fpath: str) -> bool:
     return os.path.splitext(fpath)[-1].lower() == ".md"
 
 
-def is_empty_markdown_file(fpath: str) -> bool:
+def is_empty_markdown_file(fpath: str, graph: DirectoryGraph = None, properties: dict = None) -> bool:
     """Given a path to a markdown file, checks if it's empty
     A file is empty if it only contains whitespace
     A file containing only front matter / page properties is not empty
+    With properties, the page properties of the file are added to it, so that it's only read once
     """
     if not is_markdown_file(fpath):
         return False
+    if graph is None:
+        graph = DirectoryGraph()
 
-    with open(fpath, "r", encoding="utf-8", errors="replace") as f:
+    with graph.open_text(fpath) as f:
         lines = f.readlines()
-        for line in lines:
-            if not line.isspace():
-                return False
+    if properties is not None:
+        properties.update(parse_properties(lines)[0])
+    for line in lines:
+        if not line.isspace():
+            return False
 
     return True
 
 
-def get_markdown_file_properties(fpath: str) -> tuple[dict, int]:
+def parse_properties(lines: typing.Iterable[str]) -> tuple[dict, int]:
+    """Returns the page properties at the start of lines, and the index of the first line after them"""
+    properties = {}
+    first_line_after = 0
+    # Check for Logseq-style properties (key:: value)
+    # Only the lines up to the end of the properties are read
+    for idx, line in enumerate(lines):
+        match = re.match(r"(.*?)::[\s]*(.*)", line)
+        if match is not None:
+            key = match[1].strip()
+            value = match[2].strip()
+            properties[key] = value
+            first_line_after = idx + 1
+        else:
+            break
+
+    return properties, first_line_after
+
+
+def get_markdown_file_properties(fpath: str, graph: DirectoryGraph = None) -> tuple[dict, int]:
     """Given a path to a markdown file, returns a dictionary of its properties and the index of the first line after the properties
 
     Properties can either be in page property format: "title:: test"
@@ -66,24 +106,63 @@ def get_markdown_file_properties(fpath: str) -> tuple[dict, int]:
         title: test
         ---
     """
-    properties = {}
-    first_line_after = 0
+    if graph is None:
+        graph = DirectoryGraph()
 
-    with open(fpath, "r", encoding="utf-8", errors="replace") as f:
-        lines = f.readlines()
+    with graph.open_text(fpath) as f:
+        return parse_properties(f)
 
-        # Check for Logseq-style properties (key:: value)
-        for idx, line in enumerate(lines):
-            match = re.match(r"(.*?)::[\s]*(.*)", line)
-            if match is not None:
-                key = match[1].strip()
-                value = match[2].strip()
-                properties[key] = value
-                first_line_after = idx + 1
-            else:
-                break
 
-    return properties, first_line_after
+def parse_aliases(value: str) -> list[str]:
+    """Given the value of an alias:: property, returns the aliases in it
+    Eg "foo, [[bar baz]], #qux" returns ['foo', 'bar baz', 'qux']
+    """
+    aliases = []
+    for alias in value.split(","):
+        alias = alias.strip()
+        if alias.startswith("#"):
+            alias = alias[1:]
+        if alias.startswith("[[") and alias.endswith("]]"):
+            alias = alias[2:-2]
+        if alias:
+            aliases.append(alias)
+    return aliases
+
+
+def is_alias_property(key: str) -> bool:
+    return key.strip().lower() in ("alias", "aliases")
+
+
+def property_aliases(properties: dict) -> list[str]:
+    """Returns the aliases declared in the alias:: properties of a page"""
+    aliases = []
+    for key, value in properties.items():
+        if is_alias_property(key):
+            aliases.extend(parse_aliases(value))
+    return aliases
+
+
+def build_alias_index(page_aliases: dict) -> dict:
+    """Given the aliases declared by each page, by new path, as collected when scanning the graph, returns a dict
+    mapping every alias to the new path of its page"""
+    aliases = {}
+    for new_fpath in sorted(page_aliases):
+        for alias in page_aliases[new_fpath]:
+            if alias in aliases and aliases[alias] != new_fpath:
+                logging.warning(f"alias '{alias}' is declared by both {aliases[alias]} and {new_fpath}, using the first")
+                continue
+            aliases[alias] = new_fpath
+    return aliases
+
+
+def add_aliases_to_page_names(aliases: dict, old_pagenames_to_new_paths: dict):
+    """Makes links to aliases resolve to the page declaring them. Actual page names take precedence over aliases"""
+    for alias, new_fpath in aliases.items():
+        if alias in old_pagenames_to_new_paths:
+            if old_pagenames_to_new_paths[alias] != new_fpath:
+                logging.warning(f"alias '{alias}' of {new_fpath} is also the name of a page, links will go to the page")
+            continue
+        old_pagenames_to_new_paths[alias] = new_fpath
 
 
 def get_namespace_hierarchy(args, fname: str) -> list[str]:
@@ -152,8 +231,7 @@ def update_links_and_tags(args, line: str, name_to_path: dict, curr_path: str) -
     )
 
     # Replace #[[this type of tag]] with #this_type_of_tag or [[this type of tag]] depending on args.convert_tags_to_links
-    def fix_long_tag(match: re.Match):
-        s = match[0]
+    def fix_long_tag(s: str):
 
         if args.convert_tags_to_links:
             s = s.replace("#", "")
@@ -163,7 +241,7 @@ def update_links_and_tags(args, line: str, name_to_path: dict, curr_path: str) -
             s = s.replace("]", "")
         return s
 
-    line = re.sub(r"#\[\[.*?]]", fix_long_tag, line)
+    line = sub_delimited(line, "#[[", "]]", fix_long_tag)
 
     # Convert a 'short' #tag to a [[tag]] link, if args.convert_tags_to_links is true
     def convert_tag_to_link(match: re.Match):
@@ -178,8 +256,7 @@ def update_links_and_tags(args, line: str, name_to_path: dict, curr_path: str) -
     line = re.sub(r"#\w+", convert_tag_to_link, line)
 
     # Replace [[This/Type/OfLink]] with [OfLink](../Type/OfLink) - for example
-    def fix_link(match: re.Match):
-        s = match[0]
+    def fix_link(s: str):
         s = s.replace("[", "")
         s = s.replace("]", "")
 
@@ -204,21 +281,33 @@ def update_links_and_tags(args, line: str, name_to_path: dict, curr_path: str) -
             )  # TOFIX We return the []() format of link here rather than [[]] format which we do elsewhere
             return s
 
-    line = re.sub(r"\[\[.*?]]", fix_link, line)
+    line = sub_delimited(line, "[[", "]]", fix_link)
 
     return line
 
 
-def update_assets(line: str, old_path: str, new_path: str, assets_dir: str):
+def update_assets(
+    line: str,
+    old_path: str,
+    new_path: str,
+    assets_dir: str,
+    copy_asset: typing.Callable[[str, str], bool] = None,
+    place_asset: typing.Callable[[str, str], str] = None,
+):
     """Updates embedded asset links and copies the asset
-    Assets are copied to the 'attachments' subfolder under the same directory as new_path is in
+    Assets are copied to the 'attachments' subfolder under the same directory as new_path is in, unless place_asset
+    puts them elsewhere
     Images (.PNG, .JPG) are embedded. Everything else is linked to
+
+    :arg copy_asset Function copying an asset (creating its folder), which can skip assets that were already copied.
+        Assets are copied to a directory by default
+    :arg place_asset Function returning where an asset goes, given its path and new_path
     """
+    if copy_asset is None:
+        copy_asset = DirectoryOutput().copy_asset
 
-    def fix_asset_embed(match: re.Match) -> str:
+    def fix_asset_embed(name: str, old_relpath: str) -> str:
         out = []
-        name = match[1]
-        old_relpath = match[2]
         if old_relpath[:8] == "file:///":
             old_relpath = old_relpath[7:]
 
@@ -230,13 +319,13 @@ def update_assets(line: str, old_path: str, new_path: str, assets_dir: str):
         new_asset_path = os.path.join(
             os.path.dirname(new_path), assets_dir, os.path.basename(old_asset_path)
         )
-        new_asset_dir = os.path.dirname(new_asset_path)
-        os.makedirs(new_asset_dir, exist_ok=True)
-        logging.debug(
-            f"copying: {old_asset_path} ->\n{' ' * len('DEBUG: copying: ')}{new_asset_path}"
-        )
         try:
-            shutil.copyfile(old_asset_path, new_asset_path)
+            if place_asset is not None:
+                new_asset_path = place_asset(old_asset_path, new_path)
+            logging.debug(
+                f"copying: {old_asset_path} ->\n{' ' * len('DEBUG: copying: ')}{new_asset_path}"
+            )
+            copy_asset(old_asset_path, new_asset_path)
             new_relpath = os.path.relpath(new_asset_path, os.path.dirname(new_path))
         except FileNotFoundError:
             logging.warning(
@@ -256,7 +345,7 @@ def update_assets(line: str, old_path: str, new_path: str, assets_dir: str):
 
         return "".join(out)
 
-    line = re.sub(r"!\[(.*?)]\((.*?)\)", fix_asset_embed, line)
+    line = sub_asset_embeds(line, fix_asset_embed)
 
     return line
 
@@ -267,10 +356,10 @@ def update_image_dimensions(line: str) -> str:
         to ![image.png|568](image.png)
     """
 
-    def fix_image_dim(match):
-        return "![" + match[1] + "|" + match[3] + "](" + match[2] + ")"
+    def fix_image_dim(name: str, target: str, width: str) -> str:
+        return "![" + name + "|" + width + "](" + target + ")"
 
-    line = re.sub(r"!\[(.*?)]\((.*?)\){:height \d*, :width (\d*)}", fix_image_dim, line)
+    line = sub_image_dimensions(line, fix_image_dim)
 
     return line
 
@@ -283,8 +372,8 @@ def is_collapsed_line(line: str) -> bool:
 
 def remove_block_links_embeds(line: str) -> str:
     """Returns the line stripped of any block links or embeddings"""
-    line = re.sub(r"{{embed .*?}}", "", line)
-    line = re.sub(r"\(\(.*?\)\)", "", line)
+    line = sub_delimited(line, "{{embed ", "}}", lambda s: "")
+    line = sub_delimited(line, "((", "))", lambda s: "")
     return line
 
 
@@ -415,6 +504,98 @@ def unencode_filenames_for_links(old_str: str) -> str:
     return new_str
 
 
+def journal_path_and_names(args, new_journals: str, fname: str) -> tuple[str, list[str]]:
+    """Returns the new path of the journal page fname, and the page names that links to it use"""
+    if args.journal_dashes:
+        new_fpath = os.path.join(new_journals, fname.replace("_", "-"))
+    else:
+        new_fpath = os.path.join(new_journals, fname)
+
+    newfile = os.path.splitext(fname)[0]
+    pagenames = [newfile]
+    if args.journal_dashes:
+        pagenames.append(newfile.replace("_", "-"))
+    return new_fpath, pagenames
+
+
+def page_path_and_names(args, new_base: str, fname: str) -> tuple[str, list[str]]:
+    """Returns the new path of the page fname, in the folders of its namespaces, and the page names that links to it
+    use"""
+    hierarchy = get_namespace_hierarchy(args, fname)
+    hierarchical_pagename = "/".join(hierarchy)
+    new_fpath = os.path.join(new_base, *hierarchy)
+    new_fpath = fix_escapes(new_fpath)
+
+    old_pagename = os.path.splitext(hierarchical_pagename)[0]
+    # Add mapping of unencoded filename for links
+    return new_fpath, [old_pagename, unencode_filenames_for_links(old_pagename)]
+
+
+class InlineExecutor:
+    """Runs the work of a scan in the calling thread, one file after the other, like a ThreadPoolExecutor would with
+    a single worker but without the thread"""
+
+    def map(self, func, *iterables):
+        return map(func, *iterables)
+
+    def submit(self, func, *args) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        future.set_result(func(*args))
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+def scan_executor(workers: int):
+    """Returns the executor that checks and copies the files of the graph when scanning it, with workers threads"""
+    if workers <= 1:
+        return InlineExecutor()
+    return concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+
+
+# What scanning a file of the graph found it to be
+PAGE = "page"
+EMPTY_PAGE = "empty"
+OTHER_FILE = "other"
+
+
+def probe_markdown_file(fpath: str, graph: DirectoryGraph) -> tuple[str, list[str]]:
+    """Reads a page once, returning if it's empty and the aliases it declares"""
+    properties = {}
+    if is_empty_markdown_file(fpath, graph, properties):
+        return EMPTY_PAGE, []
+    return PAGE, property_aliases(properties)
+
+
+def probe_journal(fpath: str, graph: DirectoryGraph = None) -> tuple[str, list[str]]:
+    if graph is None:
+        graph = DirectoryGraph()
+    if not graph.isfile(fpath):
+        return OTHER_FILE, []
+    return probe_markdown_file(fpath, graph)
+
+
+def probe_page(fpath: str, graph: DirectoryGraph = None) -> tuple[str, list[str]]:
+    if graph is None:
+        graph = DirectoryGraph()
+    if not (graph.isfile(fpath) and is_markdown_file(fpath)):
+        return OTHER_FILE, []
+    return probe_markdown_file(fpath, graph)
+
+
+def is_output_collision(new_to_old_paths: dict, fpath: str, new_fpath: str) -> bool:
+    """Checks if another page of the graph already goes to new_fpath, eg a.b.md and a___b.md, and reports it"""
+    other = new_to_old_paths.get(new_fpath)
+    if other is None or other == fpath:
+        return False
+    logging.warning(f"skipping page that would overwrite {other} in the output, both go to {new_fpath}: {fpath}")
+    return True
+
+
 def copy_journals(
     args,
     old_journals: str,
@@ -424,36 +605,64 @@ def copy_journals(
     new_paths: set,
     pages_that_were_empty: dict,
     old_pagenames_to_new_paths: dict,
+    shard: typing.Optional[tuple[int, int]] = None,
+    output: DirectoryOutput = None,
+    workers: int = 1,
+    selected: set = None,
+    graph: DirectoryGraph = None,
+    page_aliases: dict = None,
 ):
-    for fname in os.listdir(old_journals):
-        fpath = os.path.join(old_journals, fname)
-        if os.path.isfile(fpath):
-            if not is_empty_markdown_file(fpath):
-                new_fpath = new_journals
+    """Copies the journal pages and maps them to their new paths
 
-                if args.journal_dashes:
-                    new_fpath = os.path.join(new_journals, fname.replace("_", "-"))
-                else:
-                    new_fpath = os.path.join(new_journals, fname)
+    With more than one worker, files are checked and copied on that many threads. The maps are still filled in the
+    order of the file names, so they're the same whatever the number of workers. With selected, only the pages at those
+    paths are checked and copied. The graph is read with graph, a directory by default. With page_aliases, the aliases
+    declared by each page are added to it by new path, from the same read as checking if the page is empty
+    """
+    if output is None:
+        output = DirectoryOutput()
+    if graph is None:
+        graph = DirectoryGraph()
+
+    fnames = sorted(graph.listdir(old_journals))
+    if selected is not None:
+        fnames = [fname for fname in fnames if os.path.join(old_journals, fname) in selected]
+    fpaths = [os.path.join(old_journals, fname) for fname in fnames]
+    copies = []
+    with scan_executor(workers) as executor:
+        probes = executor.map(probe_journal, fpaths, itertools.repeat(graph))
+        for fname, fpath, (kind, aliases) in zip(fnames, fpaths, probes):
+            if kind == PAGE:
+                new_fpath, pagenames = journal_path_and_names(args, new_journals, fname)
+                if is_output_collision(new_to_old_paths, fpath, new_fpath):
+                    continue
 
                 logging.info(
                     f"copying: {fpath} ->\n{' ' * len('INFO: copying: ')}{new_fpath}"
                 )
-                if not args.dryrun:
-                    shutil.copyfile(fpath, new_fpath)
+                if not args.dryrun and in_shard(shard, fpath):
+                    copies.append(executor.submit(output.copy_page, fpath, new_fpath))
                 old_to_new_paths[fpath] = new_fpath
                 new_to_old_paths[new_fpath] = fpath
                 new_paths.add(new_fpath)
 
-                newfile = os.path.splitext(fname)[0]
-                old_pagenames_to_new_paths[newfile] = new_fpath
-
-                if args.journal_dashes:
-                    old_pagenames_to_new_paths[newfile.replace("_", "-")] = new_fpath
-            else:
+                for pagename in pagenames:
+                    old_pagenames_to_new_paths[pagename] = new_fpath
+                if page_aliases is not None and aliases:
+                    page_aliases[new_fpath] = aliases
+            elif kind == EMPTY_PAGE:
                 pages_that_were_empty.add(fname)
-        else:
-            logging.info(f"not copying: {fpath}")
+            else:
+                logging.info(f"not copying: {fpath}")
+
+        # Raises the first error copying a file, if any
+        for copy in copies:
+            copy.result()
+
+
+def copy_page(output: DirectoryOutput, fpath: str, new_fpath: str):
+    output.makedirs(os.path.dirname(new_fpath))
+    output.copy_page(fpath, new_fpath)
 
 
 def copy_pages(
@@ -465,146 +674,615 @@ def copy_pages(
     new_paths: set,
     pages_that_were_empty: dict,
     old_pagenames_to_new_paths: dict,
+    shard: typing.Optional[tuple[int, int]] = None,
+    output: DirectoryOutput = None,
+    workers: int = 1,
+    selected: set = None,
+    graph: DirectoryGraph = None,
+    page_aliases: dict = None,
 ):
-    for fname in os.listdir(old_pages):
-        fpath = os.path.join(old_pages, fname)
-        if os.path.isfile(fpath) and is_markdown_file(fpath):
-            hierarchy = get_namespace_hierarchy(args, fname)
-            hierarchical_pagename = "/".join(hierarchy)
-            if is_empty_markdown_file(fpath):
+    """Copies the pages, in the folders of their namespaces, and the other files, and maps the pages to their new paths
+
+    With more than one worker, files are checked and copied on that many threads, like in copy_journals. With selected,
+    only the pages at those paths are checked and copied, and no other files. page_aliases is filled like in
+    copy_journals
+    """
+    if output is None:
+        output = DirectoryOutput(copy_hash=args.copy_hash)
+    if graph is None:
+        graph = DirectoryGraph()
+
+    fnames = sorted(graph.listdir(old_pages))
+    if selected is not None:
+        fnames = [fname for fname in fnames if os.path.join(old_pages, fname) in selected]
+    fpaths = [os.path.join(old_pages, fname) for fname in fnames]
+    copies = []
+    with scan_executor(workers) as executor:
+        probes = executor.map(probe_page, fpaths, itertools.repeat(graph))
+        for fname, fpath, (kind, aliases) in zip(fnames, fpaths, probes):
+            if kind == EMPTY_PAGE:
                 pages_that_were_empty.add(fname)
-            else:
-                new_fpath = os.path.join(new_base, *hierarchy)
-                new_fpath = fix_escapes(new_fpath)
+            elif kind == PAGE:
+                new_fpath, pagenames = page_path_and_names(args, new_base, fname)
+                if is_output_collision(new_to_old_paths, fpath, new_fpath):
+                    continue
+
                 logging.info(
                     f"copying: {fpath} ->\n{' ' * len('INFO: copying: ')}{new_fpath}"
                 )
-                new_dirname = os.path.split(new_fpath)[0]
-                if not args.dryrun:
-                    os.makedirs(new_dirname, exist_ok=True)
-                    shutil.copyfile(fpath, new_fpath)
+                if not args.dryrun and in_shard(shard, fpath):
+                    copies.append(executor.submit(copy_page, output, fpath, new_fpath))
                 old_to_new_paths[fpath] = new_fpath
                 new_to_old_paths[new_fpath] = fpath
                 new_paths.add(new_fpath)
 
-                old_pagename = os.path.splitext(hierarchical_pagename)[0]
-                old_pagenames_to_new_paths[old_pagename] = new_fpath
-                # Add mapping of unencoded filename for links
-                old_pagenames_to_new_paths[
-                    unencode_filenames_for_links(old_pagename)
-                ] = new_fpath
-        else:  # copy non-markdown files verbatim
-            new_fpath = os.path.join(new_base, os.path.basename(fpath))
-            logging.warning(
-                f"copying: {fpath} ->\n{' ' * len('WARNING: copying: ')}{new_fpath}"
+                for pagename in pagenames:
+                    old_pagenames_to_new_paths[pagename] = new_fpath
+                if page_aliases is not None and aliases:
+                    page_aliases[new_fpath] = aliases
+            else:  # copy non-markdown files verbatim
+                if not in_shard(shard, fpath):
+                    continue
+                new_fpath = os.path.join(new_base, os.path.basename(fpath))
+                logging.warning(
+                    f"copying: {fpath} ->\n{' ' * len('WARNING: copying: ')}{new_fpath}"
+                )
+                if not args.dryrun:
+                    copies.append(executor.submit(output.copy_file, fpath, new_fpath))
+
+        for copy in copies:
+            copy.result()
+
+
+def read_page(fpath: str, graph: DirectoryGraph = None) -> bytes:
+    """Reads the raw contents of a page to convert"""
+    if graph is None:
+        graph = DirectoryGraph()
+    with graph.open(fpath) as f:
+        return f.read()
+
+
+def decode_page(data: bytes) -> list[str]:
+    """Splits the raw contents of a page into lines, the same way that reading the file in text mode does"""
+    return io.StringIO(data.decode("utf-8", errors="replace"), newline=None).readlines()
+
+
+def is_unaffected_by_rules(args, data: bytes) -> bool:
+    """Given the raw contents of a page, checks that converting it would leave it byte for byte unchanged
+
+    This is the case when it contains nothing that any of the rules in convert_page act on, it doesn't need its line
+    endings normalised and it decodes cleanly
+    """
+    if args.unindent_once:
+        return False
+
+    if RULE_TRIGGERS.search(data) is not None:
+        return False
+
+    if not data.isascii():
+        try:
+            data.decode("utf-8")
+        except UnicodeDecodeError:
+            return False
+
+    return True
+
+
+def convert_front_matter(args, lines: list[str]) -> tuple[list[str], int]:
+    """Replaces the 'title:: my note' style of front matter with the Obsidian style (triple dashed)
+
+    Returns the converted front matter lines, and the index of the first line after the front matter
+    """
+    newlines = []
+    front_matter = {}
+    first_line_after_front_matter = 0
+    for idx, line in enumerate(lines):
+        match = re.match(r"(.*?)::[\s]*(.*)", line)
+        if match is not None:
+            front_matter[match[1]] = match[2]
+            first_line_after_front_matter = idx + 1
+        else:
+            break
+    if bool(front_matter):
+        # import ipdb; ipdb.set_trace()
+        newlines.append("---\n")
+        for key in front_matter:
+            if (
+                key.find("tags") >= 0 or key.find("Tags") >= 0
+            ) and args.tag_prop_to_taglist:
+                # convert tags:: value1, #[[value 2]]
+                # to
+                # taglinks:
+                #   - "[[value1]]"
+                #   - "[[value 2]]"
+                tags = front_matter[key].split(",")
+
+                newlines.append("Taglinks:\n")
+                for tag in tags:
+                    tag = tag.strip()
+                    clean_tag = tag.replace("#", "")
+                    clean_tag = clean_tag.replace("[[", "")
+                    clean_tag = clean_tag.replace("]]", "")
+
+                    newlines.append('  - "[[' + clean_tag + ']]"' + "\n")
+            elif is_alias_property(key) and parse_aliases(front_matter[key]):
+                # convert alias:: value1, [[value 2]]
+                # to
+                # aliases:
+                #   - "value1"
+                #   - "value 2"
+                newlines.append("aliases:\n")
+                for alias in parse_aliases(front_matter[key]):
+                    alias = alias.replace("\\", "\\\\").replace('"', '\\"')
+                    newlines.append('  - "' + alias + '"' + "\n")
+            else:
+                newlines.append(key + ": " + front_matter[key] + "\n")
+        newlines.append("---\n")
+
+    return newlines, first_line_after_front_matter
+
+
+def convert_line_contents(
+    args,
+    line: str,
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    old_path: str,
+    copy_asset: typing.Callable[[str, str], bool],
+    place_asset: typing.Callable[[str, str], str] = None,
+) -> str:
+    """Applies the rules that act on the contents of a line, rather than on the structure of the page"""
+    # Update links and tags
+    line = update_links_and_tags(
+        args, line, old_pagenames_to_new_paths, fpath
+    )
+
+    # Update assets
+    line = update_assets(line, old_path, fpath, args.assets_dir, copy_asset, place_asset)
+
+    # Update image dimensions
+    line = update_image_dimensions(line)
+
+    # Remove block links and embeds
+    line = remove_block_links_embeds(line)
+
+    # Self-explanatory
+    line = add_space_after_hyphen_that_ends_line(line)
+
+    # Self-explanatory
+    line = convert_todos(line)
+
+    # < and > need to be escaped to show up as normal characters in Obsidian
+    line = escape_lt_gt(line)
+
+    # Make sure images are indented correctly
+    line = add_bullet_before_indented_image(line)
+
+    return line
+
+
+def convert_lines(
+    args,
+    lines: typing.Iterable[str],
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    old_path: str,
+    copy_asset: typing.Callable[[str, str], bool],
+    place_asset: typing.Callable[[str, str], str] = None,
+) -> typing.Iterator[str]:
+    """Converts the lines of a page after its front matter, one line at a time
+
+    This is a generator, so that pages can be converted while they're being read
+    """
+    global INSIDE_CODE_BLOCK
+
+    for line in lines:
+        ORIGINAL_LINE = line
+
+        # Update global state if this is the end of a code block
+        if INSIDE_CODE_BLOCK and line == "```\n":
+            INSIDE_CODE_BLOCK = False
+
+        # Ignore if the line if it's a collapsed:: true line
+        if is_collapsed_line(line):
+            continue
+
+        # Convert empty lines in logseq to empty lines in Obsidian
+        line = convert_empty_line(line)
+
+        # Convert 2-4 spaces to a tab
+        line = convert_spaces_to_tabs(line)
+
+        # Unindent once if the user requested it
+        if args.unindent_once:
+            line = unindent_once(line)
+
+        # Add a line above the start of a code block in a list
+        code_block_lines = prepend_code_block(line)
+        if len(code_block_lines) > 0:
+            yield code_block_lines[0]
+            line = code_block_lines[1]
+
+        line = convert_line_contents(
+            args, line, fpath, old_pagenames_to_new_paths, old_path, copy_asset, place_asset
+        )
+
+        yield line
+
+
+# The rules of convert_lines that only depend on the line they're on, as regexes over a whole page
+COLLAPSED_LINES = re.compile(r"^[^\S\n]*collapsed:: true.*\n?", re.MULTILINE)
+EMPTY_LINES = re.compile(r"^- *$", re.MULTILINE)
+INDENTATION_SPACES = re.compile(r" {2,4}")
+FIRST_INDENTATION = re.compile(r"^(?:\t|- )", re.MULTILINE)
+CODE_BLOCK_STARTS = re.compile(r"^(\t*)-[ *]```(\w+).*\n?", re.MULTILINE)
+HYPHENS_ENDING_LINES = re.compile(r"-$", re.MULTILINE)
+DONE_TASKS = re.compile(r"^- DONE", re.MULTILINE)
+TODO_TASKS = re.compile(r"^- TODO", re.MULTILINE)
+LT_NOT_STARTING_LINES = re.compile(r"(?<!^)<", re.MULTILINE)
+GT_NOT_STARTING_LINES = re.compile(r"(?<!^)>", re.MULTILINE)
+INDENTED_IMAGES = re.compile(r"^(\t+)(!\[.*$)", re.MULTILINE)
+
+
+def convert_text_contents(
+    args,
+    text: str,
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    old_path: str,
+    copy_asset: typing.Callable[[str, str], bool],
+    place_asset: typing.Callable[[str, str], str] = None,
+) -> str:
+    """Applies the rules of convert_line_contents to many lines at once"""
+    # These match within a line, so they can be given the whole text
+    text = update_links_and_tags(args, text, old_pagenames_to_new_paths, fpath)
+    text = update_assets(text, old_path, fpath, args.assets_dir, copy_asset, place_asset)
+    text = update_image_dimensions(text)
+    text = remove_block_links_embeds(text)
+
+    text = HYPHENS_ENDING_LINES.sub("- ", text)
+    text = DONE_TASKS.sub("- [X]", text)
+    text = TODO_TASKS.sub("- [ ]", text)
+    text = LT_NOT_STARTING_LINES.sub(r"\<", text)
+    text = GT_NOT_STARTING_LINES.sub(r"\>", text)
+    text = INDENTED_IMAGES.sub(r"\1- \2", text)
+    return text
+
+
+def convert_multiline(
+    args,
+    lines: list[str],
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    old_path: str,
+    copy_asset: typing.Callable[[str, str], bool],
+    place_asset: typing.Callable[[str, str], str] = None,
+) -> list[str]:
+    """Converts the lines of a page after its front matter like convert_lines, but applies each rule to the whole page
+    at once rather than calling every rule on every line
+
+    Every rule of convert_lines only depends on the line it's applied to, so applying the rules one after the other to
+    every line gives the same result as applying all of them to each line in turn. The lines starting a code block are
+    the exception, as the line added above them isn't converted, so the page is converted in chunks around them
+    """
+    if INSIDE_CODE_BLOCK:
+        return list(convert_lines(args, lines, fpath, old_pagenames_to_new_paths, old_path, copy_asset, place_asset))
+
+    text = "".join(lines)
+    text = COLLAPSED_LINES.sub("", text)
+    text = EMPTY_LINES.sub("", text)
+    text = INDENTATION_SPACES.sub("\t", text)
+    if args.unindent_once:
+        text = FIRST_INDENTATION.sub("", text)
+
+    chunks = []
+    pos = 0
+    for match in CODE_BLOCK_STARTS.finditer(text):
+        chunks.append(
+            convert_text_contents(
+                args, text[pos:match.start()], fpath, old_pagenames_to_new_paths, old_path, copy_asset, place_asset
             )
-            if not args.dryrun:
-                shutil.copyfile(fpath, new_fpath)
+        )
+        # As in prepend_code_block. No rule changes the fence itself
+        chunks.append(match[1] + "- " + match[2] + " code block below:\n" + match[1] + "```" + match[2] + "\n")
+        pos = match.end()
+    chunks.append(
+        convert_text_contents(
+            args, text[pos:], fpath, old_pagenames_to_new_paths, old_path, copy_asset, place_asset
+        )
+    )
 
+    return io.StringIO("".join(chunks), newline="\n").readlines()
 
-def convert_contents(
+
+def convert_indentation(line: str) -> str:
+    """Converts 2-4 spaces to a tab in the leading whitespace of a line only"""
+    indentation, rest = split_indentation(line)
+    return convert_spaces_to_tabs(indentation) + rest
+
+
+def convert_text_block(
     args,
-    new_paths: set,
+    block: Block,
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    old_path: str,
+    copy_asset: typing.Callable[[str, str], bool],
+    place_asset: typing.Callable[[str, str], str] = None,
+) -> list[str]:
+    """Converts a block of text, applying the rules on the contents of its lines to the whole block at once"""
+    newlines = []
+    for idx, line in enumerate(block.lines):
+        # Drop the collapsed:: true block property
+        if 1 <= idx <= len(block.properties) and block.properties[idx - 1] == ("collapsed", "true"):
+            continue
+
+        line = convert_empty_line(convert_indentation(line))
+        if args.unindent_once:
+            line = unindent_once(line)
+        newlines.append(line)
+
+    # A text block has no code fence, so the rules give the same result on its text as on each of its lines
+    text = convert_text_contents(
+        args, "".join(newlines), fpath, old_pagenames_to_new_paths, old_path, copy_asset, place_asset
+    )
+    return io.StringIO(text, newline="\n").readlines()
+
+
+def convert_code_block(args, block: Block) -> list[str]:
+    """Code blocks are copied as they are, apart from the indentation that places them in the outline"""
+    newlines = []
+
+    first_line = convert_indentation(block.lines[0])
+    if args.unindent_once:
+        first_line = unindent_once(first_line)
+    code_block_lines = prepend_code_block(first_line)
+    newlines.extend(code_block_lines if code_block_lines else [first_line])
+
+    # The code is indented like the first line, plus two spaces if it's after a bullet
+    indentation, rest = split_indentation(block.lines[0])
+    if rest.startswith("-"):
+        indentation += "  "
+    new_indentation = convert_spaces_to_tabs(indentation)
+    for line in block.lines[1:]:
+        if line.startswith(indentation):
+            line = new_indentation + line[len(indentation):]
+        if args.unindent_once:
+            line = unindent_once(line)
+        newlines.append(line)
+
+    return newlines
+
+
+def convert_outline(
+    args,
+    lines: list[str],
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    old_path: str,
+    copy_asset: typing.Callable[[str, str], bool],
+    place_asset: typing.Callable[[str, str], str] = None,
+) -> list[str]:
+    """Converts the lines of a page after its front matter, by parsing it into blocks and converting each block by type
+
+    Unlike convert_lines, code blocks are left untouched, only leading spaces are converted to tabs, and only the
+    collapsed:: true properties of blocks are removed
+    """
+    newlines = []
+    for block in iter_blocks(parse_outline(lines)):
+        if block.kind == CODE:
+            newlines.extend(convert_code_block(args, block))
+        else:
+            newlines.extend(
+                convert_text_block(
+                    args, block, fpath, old_pagenames_to_new_paths, old_path, copy_asset, place_asset
+                )
+            )
+    return newlines
+
+
+# Ways of converting the lines of a page after its front matter, selected with --engine
+ENGINES = {
+    "lines": convert_lines,
+    "outline": convert_outline,
+    "multiline": convert_multiline,
+}
+
+
+def convert_page(
+    args,
+    lines: list[str],
+    fpath: str,
+    old_pagenames_to_new_paths: dict,
+    new_to_old_paths: dict,
+    memory: MemoryTracker = None,
+    output: DirectoryOutput = None,
+) -> list[str]:
+    """Given the lines of a logseq page that is written to fpath, returns the lines of the converted page"""
+    copy_asset = asset_copier(args, memory, output)
+
+    newlines, first_line_after_front_matter = convert_front_matter(args, lines)
+    newlines.extend(
+        ENGINES[args.engine](
+            args,
+            lines[first_line_after_front_matter:],
+            fpath,
+            old_pagenames_to_new_paths,
+            new_to_old_paths[fpath],
+            copy_asset,
+            asset_placer(output),
+        )
+    )
+
+    return newlines
+
+
+def convert_page_streaming(
+    args,
+    fpath: str,
     old_pagenames_to_new_paths: dict,
     new_to_old_paths: dict,
+    memory: MemoryTracker = None,
+    output: DirectoryOutput = None,
+    graph: DirectoryGraph = None,
 ):
-    global INSIDE_CODE_BLOCK
-    for fpath in new_paths:
-        newlines = []
-        with open(fpath, "r", encoding="utf-8", errors="replace") as f:
-            lines = f.readlines()
-
-            # First replace the 'title:: my note' style of front matter with the Obsidian style (triple dashed)
-            front_matter = {}
-            in_front_matter = False
-            first_line_after_front_matter = 0
-            for idx, line in enumerate(lines):
-                match = re.match(r"(.*?)::[\s]*(.*)", line)
-                if match is not None:
-                    front_matter[match[1]] = match[2]
-                    first_line_after_front_matter = idx + 1
-                else:
-                    break
-            if bool(front_matter):
-                # import ipdb; ipdb.set_trace()
-                newlines.append("---\n")
-                for key in front_matter:
-                    if (
-                        key.find("tags") >= 0 or key.find("Tags") >= 0
-                    ) and args.tag_prop_to_taglist:
-                        # convert tags:: value1, #[[value 2]]
-                        # to
-                        # taglinks:
-                        #   - "[[value1]]"
-                        #   - "[[value 2]]"
-                        tags = front_matter[key].split(",")
-
-                        newlines.append("Taglinks:\n")
-                        for tag in tags:
-                            tag = tag.strip()
-                            clean_tag = tag.replace("#", "")
-                            clean_tag = clean_tag.replace("[[", "")
-                            clean_tag = clean_tag.replace("]]", "")
-
-                            newlines.append('  - "[[' + clean_tag + ']]"' + "\n")
-                    else:
-                        newlines.append(key + ": " + front_matter[key] + "\n")
-                newlines.append("---\n")
-
-            for line in lines[first_line_after_front_matter:]:
-                ORIGINAL_LINE = line
-
-                # Update global state if this is the end of a code block
-                if INSIDE_CODE_BLOCK and line == "```\n":
-                    INSIDE_CODE_BLOCK = False
-
-                # Ignore if the line if it's a collapsed:: true line
-                if is_collapsed_line(line):
-                    continue
+    """Converts the page at fpath like convert_page, but one line at a time, without holding it in memory
+
+    Only the lines engine can convert a page this way. If it fails, eg when it runs out of time, the page is left as it
+    was
+    """
+    if output is None:
+        output = DirectoryOutput(copy_hash=args.copy_hash)
+    if graph is None:
+        graph = DirectoryGraph()
+    copy_asset = asset_copier(args, memory, output)
+
+    with graph.open_text(new_to_old_paths[fpath]) as fin, output.open_page(
+        fpath
+    ) as fout:
+        # Read up to the first line after the front matter
+        head = []
+        for line in fin:
+            head.append(line)
+            if re.match(r"(.*?)::[\s]*(.*)", line) is None:
+                break
 
-                # Convert empty lines in logseq to empty lines in Obsidian
-                line = convert_empty_line(line)
+        front_matter, first_line_after_front_matter = convert_front_matter(args, head)
+        fout.writelines(front_matter)
+        fout.writelines(
+            convert_lines(
+                args,
+                itertools.chain(head[first_line_after_front_matter:], fin),
+                fpath,
+                old_pagenames_to_new_paths,
+                new_to_old_paths[fpath],
+                copy_asset,
+                asset_placer(output),
+            )
+        )
 
-                # Convert 2-4 spaces to a tab
-                line = convert_spaces_to_tabs(line)
 
-                # Unindent once if the user requested it
-                if args.unindent_once:
-                    line = unindent_once(line)
+def asset_copier(
+    args, memory: MemoryTracker = None, output: DirectoryOutput = None
+) -> typing.Callable[[str, str], bool]:
+    """Returns the function used to copy assets, measured as the 'assets' phase if memory use is reported
 
-                # Add a line above the start of a code block in a list
-                lines = prepend_code_block(line)
-                if len(lines) > 0:
-                    newlines.append(lines[0])
-                    line = lines[1]
+    How long a copy takes depends on the size of the asset and on the storage rather than on the page, so it doesn't
+    count towards the time limit of the page
+    """
+    if output is None:
+        output = DirectoryOutput(copy_hash=args.copy_hash)
 
-                # Update links and tags
-                line = update_links_and_tags(
-                    args, line, old_pagenames_to_new_paths, fpath
-                )
+    def copy_asset(src: str, dst: str) -> bool:
+        with page_time_limit_paused():
+            return output.copy_asset(src, dst)
+
+    if memory is None or not memory.report:
+        return copy_asset
+
+    def copy_asset_measured(src: str, dst: str) -> bool:
+        with memory.phase("assets"):
+            return copy_asset(src, dst)
+
+    return copy_asset_measured
+
+
+def asset_placer(output: DirectoryOutput = None) -> typing.Callable[[str, str], str]:
+    """Returns the function deciding where assets go, or None to copy them next to the pages embedding them
+
+    Placing an asset can hash it, which doesn't count towards the time limit of the page either
+    """
+    attachments = getattr(output, "attachments", None)
+    if attachments is None:
+        return None
+
+    def place_asset(src: str, page_fpath: str) -> str:
+        with page_time_limit_paused():
+            return attachments.place(src, page_fpath)
+
+    return place_asset
 
-                # Update assets
-                line = update_assets(line, new_to_old_paths[fpath], fpath, args.assets_dir)
 
-                # Update image dimensions
-                line = update_image_dimensions(line)
+def fits_in_memory(args, fpath: str, memory: MemoryTracker, graph: DirectoryGraph = None) -> bool:
+    """Checks if the page at fpath (in the graph) can be converted in memory without going over the memory budget"""
+    if graph is None:
+        graph = DirectoryGraph()
+    size, _ = graph.stat(fpath)
+    if memory.fits(size * PAGE_MEMORY_FACTOR):
+        return True
 
-                # Remove block links and embeds
-                line = remove_block_links_embeds(line)
+    if args.engine != "lines":
+        logging.warning(f"converting in memory despite the memory budget, only --engine lines can stream: {fpath}")
+        return True
 
-                # Self-explanatory
-                line = add_space_after_hyphen_that_ends_line(line)
+    return False
 
-                # Self-explanatory
-                line = convert_todos(line)
 
-                # < and > need to be escaped to show up as normal characters in Obsidian
-                line = escape_lt_gt(line)
+def log_page_timeout(args, fpath: str):
+    logging.warning(
+        f"skipping page that took longer than {args.page_timeout}s to convert, it is left unconverted: {fpath}"
+    )
 
-                # Make sure images are indented correctly
-                line = add_bullet_before_indented_image(line)
 
-                newlines.append(line)
+def convert_contents(
+    args,
+    new_paths: set,
+    old_pagenames_to_new_paths: dict,
+    new_to_old_paths: dict,
+    memory: MemoryTracker = None,
+    checkpoint: Checkpoint = None,
+    output: DirectoryOutput = None,
+    graph: DirectoryGraph = None,
+):
+    """Converts the pages at new_paths, reading them from the graph and writing them to the output
 
-        with open(fpath, "w", encoding="utf-8") as f:
-            f.writelines(newlines)
+    Reading the graph rather than the verbatim copy means that converting a page again gives the same result, so a
+    resumed run can redo any page that the interrupted run didn't record as converted in its checkpoint
+    """
+    if memory is None:
+        memory = MemoryTracker()
+    if output is None:
+        output = DirectoryOutput(copy_hash=args.copy_hash)
+    if graph is None:
+        graph = DirectoryGraph()
+
+    # Sorted so that runs (and shards of a run) always process pages in the same order
+    for fpath in sorted(new_paths):
+        with memory.page(fpath):
+            if not fits_in_memory(args, new_to_old_paths[fpath], memory, graph):
+                logging.info(f"streaming to stay within the memory budget: {fpath}")
+                try:
+                    with page_time_limit(args.page_timeout):
+                        convert_page_streaming(
+                            args, fpath, old_pagenames_to_new_paths, new_to_old_paths, memory, output, graph
+                        )
+                except PageTimeout:
+                    log_page_timeout(args, fpath)
+                    output.keep_page(new_to_old_paths[fpath], fpath)
+                    continue
+                if checkpoint is not None:
+                    checkpoint.page_done(fpath, new_to_old_paths[fpath])
+                continue
+
+            data = read_page(new_to_old_paths[fpath], graph)
+            # The page was already copied verbatim when scanning, which is all there is to do if no rule applies to it
+            if is_unaffected_by_rules(args, data):
+                logging.debug(f"unchanged: {fpath}")
+                output.keep_page(new_to_old_paths[fpath], fpath)
+                if checkpoint is not None:
+                    checkpoint.page_done(fpath, new_to_old_paths[fpath])
+                continue
+
+            try:
+                with page_time_limit(args.page_timeout):
+                    newlines = convert_page(
+                        args, decode_page(data), fpath, old_pagenames_to_new_paths, new_to_old_paths, memory, output
+                    )
+            except PageTimeout:
+                # The verbatim copy made when scanning stays in place
+                log_page_timeout(args, fpath)
+                output.keep_page(new_to_old_paths[fpath], fpath)
+                continue
+            output.write_page(fpath, newlines)
+            if checkpoint is not None:
+                checkpoint.page_done(fpath, new_to_old_paths[fpath])
@@ -0,0 +1,149 @@
+import errno
+import hashlib
+import os
+import shutil
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# ioctl that makes a file share its blocks with another one (a reflink) on btrfs, xfs and other copy-on-write
+# filesystems - _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+# Errors meaning that a copy method isn't supported for this pair of files, so the next one should be tried
+UNSUPPORTED_ERRNOS = {
+    getattr(errno, name)
+    for name in ["ENOSYS", "EXDEV", "EINVAL", "ENOTSUP", "EOPNOTSUPP", "EBADF", "ETXTBSY"]
+    if hasattr(errno, name)
+}
+
+
+def file_digest(fpath: str) -> str:
+    """Returns the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def files_match(src: str, dst: str, compare_hash: bool = False) -> bool:
+    """Checks if dst already is a copy of src
+
+    By default they match if they have the same size and modification time, which copy_file preserves. With compare_hash
+    the contents are compared instead of the modification times
+    """
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+
+    src_stat = os.stat(src)
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+
+    if compare_hash:
+        return file_digest(src) == file_digest(dst)
+
+    return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+def _reflink(src_fd: int, dst_fd: int) -> bool:
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError:
+        return False
+    return True
+
+
+def _copy_in_kernel(copy_chunk, src_fd: int, dst_fd: int, size: int) -> bool:
+    """Copies with copy_chunk(src_fd, dst_fd, offset, count) until size bytes are copied
+
+    Returns False if the method isn't supported before anything was copied, including when it copies nothing, as
+    copy_file_range does on some filesystems
+    """
+    offset = 0
+    while offset < size:
+        try:
+            copied = copy_chunk(src_fd, dst_fd, offset, size - offset)
+        except OSError as e:
+            if offset == 0 and e.errno in UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if copied == 0:
+            if offset == 0:
+                return False
+            if os.fstat(src_fd).st_size > offset:
+                # The method stopped short of the end of the file, so the rest is read and written
+                _copy_rest(src_fd, dst_fd, offset)
+            # Otherwise the source shrank while being copied
+            break
+        offset += copied
+    return True
+
+
+def _copy_rest(src_fd: int, dst_fd: int, offset: int):
+    """Copies the contents of src_fd from offset on to the same offset of dst_fd"""
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    with open(src_fd, "rb", closefd=False) as fsrc, open(dst_fd, "wb", closefd=False) as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _copy_contents(src_fd: int, dst_fd: int, size: int):
+    """Copies the contents of src_fd to dst_fd, trying the cheapest method first"""
+    if _reflink(src_fd, dst_fd):
+        return
+    if hasattr(os, "copy_file_range") and _copy_in_kernel(_copy_file_range, src_fd, dst_fd, size):
+        return
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux") and _copy_in_kernel(_sendfile, src_fd, dst_fd, size):
+        return
+
+    with open(src_fd, "rb", closefd=False) as fsrc, open(dst_fd, "wb", closefd=False) as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+
+
+def copy_file(src: str, dst: str, compare_hash: bool = False) -> bool:
+    """Copies the file src to dst, unless dst already is a copy of it (see files_match). Returns True if it was copied
+
+    The copy is made by reflinking where the filesystem supports it, in the kernel with copy_file_range or sendfile
+    otherwise, and by reading and writing as a last resort. It is written to a temporary file that then replaces dst, so
+    dst is never left half written, and it gets src's modification time so that later runs can skip it
+    """
+    if files_match(src, dst, compare_hash):
+        return False
+
+    with open(src, "rb") as fsrc:
+        src_stat = os.fstat(fsrc.fileno())
+        tmp = os.path.join(
+            os.path.dirname(dst), f".{os.path.basename(dst)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        dst_fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            try:
+                _copy_contents(fsrc.fileno(), dst_fd, src_stat.st_size)
+            finally:
+                os.close(dst_fd)
+            os.utime(tmp, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    return True
@@ -0,0 +1,250 @@
+import hashlib
+import io
+import os
+import posixpath
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+
+from logseqtoobsidian.copying import copy_file, file_digest
+
+# The folders of a graph holding its pages
+GRAPH_FOLDERS = ["journals", "pages"]
+
+
+class DirectoryGraph:
+    """Reads the logseq graph from a directory"""
+
+    def __init__(self, base: str = None):
+        self.base = base
+
+    def isdir(self, dirname: str) -> bool:
+        return os.path.isdir(dirname)
+
+    def listdir(self, dirname: str) -> list[str]:
+        return os.listdir(dirname)
+
+    def isfile(self, fpath: str) -> bool:
+        return os.path.isfile(fpath)
+
+    def stat(self, fpath: str) -> tuple[int, float]:
+        """Returns the size and modification time of a file"""
+        st = os.stat(fpath)
+        return st.st_size, st.st_mtime
+
+    def open(self, fpath: str):
+        return open(fpath, "rb")
+
+    def open_text(self, fpath: str):
+        return open(fpath, "r", encoding="utf-8", errors="replace")
+
+    def copy_page(self, src: str, dst: str):
+        shutil.copyfile(src, dst)
+
+    def copy_file(self, src: str, dst: str, compare_hash: bool = False) -> bool:
+        return copy_file(src, dst, compare_hash=compare_hash)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def graph_root(names: list[str]) -> str:
+    """Returns the folder of an archive holding the graph, eg "" or "graph/", given the names of its files
+
+    That's the shallowest folder with both a journals and a pages folder, or None if there is none
+    """
+    dirs = set()
+    for name in names:
+        parent = posixpath.dirname(name)
+        while parent and parent not in dirs:
+            dirs.add(parent)
+            parent = posixpath.dirname(parent)
+
+    roots = [
+        root
+        for root in dirs | {""}
+        if all(posixpath.join(root, folder) in dirs for folder in GRAPH_FOLDERS)
+    ]
+    if not roots:
+        return None
+    root = min(roots, key=lambda root: (root.count("/"), root))
+    return root + "/" if root else ""
+
+
+class ArchiveGraph:
+    """Reads the logseq graph from a zip or tar archive, without extracting it first
+
+    Files of the graph have paths under the archive's path, eg graph.zip/pages/foo.md, whatever the folder holding the
+    graph in the archive. Pages and assets are streamed from the archive when they are read or copied, so assets are
+    only read if a page embeds them. Tar archives can only be read in order, so their pages are read into memory while
+    listing them, and reading an asset from a compressed tar archive can mean decompressing it up to that asset
+    """
+
+    def __init__(self, fpath: str):
+        self.path = fpath
+        self.base = fpath
+        self._lock = threading.Lock()
+        self._zip = None
+        self._tar = None
+        # Path relative to the graph -> ZipInfo or TarInfo
+        self._members = {}
+        # Pages of tar archives, as path relative to the graph -> contents
+        self._pages = {}
+        # Folder relative to the graph -> names of the files and folders in it
+        self._dirs = {}
+        # Whether opening the archive read all of its pages into memory, which tar archives need
+        self.pages_in_memory = False
+
+        if zipfile.is_zipfile(fpath):
+            self._zip = zipfile.ZipFile(fpath)
+            members = [(info.filename, info) for info in self._zip.infolist() if not info.is_dir()]
+            contents = {}
+        elif tarfile.is_tarfile(fpath):
+            self._tar = tarfile.open(fpath, "r:*")
+            self.pages_in_memory = True
+            members = []
+            contents = {}
+            for member in self._tar:
+                if not member.isfile():
+                    continue
+                members.append((member.name, member))
+                if _is_page_name(member.name):
+                    contents[member.name] = self._tar.extractfile(member).read()
+        else:
+            raise ValueError(f"'{fpath}' is neither a directory nor a zip or tar archive")
+
+        names = {posixpath.normpath(name).lstrip("/"): (name, member) for name, member in members}
+        root = graph_root(list(names))
+        if root is None:
+            raise ValueError(f"The archive '{fpath}' is not a logseq graph, it has no journals and pages folders.")
+
+        for name, (original, member) in names.items():
+            if not name.startswith(root):
+                continue
+            relpath = name[len(root) :]
+            self._members[relpath] = member
+            if original in contents:
+                self._pages[relpath] = contents[original]
+            parent, child = posixpath.split(relpath)
+            while True:
+                self._dirs.setdefault(parent, set()).add(child)
+                if not parent:
+                    break
+                parent, child = posixpath.split(parent)
+
+    def _relpath(self, fpath: str) -> str:
+        relpath = os.path.relpath(fpath, self.base).replace(os.sep, "/")
+        return "" if relpath == "." else relpath
+
+    def _member(self, fpath: str):
+        member = self._members.get(self._relpath(fpath))
+        if member is None:
+            raise FileNotFoundError(fpath)
+        return member
+
+    def isdir(self, dirname: str) -> bool:
+        return self._relpath(dirname) in self._dirs
+
+    def listdir(self, dirname: str) -> list[str]:
+        names = self._dirs.get(self._relpath(dirname))
+        if names is None:
+            raise FileNotFoundError(dirname)
+        return list(names)
+
+    def isfile(self, fpath: str) -> bool:
+        return self._relpath(fpath) in self._members
+
+    def stat(self, fpath: str) -> tuple[int, float]:
+        member = self._member(fpath)
+        if self._zip is not None:
+            return member.file_size, time.mktime(member.date_time + (0, 0, -1))
+        return member.size, float(member.mtime)
+
+    def open(self, fpath: str):
+        member = self._member(fpath)
+        if self._zip is not None:
+            return self._zip.open(member)
+        relpath = self._relpath(fpath)
+        if relpath in self._pages:
+            return io.BytesIO(self._pages[relpath])
+        # Reading a tar archive moves its position, so one member at a time
+        with self._lock:
+            return io.BytesIO(self._tar.extractfile(member).read())
+
+    def open_text(self, fpath: str):
+        return io.TextIOWrapper(self.open(fpath), encoding="utf-8", errors="replace")
+
+    def _digest(self, fpath: str) -> str:
+        digest = hashlib.sha256()
+        with self.open(fpath) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _extract(self, src: str, dst: str, mtime: float = None):
+        """Writes a file of the archive to dst, replacing it in one go"""
+        tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with self.open(src) as fsrc, open(tmp, "wb") as fdst:
+                shutil.copyfileobj(fsrc, fdst)
+            if mtime is not None:
+                os.utime(tmp, (mtime, mtime))
+            os.replace(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def copy_page(self, src: str, dst: str):
+        self._extract(src, dst)
+
+    def copy_file(self, src: str, dst: str, compare_hash: bool = False) -> bool:
+        """Extracts a file of the archive to dst, unless dst already is a copy of it, like copying.copy_file"""
+        size, mtime = self.stat(src)
+        try:
+            st = os.stat(dst)
+        except FileNotFoundError:
+            st = None
+        if st is not None and st.st_size == size:
+            if compare_hash and self._digest(src) == file_digest(dst):
+                return False
+            if not compare_hash and st.st_mtime == mtime:
+                return False
+
+        self._extract(src, dst, mtime)
+        return True
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _is_page_name(name: str) -> bool:
+    """Checks if a file of an archive is a page of a graph, from its name"""
+    parent = posixpath.basename(posixpath.dirname(name))
+    return parent in GRAPH_FOLDERS and posixpath.splitext(name)[1].lower() == ".md"
+
+
+def open_graph(fpath: str):
+    """Returns the reader of the logseq graph at fpath, which is either a directory or a zip or tar archive of one"""
+    if os.path.isdir(fpath):
+        return DirectoryGraph(fpath)
+    if os.path.isfile(fpath):
+        return ArchiveGraph(fpath)
+    raise ValueError(f"The directory '{fpath}' does not exist or is not a valid directory.")
@@ -0,0 +1,180 @@
+import re
+import typing
+
+
+# What follows the target of an image embed with custom dimensions, eg ![image.png](image.png){:height 319, :width 568}
+IMAGE_DIMENSIONS = re.compile(r"\){:height \d*, :width (\d*)}")
+
+
+def sub_delimited(line: str, opener: str, closer: str, repl: typing.Callable[[str], str]) -> str:
+    """Replaces every opener...closer span of the line with repl(span), in time linear in the length of the line
+
+    Gives the same result as re.sub(re.escape(opener) + ".*?" + re.escape(closer), ...), which backtracks over the
+    rest of the line for every opener that has no closer
+    """
+    out = []
+    pos = 0
+    search = 0
+    while True:
+        start = line.find(opener, search)
+        if start < 0:
+            break
+        end = line.find(closer, start + len(opener))
+        if end < 0:
+            # No later opener has a closer either
+            break
+        newline = line.find("\n", start + len(opener), end)
+        if newline >= 0:
+            # "." doesn't match newlines, so none of the openers before the newline has a closer
+            search = newline + 1
+            continue
+        end += len(closer)
+        out.append(line[pos:start])
+        out.append(repl(line[start:end]))
+        pos = search = end
+
+    out.append(line[pos:])
+    return "".join(out)
+
+
+def closing_parens(line: str) -> list[int]:
+    """Returns, for each position of the line, where the text from that position on first has more ")" than "("
+
+    That is the ")" closing a link target starting at that position when the target has balanced parentheses, like in
+    ![image](image_(1).png). The position is -1 if there is no such ")" before the end of the line
+    """
+    closing = [-1] * (len(line) + 1)
+    for i in range(len(line) - 1, -1, -1):
+        c = line[i]
+        if c == ")":
+            closing[i] = i
+        elif c == "(":
+            # Skip over the matching ")"
+            match = closing[i + 1]
+            closing[i] = closing[match + 1] if match >= 0 else -1
+        elif c != "\n":
+            closing[i] = closing[i + 1]
+    return closing
+
+
+def sub_asset_embeds(line: str, repl: typing.Callable[[str, str], str]) -> str:
+    """Replaces every ![name](target) of the line with repl(name, target), in time linear in the length of the line
+
+    Like re.sub(r"!\\[(.*?)]\\((.*?)\\)", ...), except that the target can contain balanced parentheses
+    """
+    out = []
+    pos = 0
+    search = 0
+    closing = None
+    while True:
+        start = line.find("![", search)
+        if start < 0:
+            break
+        middle = line.find("](", start + 2)
+        if middle < 0:
+            break
+        newline = line.find("\n", start + 2, middle)
+        if newline >= 0:
+            search = newline + 1
+            continue
+        end = line.find(")", middle + 2)
+        if end < 0:
+            break
+        newline = line.find("\n", middle + 2, end)
+        if newline >= 0:
+            search = newline + 1
+            continue
+
+        if line.find("(", middle + 2, end) >= 0:
+            # Only computed for lines that need it, as it's the only part that isn't a plain search
+            if closing is None:
+                closing = closing_parens(line)
+            if closing[middle + 2] >= 0:
+                end = closing[middle + 2]
+
+        out.append(line[pos:start])
+        out.append(repl(line[start + 2 : middle], line[middle + 2 : end]))
+        pos = search = end + 1
+
+    out.append(line[pos:])
+    return "".join(out)
+
+
+def sub_image_dimensions(line: str, repl: typing.Callable[[str, str, str], str]) -> str:
+    """Replaces every ![name](target){:height h, :width w} of the line with repl(name, target, w), in time linear in
+    the length of the line
+
+    Gives the same result as re.sub(r"!\\[(.*?)]\\((.*?)\\){:height \\d*, :width (\\d*)}", ...)
+    """
+    out = []
+    pos = 0
+    search = 0
+    while True:
+        start = line.find("![", search)
+        if start < 0:
+            break
+        middle = line.find("](", start + 2)
+        if middle < 0:
+            break
+        newline = line.find("\n", start + 2, middle)
+        if newline >= 0:
+            search = newline + 1
+            continue
+        dimensions = IMAGE_DIMENSIONS.search(line, middle + 2)
+        if dimensions is None:
+            break
+        newline = line.find("\n", middle + 2, dimensions.start())
+        if newline >= 0:
+            search = newline + 1
+            continue
+
+        out.append(line[pos:start])
+        out.append(repl(line[start + 2 : middle], line[middle + 2 : dimensions.start()], dimensions[1]))
+        pos = search = dimensions.end()
+
+    out.append(line[pos:])
+    return "".join(out)
+
+
+def link_targets(text: str) -> list[str]:
+    """Returns the targets of the [name](target) links and ![name](target) embeds of text, in time linear in its length
+
+    Like re.findall(r"\\[[^\\]\\n]*]\\((.*?)\\)", text), except that the target can contain balanced parentheses, like in
+    sub_asset_embeds
+    """
+    targets = []
+    closing = None
+    # Where the text that can hold the name of the next link starts
+    lo = 0
+    end = -1
+    while True:
+        middle = text.find("](", lo)
+        if middle < 0:
+            break
+        # The name can't contain "]" or newlines, so it starts after the last of them
+        start = max(text.rfind("]", lo, middle), text.rfind("\n", lo, middle), lo - 1) + 1
+        if text.find("[", start, middle) < 0:
+            lo = middle + 1
+            continue
+        # The first ")" found for an earlier link is still the first one if it's after this one
+        if end < middle + 2:
+            end = text.find(")", middle + 2)
+            if end < 0:
+                # No later link has a ")" either
+                break
+        newline = text.find("\n", middle + 2, end)
+        if newline >= 0:
+            # Nor do the ones before the newline
+            lo = newline + 1
+            continue
+
+        if text.find("(", middle + 2, end) >= 0:
+            if closing is None:
+                closing = closing_parens(text)
+            if closing[middle + 2] >= 0:
+                end = closing[middle + 2]
+
+        targets.append(text[middle + 2 : end])
+        lo = end + 1
+
+    return targets
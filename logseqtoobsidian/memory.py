@@ -0,0 +1,139 @@
+import contextlib
+import heapq
+import logging
+import os
+import sys
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Rough number of bytes needed to convert a page in memory, per byte of the page: the raw bytes, the decoded text, the
+# list of lines and the list of converted lines
+PAGE_MEMORY_FACTOR = 8
+
+
+def current_rss() -> int:
+    """Returns the resident set size of this process in bytes, or None if it can't be determined"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> int:
+    """Returns the highest resident set size this process has had in bytes, or None if it can't be determined"""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def format_size(size: int) -> str:
+    if size is None:
+        return "?"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KiB"
+    return f"{size / (1024 * 1024):.1f} MiB"
+
+
+class MemoryTracker:
+    """Keeps track of memory use during a conversion
+
+    With report, records the peak traced allocations (using tracemalloc) and the RSS of each phase of the conversion,
+    and of the pages that needed the most memory. With max_memory (in bytes), tells the converter when holding some more
+    data in memory would go over that budget. Without either, it does nothing
+    """
+
+    def __init__(self, report: bool = False, max_memory: int = None, largest_pages: int = 10):
+        self.report = report
+        self.max_memory = max_memory
+        self.largest_pages = largest_pages
+        # name -> {"peak": peak traced bytes, "rss": RSS at the end, "peak_rss": highest RSS so far at the end}
+        self.phases = {}
+        # Heap of (peak traced bytes, page path) holding the largest pages
+        self.pages = []
+        self._stack = []
+
+        if self.report and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        if self.report and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _enter(self):
+        if self._stack:
+            # Make sure the peak of the enclosing phase isn't lost when resetting it
+            self._stack[-1][1] = max(self._stack[-1][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    def _exit(self) -> int:
+        peak = tracemalloc.get_traced_memory()[1]
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        return peak
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Measures the code run inside the context as the named phase. Phases can be nested and entered repeatedly"""
+        if not self.report:
+            yield
+            return
+
+        self._enter()
+        entry = [name, 0]
+        self._stack.append(entry)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            peak = max(entry[1], self._exit())
+            previous = self.phases.get(name, {}).get("peak", 0)
+            self.phases[name] = {"peak": max(previous, peak), "rss": current_rss(), "peak_rss": peak_rss()}
+
+    @contextlib.contextmanager
+    def page(self, fpath: str):
+        """Measures the conversion of a single page"""
+        if not self.report:
+            yield
+            return
+
+        self._enter()
+        try:
+            yield
+        finally:
+            item = (self._exit(), fpath)
+            if len(self.pages) < self.largest_pages:
+                heapq.heappush(self.pages, item)
+            else:
+                heapq.heappushpop(self.pages, item)
+
+    def fits(self, size: int) -> bool:
+        """Checks if size more bytes can be held in memory without going over the budget"""
+        if self.max_memory is None:
+            return True
+
+        in_use = current_rss()
+        if in_use is None:
+            in_use = peak_rss() or 0
+        return in_use + size <= self.max_memory
+
+    def log_report(self):
+        if not self.report:
+            return
+
+        logging.info("memory use per phase (peak traced allocations, RSS at the end, peak RSS so far):")
+        for name, phase in self.phases.items():
+            logging.info(
+                f"  {name}: {format_size(phase['peak'])}, {format_size(phase['rss'])}, {format_size(phase['peak_rss'])}"
+            )
+        logging.info("pages that needed the most memory (peak traced allocations):")
+        for peak, fpath in sorted(self.pages, reverse=True):
+            logging.info(f"  {format_size(peak)}: {fpath}")
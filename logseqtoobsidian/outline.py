@@ -0,0 +1,124 @@
+import re
+
+
+# Kinds of blocks
+TEXT = "text"
+CODE = "code"
+
+# "- " (or a lone "-") after the indentation starts a new block
+BULLET = re.compile(r"([ \t]*)-(?=[ \n]|$)")
+# A code fence, either starting its own block ("- ```python") or inside a block
+FENCE = re.compile(r"([ \t]*)(-[ *])?```")
+# Block properties directly follow the line that starts the block
+PROPERTY = re.compile(r"[ \t]*([^\s:]+):: ?(.*)")
+INDENTATION = re.compile(r"[ \t]*")
+
+
+class Block:
+    """A block of a logseq page's outline
+
+    TEXT blocks are either a bullet with its properties and continuation lines, or lines outside of any bullet. CODE
+    blocks are a code fence and everything up to and including the closing fence. The first properties lines after a
+    bullet are the block's properties
+    """
+
+    __slots__ = ("kind", "depth", "lines", "properties", "children")
+
+    def __init__(self, kind: str, depth: int, lines: list[str]):
+        self.kind = kind
+        self.depth = depth
+        self.lines = lines
+        self.properties = []  # (key, value) pairs, matching lines[1:1 + len(properties)]
+        self.children = []
+
+    def __repr__(self) -> str:
+        return f"Block({self.kind!r}, {self.depth}, {self.lines!r})"
+
+
+def indentation_depth(indentation: str) -> int:
+    """Returns the outline depth of the given leading whitespace
+
+    Like convert_spaces_to_tabs, a tab or a run of 2-4 spaces is one level
+    """
+    return len(re.sub(r" {2,4}", "\t", indentation).replace(" ", ""))
+
+
+def parse_outline(lines: list[str]) -> list[Block]:
+    """Parses the lines of a logseq page (without its page properties) into a tree of blocks in a single pass
+
+    Returns the top level blocks. Walking the tree depth first gives back the blocks in their order on the page
+    """
+    roots = []
+    # The chain of open blocks from a root to the current block
+    stack = []
+    current = None
+    code = None
+    reading_properties = False
+
+    def add(block: Block):
+        while stack and stack[-1].depth >= block.depth:
+            stack.pop()
+        (stack[-1].children if stack else roots).append(block)
+
+    for line in lines:
+        if code is not None:
+            code.lines.append(line)
+            if line.strip() == "```":
+                code = None
+            continue
+
+        fence = FENCE.match(line)
+        if fence is not None:
+            code = Block(CODE, indentation_depth(fence[1]), [line])
+            if fence[2] is not None:
+                # The code block is a block of its own, and can have children
+                add(code)
+                stack.append(code)
+            else:
+                # The code block is part of the current block, so it's one level deeper
+                if current is not None:
+                    code.depth = current.depth + 1
+                add(code)
+            current = None
+            reading_properties = False
+            continue
+
+        bullet = BULLET.match(line)
+        if bullet is not None:
+            current = Block(TEXT, indentation_depth(bullet[1]), [line])
+            add(current)
+            stack.append(current)
+            reading_properties = True
+            continue
+
+        if reading_properties:
+            prop = PROPERTY.fullmatch(line.rstrip("\n"))
+            if prop is not None:
+                current.properties.append((prop[1], prop[2]))
+                current.lines.append(line)
+                continue
+            reading_properties = False
+
+        if current is None:
+            # Lines outside of any bullet, or after a code block inside a bullet
+            depth = stack[-1].depth + 1 if stack else 0
+            current = Block(TEXT, depth, [])
+            add(current)
+        current.lines.append(line)
+
+    return roots
+
+
+def iter_blocks(roots: list[Block]):
+    """Yields the blocks of an outline in page order"""
+    stack = list(reversed(roots))
+    while stack:
+        block = stack.pop()
+        yield block
+        stack.extend(reversed(block.children))
+
+
+def split_indentation(line: str) -> tuple[str, str]:
+    """Splits a line into its leading whitespace and the rest"""
+    indentation = INDENTATION.match(line)[0]
+    return indentation, line[len(indentation):]
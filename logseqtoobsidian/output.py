@@ -0,0 +1,360 @@
+import argparse
+import contextlib
+import io
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+from logseqtoobsidian.attachments import SharedAttachments
+from logseqtoobsidian.copying import files_match
+from logseqtoobsidian.graph_input import DirectoryGraph
+from logseqtoobsidian.time_limit import page_time_limit_paused
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Archive suffix -> tarfile compression, or "zip"
+ARCHIVE_FORMATS = {
+    ".zip": "zip",
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tar.xz": "xz",
+    ".tar.zst": "zst",
+    ".tzst": "zst",
+}
+
+
+def archive_format(fpath: str) -> tuple[str, str]:
+    """Returns the suffix and the format of an archive path, or (None, None) if it isn't one we can write"""
+    lower = fpath.lower()
+    # Longest suffixes first, so that .tar.gz isn't taken for .gz
+    for suffix in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return suffix, ARCHIVE_FORMATS[suffix]
+    return None, None
+
+
+def parse_archive_path(value: str) -> str:
+    """Parses the --output_archive argument"""
+    suffix, _ = archive_format(value)
+    if suffix is None or os.path.basename(value) == suffix:
+        raise argparse.ArgumentTypeError(
+            f"'{value}' isn't an archive name ending in one of " + ", ".join(sorted(ARCHIVE_FORMATS))
+        )
+    return value
+
+
+class DirectoryOutput:
+    """Writes the converted vault into a directory
+
+    Pages are copied verbatim when the graph is scanned, and overwritten with their converted contents if any rule
+    applies to them. Assets go next to the pages embedding them, or into attachments if it's given
+
+    With write_if_changed, files already in the output are only replaced if their contents change, so that their
+    modification time isn't bumped and Obsidian and sync clients don't pick them up again. Pages are then written once
+    they're converted rather than copied when scanning, and compared with the page already there, and assets and files
+    are compared by size and hash. The number of files written and left untouched is counted in written and unchanged
+
+    Files of the graph are read with graph, which reads them from a directory by default
+    """
+
+    def __init__(
+        self,
+        copy_hash: bool = False,
+        attachments: SharedAttachments = None,
+        write_if_changed: bool = False,
+        graph: DirectoryGraph = None,
+    ):
+        self.copy_hash = copy_hash or write_if_changed
+        self.attachments = attachments
+        self.write_if_changed = write_if_changed
+        self.graph = graph if graph is not None else DirectoryGraph()
+        self.written = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+
+    def _count(self, written: bool) -> bool:
+        with self._lock:
+            if written:
+                self.written += 1
+            else:
+                self.unchanged += 1
+        return written
+
+    def makedirs(self, dirname: str):
+        os.makedirs(dirname, exist_ok=True)
+
+    def copy_page(self, src: str, dst: str):
+        """Copies a page verbatim when scanning the graph. With write_if_changed, that's left to keep_page"""
+        if not self.write_if_changed:
+            self.graph.copy_page(src, dst)
+
+    def keep_page(self, src: str, dst: str):
+        """Leaves a page that no rule changed as it is. Here, that's the copy made when scanning the graph"""
+        if self.write_if_changed:
+            self._count(self.graph.copy_file(src, dst, compare_hash=True))
+
+    def copy_file(self, src: str, dst: str) -> bool:
+        """Copies a non-markdown file, unless an identical copy is already there"""
+        return self._count(self.graph.copy_file(src, dst, compare_hash=self.copy_hash))
+
+    def copy_asset(self, src: str, dst: str) -> bool:
+        """Copies an asset embedded in a page, unless an identical copy is already there"""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        return self._count(self.graph.copy_file(src, dst, compare_hash=self.copy_hash))
+
+    def write_page(self, fpath: str, newlines: list[str]):
+        """Writes the converted lines of a page
+
+        The page is replaced in one go, so that an interrupted run never leaves it half written
+        """
+        if self.write_if_changed and _has_contents(fpath, "".join(newlines).encode("utf-8")):
+            self._count(False)
+            return
+        with self._open_page(fpath, compare=False) as f:
+            f.writelines(newlines)
+
+    def open_page(self, fpath: str):
+        """Opens a page to write its converted lines one at a time. The page is left as it was if writing fails"""
+        return self._open_page(fpath, compare=self.write_if_changed)
+
+    @contextlib.contextmanager
+    def _open_page(self, fpath: str, compare: bool):
+        tmp = os.path.join(os.path.dirname(fpath), f".{os.path.basename(fpath)}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                yield f
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if compare and files_match(tmp, fpath, compare_hash=True):
+            os.remove(tmp)
+            self._count(False)
+            return
+        os.replace(tmp, fpath)
+        self._count(True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class DryRunOutput:
+    """Stands in for the output with --dryrun, which converts the pages and places their assets as usual to see what
+    would happen, but writes nothing
+
+    Assets missing from the graph are still reported, like when they're copied
+    """
+
+    def __init__(self, attachments: SharedAttachments = None, graph: DirectoryGraph = None):
+        self.attachments = attachments
+        self.graph = graph if graph is not None else DirectoryGraph()
+        self.written = 0
+        self.unchanged = 0
+
+    def makedirs(self, dirname: str):
+        pass
+
+    def copy_page(self, src: str, dst: str):
+        pass
+
+    def keep_page(self, src: str, dst: str):
+        pass
+
+    def copy_file(self, src: str, dst: str) -> bool:
+        return False
+
+    def copy_asset(self, src: str, dst: str) -> bool:
+        if not self.graph.isfile(src):
+            raise FileNotFoundError(src)
+        return False
+
+    def write_page(self, fpath: str, newlines: list[str]):
+        pass
+
+    @contextlib.contextmanager
+    def open_page(self, fpath: str):
+        with open(os.devnull, "w", encoding="utf-8") as f:
+            yield f
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+def _has_contents(fpath: str, data: bytes) -> bool:
+    """Checks if the file at fpath holds exactly data, only reading it if it has the same size"""
+    try:
+        if os.path.getsize(fpath) != len(data):
+            return False
+        with open(fpath, "rb") as f:
+            return f.read() == data
+    except FileNotFoundError:
+        return False
+
+
+class ArchiveOutput:
+    """Writes the converted vault straight into a zip or tar archive, without writing it to a directory first
+
+    Every page is added once, either converted or verbatim, when it's converted. Files and assets are streamed from the
+    graph into the archive, and an asset embedded in several pages is only added once. The entries are under a folder
+    named after the archive, so that `vault.zip` holds `vault/journals/...`. The archive is written under a temporary
+    name and only renamed to fpath once it's complete
+
+    An entry can't be taken back once it's partly written, so the page time limit is paused while adding one, and an
+    entry that fails partway means the archive is thrown away when it's closed
+    """
+
+    def __init__(
+        self, fpath: str, overwrite: bool = False, attachments: SharedAttachments = None, graph: DirectoryGraph = None
+    ):
+        suffix, fmt = archive_format(fpath)
+        if suffix is None:
+            raise ValueError(f"'{fpath}' isn't an archive name ending in one of " + ", ".join(sorted(ARCHIVE_FORMATS)))
+        if os.path.exists(fpath) and not overwrite:
+            raise ValueError(f"the archive '{fpath}' already exists, use --overwrite_output to replace it")
+        if fmt == "zst" and zstd is None and zstandard is None:
+            raise ValueError("writing .tar.zst archives needs Python 3.14 or the zstandard package")
+
+        self.path = fpath
+        self.attachments = attachments
+        self.graph = graph if graph is not None else DirectoryGraph()
+        # Where the pages would be if the vault was written to a directory, which is what the converter works with
+        self.base = fpath[: -len(suffix)]
+        self._root = os.path.dirname(self.base)
+        self._names = set()
+        self._lock = threading.Lock()
+        # Set once adding an entry failed partway, after which the archive is corrupt
+        self._broken = False
+        self._tmp = os.path.join(
+            os.path.dirname(os.path.abspath(fpath)), f".{os.path.basename(fpath)}.{os.getpid()}.tmp"
+        )
+        self._raw = open(self._tmp, "wb")
+        self._compressor = None
+        if fmt == "zip":
+            self._zip = zipfile.ZipFile(self._raw, "w", compression=zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            self._zip = None
+            fileobj = self._raw
+            if fmt == "zst":
+                if zstd is not None:
+                    self._compressor = zstd.ZstdFile(self._raw, "w")
+                else:
+                    self._compressor = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+                fileobj = self._compressor
+                fmt = ""
+            # A stream, so the tar file is never read back or seeked in
+            self._tar = tarfile.open(fileobj=fileobj, mode="w|" + fmt, format=tarfile.PAX_FORMAT)
+
+    def arcname(self, fpath: str) -> str:
+        return os.path.relpath(fpath, self._root).replace(os.sep, "/")
+
+    def _add(self, arcname: str, fileobj, size: int, mtime: float) -> bool:
+        """Adds an entry to the archive, unless there already is one with that name"""
+        with self._lock:
+            if arcname in self._names:
+                return False
+            if self._broken:
+                raise OSError(f"can't add {arcname} to '{self.path}', as adding an earlier entry failed partway")
+            with page_time_limit_paused():
+                try:
+                    if self._zip is not None:
+                        info = zipfile.ZipInfo(arcname, date_time=time.localtime(max(mtime, 315532800))[:6])
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        with self._zip.open(info, "w", force_zip64=size > 2**31) as dst:
+                            shutil.copyfileobj(fileobj, dst)
+                    else:
+                        info = tarfile.TarInfo(arcname)
+                        info.size = size
+                        info.mtime = mtime
+                        self._tar.addfile(info, fileobj)
+                except BaseException:
+                    self._broken = True
+                    raise
+            self._names.add(arcname)
+            return True
+
+    def _add_file(self, src: str, dst: str) -> bool:
+        size, mtime = self.graph.stat(src)
+        with self.graph.open(src) as f:
+            return self._add(self.arcname(dst), f, size, mtime)
+
+    def makedirs(self, dirname: str):
+        pass
+
+    def copy_page(self, src: str, dst: str):
+        """Pages are only added to the archive once they're converted"""
+
+    def keep_page(self, src: str, dst: str):
+        self._add_file(src, dst)
+
+    def copy_file(self, src: str, dst: str) -> bool:
+        return self._add_file(src, dst)
+
+    def copy_asset(self, src: str, dst: str) -> bool:
+        added = self._add_file(src, dst)
+        if not added:
+            logging.debug(f"already in the archive: {dst}")
+        return added
+
+    def write_page(self, fpath: str, newlines: list[str]):
+        data = "".join(newlines).encode("utf-8")
+        self._add(self.arcname(fpath), io.BytesIO(data), len(data), time.time())
+
+    @contextlib.contextmanager
+    def open_page(self, fpath: str):
+        """Pages converted one line at a time are spooled to a temporary file, since tar needs their size first"""
+        with tempfile.TemporaryFile() as spool:
+            f = io.TextIOWrapper(spool, encoding="utf-8")
+            yield f
+            f.flush()
+            size = spool.tell()
+            spool.seek(0)
+            self._add(self.arcname(fpath), spool, size, time.time())
+            f.detach()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+    def close(self, complete: bool = True):
+        """Finishes the archive, or throws it away if the conversion didn't complete or an entry is corrupt"""
+        try:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
+                if self._compressor is not None:
+                    self._compressor.close()
+        finally:
+            self._raw.close()
+
+        if complete and not self._broken:
+            os.replace(self._tmp, self.path)
+            return
+        os.remove(self._tmp)
+        if complete:
+            raise OSError(f"'{self.path}' wasn't written, as adding an entry to it failed partway")
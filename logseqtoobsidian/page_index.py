@@ -0,0 +1,187 @@
+import array
+import collections.abc
+import json
+import mmap
+import os
+import struct
+
+from logseqtoobsidian.checkpoint import output_options
+from logseqtoobsidian.page_table import PageTable
+
+PAGE_INDEX_VERSION = 1
+
+# Header of a mapped page index: magic, number of page names, number of pages, where the two string blobs start
+MAPPED_INDEX_MAGIC = b"LS2OIDX1"
+MAPPED_INDEX_HEADER = struct.Struct("=8sQQQQ")
+
+
+def save_page_index(fpath: str, args, old_base: str, new_base: str, pages: PageTable):
+    """Saves the page map of a run, so that single pages can later be converted against it without scanning the
+    graph again
+
+    Paths are saved relative to the graph and to the output, along with where those were and the options of the run,
+    which are the ones a page has to be converted with for its links to match the rest of the output
+    """
+    data = {
+        "version": PAGE_INDEX_VERSION,
+        "logseq": os.path.abspath(old_base),
+        "output": os.path.abspath(new_base),
+        "options": output_options(args),
+        "pages": [
+            [os.path.relpath(old_path, old_base), os.path.relpath(new_path, new_base)]
+            for old_path, new_path in pages.old_to_new.items()
+        ],
+        "names": {name: os.path.relpath(new_path, new_base) for name, new_path in pages.names.items()},
+    }
+    tmp = fpath + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, fpath)
+
+
+def load_page_index(fpath: str) -> tuple[dict, dict, dict]:
+    """Reads a page index saved by save_page_index, and returns it along with its old to new paths and page names
+    maps, with absolute paths. Plain dicts are quicker to fill than a PageTable, which matters when converting a single
+    page"""
+    with open(fpath, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != PAGE_INDEX_VERSION:
+        raise ValueError(f"unsupported page index version in '{fpath}'")
+
+    old_base = data["logseq"]
+    new_base = data["output"]
+    old_to_new_paths = {
+        os.path.join(old_base, old_relpath): os.path.join(new_base, new_relpath)
+        for old_relpath, new_relpath in data["pages"]
+    }
+    old_pagenames_to_new_paths = {
+        name: os.path.join(new_base, new_relpath) for name, new_relpath in data["names"].items()
+    }
+    return data, old_to_new_paths, old_pagenames_to_new_paths
+
+
+def _table(mapping: dict) -> tuple[array.array, bytes]:
+    """Returns the offsets and the blob of a table of the items of mapping, sorted by their UTF-8 encoded keys"""
+    items = sorted(
+        (key.encode("utf-8", "surrogateescape"), value.encode("utf-8", "surrogateescape"))
+        for key, value in mapping.items()
+    )
+    offsets = array.array("Q", [0])
+    blob = bytearray()
+    for key, value in items:
+        blob += key
+        offsets.append(len(blob))
+        blob += value
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def write_mapped_page_index(fpath: str, old_pagenames_to_new_paths: dict, new_to_old_paths: dict):
+    """Writes the page names and new to old paths maps of a run in the form that MappedPageIndex reads
+
+    Each map is a table of offsets, two per item, into a blob holding its keys and values in the order of their UTF-8
+    encoding. The offsets are in native byte order, since the file is only meant for the processes of a single run
+    """
+    names_offsets, names_blob = _table(old_pagenames_to_new_paths)
+    paths_offsets, paths_blob = _table(new_to_old_paths)
+    names_blob_start = MAPPED_INDEX_HEADER.size + (len(names_offsets) + len(paths_offsets)) * names_offsets.itemsize
+    with open(fpath, "wb") as f:
+        f.write(
+            MAPPED_INDEX_HEADER.pack(
+                MAPPED_INDEX_MAGIC,
+                len(names_offsets) // 2,
+                len(paths_offsets) // 2,
+                names_blob_start,
+                names_blob_start + len(names_blob),
+            )
+        )
+        f.write(names_offsets.tobytes())
+        f.write(paths_offsets.tobytes())
+        f.write(names_blob)
+        f.write(paths_blob)
+
+
+class MappedPageIndex:
+    """Read-only page index backed by a memory-mapped file written by write_mapped_page_index
+
+    Opening it copies nothing, and every process opening the same file shares one physical copy of it. Lookups are a
+    binary search of the sorted keys, so names is a drop-in replacement for old_pagenames_to_new_paths and new_to_old
+    for new_to_old_paths wherever they are only read
+    """
+
+    def __init__(self, fpath: str):
+        with open(fpath, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, name_count, path_count, names_blob, paths_blob = MAPPED_INDEX_HEADER.unpack_from(self._mmap)
+        if magic != MAPPED_INDEX_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"'{fpath}' isn't a mapped page index")
+
+        self._view = memoryview(self._mmap)
+        names_start = MAPPED_INDEX_HEADER.size
+        paths_start = names_start + (2 * name_count + 1) * 8
+        self.names = _MappedMap(self._mmap, self._view[names_start:paths_start].cast("Q"), names_blob)
+        self.new_to_old = _MappedMap(
+            self._mmap, self._view[paths_start : paths_start + (2 * path_count + 1) * 8].cast("Q"), paths_blob
+        )
+
+    def close(self):
+        self.names.release()
+        self.new_to_old.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _MappedMap(collections.abc.Mapping):
+    """View of one of the tables of a MappedPageIndex"""
+
+    __slots__ = ("_mmap", "_offsets", "_blob", "_count")
+
+    def __init__(self, mm: mmap.mmap, offsets: memoryview, blob: int):
+        self._mmap = mm
+        self._offsets = offsets
+        self._blob = blob
+        self._count = (len(offsets) - 1) // 2
+
+    def release(self):
+        self._offsets.release()
+
+    def _string(self, start: int, end: int) -> bytes:
+        return self._mmap[self._blob + self._offsets[start] : self._blob + self._offsets[end]]
+
+    def _find(self, key: str) -> int:
+        if not isinstance(key, str):
+            return -1
+        target = key.encode("utf-8", "surrogateescape")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(2 * mid, 2 * mid + 1) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._string(2 * lo, 2 * lo + 1) == target:
+            return lo
+        return -1
+
+    def __getitem__(self, key: str) -> str:
+        idx = self._find(key)
+        if idx < 0:
+            raise KeyError(key)
+        return self._string(2 * idx + 1, 2 * idx + 2).decode("utf-8", "surrogateescape")
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) >= 0
+
+    def __iter__(self):
+        for idx in range(self._count):
+            yield self._string(2 * idx, 2 * idx + 1).decode("utf-8", "surrogateescape")
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,404 @@
+import array
+import collections.abc
+import os
+import sys
+
+
+# Page id used for "no such page", and directory id used for "no such path"
+NO_ID = -1
+
+# Slots of a _StringIndex that never held an entry, and slots whose entry was removed
+_EMPTY = -1
+_REMOVED = -2
+
+
+def split_path(path: str) -> tuple[str, str]:
+    """Splits a path into its directory prefix (including the trailing separator) and its basename
+
+    Unlike os.path.split, prefix + basename is always exactly the original path
+    """
+    idx = path.rfind(os.sep)
+    if os.altsep:
+        idx = max(idx, path.rfind(os.altsep))
+    return path[: idx + 1], path[idx + 1:]
+
+
+class _Strings:
+    """Append-only store of strings, packed as UTF-8 into one buffer so that each costs its length plus an offset
+    rather than a whole str object"""
+
+    __slots__ = ("_blob", "_ends")
+
+    def __init__(self):
+        self._blob = bytearray()
+        self._ends = array.array("I")
+
+    def add(self, string: str) -> int:
+        # surrogatepass round-trips any str, including undecodable file names from os.listdir
+        self._blob += string.encode("utf-8", "surrogatepass")
+        self._ends.append(len(self._blob))
+        return len(self._ends) - 1
+
+    def __getitem__(self, string_id: int) -> str:
+        start = self._ends[string_id - 1] if string_id else 0
+        return self._blob[start: self._ends[string_id]].decode("utf-8", "surrogatepass")
+
+
+class _StringIndex:
+    """Open addressing hash table finding records by a string key, holding only the low 32 bits of the hash and the id
+    of each record
+
+    The keys themselves are kept by the table the records belong to, and read back through key_of to tell apart
+    records whose hashes are equal
+    """
+
+    __slots__ = ("_key_of", "_hashes", "_ids", "_used", "_filled")
+
+    def __init__(self, key_of):
+        self._key_of = key_of
+        self._resize(8)
+
+    def _resize(self, size: int):
+        hashes, ids = getattr(self, "_hashes", ()), getattr(self, "_ids", ())
+        self._hashes = array.array("I", [0]) * size
+        self._ids = array.array("i", [_EMPTY]) * size
+        self._used = 0
+        self._filled = 0
+        for key_hash, record_id in zip(hashes, ids):
+            if record_id >= 0:
+                slot = self._free_slot(key_hash)
+                self._hashes[slot] = key_hash
+                self._ids[slot] = record_id
+                self._used += 1
+                self._filled += 1
+
+    def _free_slot(self, key_hash: int) -> int:
+        # Probes in the same order as CPython's dicts
+        ids = self._ids
+        mask = len(ids) - 1
+        perturb = key_hash
+        slot = key_hash & mask
+        while ids[slot] >= 0:
+            perturb >>= 5
+            slot = (slot * 5 + perturb + 1) & mask
+        return slot
+
+    def _find(self, key: str, key_hash: int) -> int:
+        """Returns the slot of the record with this key, or NO_ID"""
+        hashes, ids = self._hashes, self._ids
+        mask = len(ids) - 1
+        perturb = key_hash
+        slot = key_hash & mask
+        while True:
+            record_id = ids[slot]
+            if record_id == _EMPTY:
+                return NO_ID
+            if record_id >= 0 and hashes[slot] == key_hash and self._key_of(record_id) == key:
+                return slot
+            perturb >>= 5
+            slot = (slot * 5 + perturb + 1) & mask
+
+    def get(self, key: str) -> int:
+        """Returns the id of the record with this key, or NO_ID"""
+        slot = self._find(key, hash(key) & 0xFFFFFFFF)
+        return NO_ID if slot == NO_ID else self._ids[slot]
+
+    def add(self, key: str, record_id: int):
+        """Adds a record under a key that isn't in the index yet"""
+        key_hash = hash(key) & 0xFFFFFFFF
+        slot = self._free_slot(key_hash)
+        if self._ids[slot] == _EMPTY:
+            self._filled += 1
+        self._hashes[slot] = key_hash
+        self._ids[slot] = record_id
+        self._used += 1
+        # Like dicts, stay at most two thirds full, counting removed entries since they lengthen the probes too
+        if self._filled * 3 >= len(self._ids) * 2:
+            size = 8
+            while size * 2 <= self._used * 3:
+                size *= 2
+            self._resize(size * 2)
+
+    def remove(self, key: str) -> int:
+        """Removes the record with this key, and returns its id or NO_ID if there was none"""
+        slot = self._find(key, hash(key) & 0xFFFFFFFF)
+        if slot == NO_ID:
+            return NO_ID
+        record_id = self._ids[slot]
+        self._ids[slot] = _REMOVED
+        self._used -= 1
+        return record_id
+
+
+class PageTable:
+    """Compact store of the pages of a conversion, mapping their paths in the logseq graph, their paths in the output
+    and their page names to each other
+
+    Each page gets an integer id. Directories are interned, and basenames and page names are packed into one buffer of
+    UTF-8, so a page costs a few array entries plus the bytes of its names rather than a str object and dict entry for
+    every map that mentions it. The maps used by the rest of the converter (old_to_new, new_to_old, new_paths and names)
+    are views onto this one store
+    """
+
+    __slots__ = (
+        "_strings",
+        "_dirs",
+        "_dir_ids",
+        "_old_dirs",
+        "_old_names",
+        "_new_dirs",
+        "_new_names",
+        "_by_old",
+        "_by_new",
+        "_name_strings",
+        "_name_pages",
+        "_by_name",
+        "_old_count",
+        "_new_count",
+        "_both_count",
+        "_name_count",
+        "old_to_new",
+        "new_to_old",
+        "new_paths",
+        "names",
+    )
+
+    def __init__(self):
+        self._strings = _Strings()
+        self._dirs = []
+        self._dir_ids = {}
+        # One record per page id, holding directory ids and string ids
+        self._old_dirs = array.array("i")
+        self._old_names = array.array("i")
+        self._new_dirs = array.array("i")
+        self._new_names = array.array("i")
+        self._by_old = _StringIndex(lambda page_id: self._path(page_id, True))
+        self._by_new = _StringIndex(lambda page_id: self._path(page_id, False))
+        # One record per page name, holding its string id and page id
+        self._name_strings = array.array("i")
+        self._name_pages = array.array("i")
+        self._by_name = _StringIndex(lambda name_id: self._strings[self._name_strings[name_id]])
+        self._old_count = 0
+        self._new_count = 0
+        self._both_count = 0
+        self._name_count = 0
+
+        self.old_to_new = _PathMap(self, old_side=True)
+        self.new_to_old = _PathMap(self, old_side=False)
+        self.new_paths = _NewPaths(self)
+        self.names = _PageNames(self)
+
+    def __len__(self) -> int:
+        return self._new_count
+
+    def _dir_id(self, dirname: str) -> int:
+        dir_id = self._dir_ids.get(dirname, NO_ID)
+        if dir_id == NO_ID:
+            dir_id = len(self._dirs)
+            dirname = sys.intern(dirname)
+            self._dirs.append(dirname)
+            self._dir_ids[dirname] = dir_id
+        return dir_id
+
+    def _find(self, path: str, old_side: bool) -> int:
+        index = self._by_old if old_side else self._by_new
+        return index.get(path)
+
+    def _path(self, page_id: int, old_side: bool) -> str:
+        dirs = self._old_dirs if old_side else self._new_dirs
+        dir_id = dirs[page_id]
+        if dir_id == NO_ID:
+            return None
+        names = self._old_names if old_side else self._new_names
+        return self._dirs[dir_id] + self._strings[names[page_id]]
+
+    def _has(self, page_id: int, old_side: bool) -> bool:
+        dirs = self._old_dirs if old_side else self._new_dirs
+        return dirs[page_id] != NO_ID
+
+    def _new_record(self) -> int:
+        page_id = len(self._new_dirs)
+        for ids in (self._old_dirs, self._old_names, self._new_dirs, self._new_names):
+            ids.append(NO_ID)
+        return page_id
+
+    def _set_path(self, page_id: int, path: str, old_side: bool):
+        """Sets the old or new path of a page, replacing any previous one"""
+        if self._path(page_id, old_side) == path:
+            return
+        self._clear_path(page_id, old_side)
+
+        dirname, basename = split_path(path)
+        dirs = self._old_dirs if old_side else self._new_dirs
+        names = self._old_names if old_side else self._new_names
+        dirs[page_id] = self._dir_id(dirname)
+        names[page_id] = self._strings.add(basename)
+        (self._by_old if old_side else self._by_new).add(path, page_id)
+        if old_side:
+            self._old_count += 1
+        else:
+            self._new_count += 1
+        if self._has(page_id, not old_side):
+            self._both_count += 1
+
+    def _clear_path(self, page_id: int, old_side: bool):
+        path = self._path(page_id, old_side)
+        if path is None:
+            return
+
+        (self._by_old if old_side else self._by_new).remove(path)
+        (self._old_dirs if old_side else self._new_dirs)[page_id] = NO_ID
+        (self._old_names if old_side else self._new_names)[page_id] = NO_ID
+        if old_side:
+            self._old_count -= 1
+        else:
+            self._new_count -= 1
+        if self._has(page_id, not old_side):
+            self._both_count -= 1
+
+    def add_page(self, old_path: str, new_path: str) -> int:
+        """Records that the page at old_path is written to new_path, and returns its id"""
+        page_id = self._find(new_path, old_side=False)
+        if page_id == NO_ID:
+            page_id = self._find(old_path, old_side=True)
+        if page_id == NO_ID:
+            page_id = self._new_record()
+
+        # A path can only belong to a single page
+        other_id = self._find(old_path, old_side=True)
+        if other_id not in (NO_ID, page_id):
+            self._clear_path(other_id, old_side=True)
+
+        self._set_path(page_id, old_path, old_side=True)
+        self._set_path(page_id, new_path, old_side=False)
+        return page_id
+
+
+class _PathMap(collections.abc.MutableMapping):
+    """View of a PageTable mapping old paths to new paths, or new paths to old paths"""
+
+    __slots__ = ("_table", "_old_side", "_index")
+
+    def __init__(self, table: PageTable, old_side: bool):
+        self._table = table
+        self._old_side = old_side
+        self._index = table._by_old if old_side else table._by_new
+
+    def __getitem__(self, path: str) -> str:
+        page_id = self._index.get(path)
+        other_path = None if page_id == NO_ID else self._table._path(page_id, not self._old_side)
+        if other_path is None:
+            raise KeyError(path)
+        return other_path
+
+    def __setitem__(self, path: str, other_path: str):
+        if self._old_side:
+            self._table.add_page(path, other_path)
+        else:
+            self._table.add_page(other_path, path)
+
+    def __delitem__(self, path: str):
+        page_id = self._table._find(path, self._old_side)
+        if page_id == NO_ID:
+            raise KeyError(path)
+        self._table._clear_path(page_id, self._old_side)
+
+    def __contains__(self, path) -> bool:
+        page_id = self._index.get(path)
+        return page_id != NO_ID and self._table._has(page_id, not self._old_side)
+
+    def __iter__(self):
+        table = self._table
+        for page_id in range(len(table._new_dirs)):
+            if table._has(page_id, True) and table._has(page_id, False):
+                yield table._path(page_id, self._old_side)
+
+    def __len__(self) -> int:
+        return self._table._both_count
+
+
+class _NewPaths(collections.abc.MutableSet):
+    """View of a PageTable as the set of new paths"""
+
+    __slots__ = ("_table",)
+
+    def __init__(self, table: PageTable):
+        self._table = table
+
+    def __contains__(self, path) -> bool:
+        return self._table._by_new.get(path) != NO_ID
+
+    def __iter__(self):
+        table = self._table
+        for page_id in range(len(table._new_dirs)):
+            if table._has(page_id, False):
+                yield table._path(page_id, False)
+
+    def __len__(self) -> int:
+        return self._table._new_count
+
+    def add(self, path: str):
+        if path not in self:
+            self._table._set_path(self._table._new_record(), path, old_side=False)
+
+    def discard(self, path: str):
+        page_id = self._table._find(path, old_side=False)
+        if page_id != NO_ID:
+            self._table._clear_path(page_id, old_side=False)
+
+
+class _PageNames(collections.abc.MutableMapping):
+    """View of a PageTable mapping page names (as used in links) to new paths"""
+
+    __slots__ = ("_table",)
+
+    def __init__(self, table: PageTable):
+        self._table = table
+
+    def __getitem__(self, name: str) -> str:
+        table = self._table
+        name_id = table._by_name.get(name)
+        path = None if name_id == NO_ID else table._path(table._name_pages[name_id], False)
+        if path is None:
+            raise KeyError(name)
+        return path
+
+    def __setitem__(self, name: str, new_path: str):
+        table = self._table
+        page_id = table._find(new_path, old_side=False)
+        if page_id == NO_ID:
+            page_id = table._new_record()
+            table._set_path(page_id, new_path, old_side=False)
+
+        name_id = table._by_name.get(name)
+        if name_id == NO_ID:
+            name_id = len(table._name_pages)
+            table._name_strings.append(table._strings.add(name))
+            table._name_pages.append(page_id)
+            table._by_name.add(name, name_id)
+            table._name_count += 1
+        else:
+            table._name_pages[name_id] = page_id
+
+    def __delitem__(self, name: str):
+        table = self._table
+        name_id = table._by_name.remove(name)
+        if name_id == NO_ID:
+            raise KeyError(name)
+        table._name_pages[name_id] = NO_ID
+        table._name_count -= 1
+
+    def __contains__(self, name) -> bool:
+        # Like __getitem__, a name whose page no longer has a new path isn't there
+        table = self._table
+        name_id = table._by_name.get(name)
+        return name_id != NO_ID and table._has(table._name_pages[name_id], False)
+
+    def __iter__(self):
+        table = self._table
+        for name_id in range(len(table._name_pages)):
+            if table._name_pages[name_id] != NO_ID:
+                yield table._strings[table._name_strings[name_id]]
+
+    def __len__(self) -> int:
+        return self._table._name_count
@@ -0,0 +1,249 @@
+import asyncio
+import concurrent.futures
+import logging
+
+from logseqtoobsidian.checkpoint import Checkpoint
+from logseqtoobsidian.convert_notes import (
+    convert_page,
+    convert_page_streaming,
+    decode_page,
+    fits_in_memory,
+    is_unaffected_by_rules,
+    log_page_timeout,
+    read_page,
+)
+from logseqtoobsidian.graph_input import DirectoryGraph
+from logseqtoobsidian.memory import PAGE_MEMORY_FACTOR, MemoryTracker, current_rss
+from logseqtoobsidian.output import DirectoryOutput
+from logseqtoobsidian.time_limit import PageTimeout, page_time_limit
+
+
+# Marks the end of a queue
+_DONE = None
+
+
+async def _read_stage(
+    args,
+    paths: list[str],
+    new_to_old_paths: dict,
+    read_queue: asyncio.Queue,
+    io_executor,
+    memory: MemoryTracker,
+    graph: DirectoryGraph,
+):
+    """Starts reading pages from the graph in order. The bounded queue limits how many reads can be in flight or waiting
+
+    Pages too large for the memory budget aren't read here, they are streamed by the conversion stage
+    """
+    loop = asyncio.get_running_loop()
+    for fpath in paths:
+        if not fits_in_memory(args, new_to_old_paths[fpath], memory, graph):
+            await read_queue.put((fpath, None))
+            continue
+        await read_queue.put((fpath, loop.run_in_executor(io_executor, read_page, new_to_old_paths[fpath], graph)))
+    await read_queue.put(_DONE)
+
+
+async def _convert_stage(
+    args,
+    read_queue: asyncio.Queue,
+    write_queue: asyncio.Queue,
+    old_pagenames_to_new_paths: dict,
+    new_to_old_paths: dict,
+    convert_executor,
+    memory: MemoryTracker,
+    checkpoint: Checkpoint,
+    output: DirectoryOutput,
+    graph: DirectoryGraph,
+):
+    """Converts pages as they are read, one at a time since the conversion uses global state
+
+    Pages that run out of time are skipped, leaving their verbatim copy in place
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await read_queue.get()
+        if item is _DONE:
+            break
+
+        fpath, pending_read = item
+        if pending_read is None:
+            logging.info(f"streaming to stay within the memory budget: {fpath}")
+            try:
+                with page_time_limit(args.page_timeout):
+                    convert_page_streaming(
+                        args, fpath, old_pagenames_to_new_paths, new_to_old_paths, memory, output, graph
+                    )
+            except PageTimeout:
+                log_page_timeout(args, fpath)
+                output.keep_page(new_to_old_paths[fpath], fpath)
+                continue
+            if checkpoint is not None:
+                checkpoint.page_done(fpath, new_to_old_paths[fpath])
+            continue
+
+        data = await pending_read
+        if is_unaffected_by_rules(args, data):
+            logging.debug(f"unchanged: {fpath}")
+            output.keep_page(new_to_old_paths[fpath], fpath)
+            if checkpoint is not None:
+                checkpoint.page_done(fpath, new_to_old_paths[fpath])
+            continue
+
+        lines = decode_page(data)
+        with memory.page(fpath):
+            if convert_executor is None:
+                try:
+                    with page_time_limit(args.page_timeout):
+                        newlines = convert_page(
+                            args, lines, fpath, old_pagenames_to_new_paths, new_to_old_paths, memory, output
+                        )
+                except PageTimeout:
+                    log_page_timeout(args, fpath)
+                    output.keep_page(new_to_old_paths[fpath], fpath)
+                    continue
+            else:
+                # The time limit needs the main thread, so pages converted on the worker thread have none
+                newlines = await loop.run_in_executor(
+                    convert_executor,
+                    convert_page,
+                    args,
+                    lines,
+                    fpath,
+                    old_pagenames_to_new_paths,
+                    new_to_old_paths,
+                    memory,
+                    output,
+                )
+        await write_queue.put((fpath, newlines))
+    await write_queue.put(_DONE)
+
+
+def _write_page(output: DirectoryOutput, fpath: str, newlines: list[str]) -> str:
+    output.write_page(fpath, newlines)
+    return fpath
+
+
+async def _write_stage(
+    write_queue: asyncio.Queue,
+    io_executor,
+    depth: int,
+    new_to_old_paths: dict,
+    checkpoint: Checkpoint,
+    output: DirectoryOutput,
+):
+    """Writes converted pages, with at most depth writes in flight"""
+    loop = asyncio.get_running_loop()
+
+    def written(fpath: str):
+        if checkpoint is not None:
+            checkpoint.page_done(fpath, new_to_old_paths[fpath])
+
+    pending = set()
+    while True:
+        item = await write_queue.get()
+        if item is _DONE:
+            break
+
+        fpath, newlines = item
+        pending.add(loop.run_in_executor(io_executor, _write_page, output, fpath, newlines))
+        if len(pending) >= depth:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                written(future.result())
+
+    for fpath in await asyncio.gather(*pending):
+        written(fpath)
+
+
+async def _run_pipeline(
+    args,
+    paths: list[str],
+    old_pagenames_to_new_paths: dict,
+    new_to_old_paths: dict,
+    depth: int,
+    io_threads: int,
+    offload_convert: bool,
+    memory: MemoryTracker,
+    checkpoint: Checkpoint,
+    output: DirectoryOutput,
+    graph: DirectoryGraph,
+):
+    read_queue = asyncio.Queue(maxsize=depth)
+    write_queue = asyncio.Queue(maxsize=depth)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=io_threads) as io_executor:
+        # A single thread, so that pages are still converted one at a time
+        convert_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if offload_convert else None
+        try:
+            await asyncio.gather(
+                _read_stage(args, paths, new_to_old_paths, read_queue, io_executor, memory, graph),
+                _convert_stage(
+                    args,
+                    read_queue,
+                    write_queue,
+                    old_pagenames_to_new_paths,
+                    new_to_old_paths,
+                    convert_executor,
+                    memory,
+                    checkpoint,
+                    output,
+                    graph,
+                ),
+                _write_stage(write_queue, io_executor, depth, new_to_old_paths, checkpoint, output),
+            )
+        finally:
+            if convert_executor is not None:
+                convert_executor.shutdown()
+
+
+def convert_contents_pipelined(
+    args,
+    new_paths: set,
+    old_pagenames_to_new_paths: dict,
+    new_to_old_paths: dict,
+    depth: int = 16,
+    io_threads: int = 8,
+    offload_convert: bool = False,
+    memory: MemoryTracker = None,
+    checkpoint: Checkpoint = None,
+    output: DirectoryOutput = None,
+    graph: DirectoryGraph = None,
+):
+    """Same as convert_contents, but overlaps reading, converting and writing pages
+
+    Pages are read ahead and written behind on a pool of io_threads threads while the current page is converted. At most
+    depth pages wait in each of the queues between the stages, which keeps memory bounded on slow storage. With a memory
+    budget, depth is reduced so that the largest pages fit in it
+    """
+    if memory is None:
+        memory = MemoryTracker()
+    if output is None:
+        output = DirectoryOutput(copy_hash=args.copy_hash)
+    if graph is None:
+        graph = DirectoryGraph()
+
+    paths = sorted(new_paths)
+    if memory.max_memory is not None and paths:
+        largest = max(graph.stat(new_to_old_paths[fpath])[0] for fpath in paths) * PAGE_MEMORY_FACTOR
+        available = memory.max_memory - (current_rss() or 0)
+        # Pages can be waiting in both queues, as well as being read and written
+        budget_depth = max(1, available // (2 * max(largest, 1)) - 1)
+        if budget_depth < depth:
+            logging.info(f"reducing the pipeline depth from {depth} to {budget_depth} to fit the memory budget")
+            depth = budget_depth
+
+    asyncio.run(
+        _run_pipeline(
+            args,
+            paths,
+            old_pagenames_to_new_paths,
+            new_to_old_paths,
+            depth,
+            io_threads,
+            offload_convert,
+            memory,
+            checkpoint,
+            output,
+            graph,
+        )
+    )
@@ -0,0 +1,92 @@
+import concurrent.futures
+import logging
+import os
+import tempfile
+
+from logseqtoobsidian.checkpoint import Checkpoint
+from logseqtoobsidian.convert_notes import convert_contents
+from logseqtoobsidian.graph_input import open_graph
+from logseqtoobsidian.memory import MemoryTracker
+from logseqtoobsidian.output import DirectoryOutput, DryRunOutput
+from logseqtoobsidian.page_index import MappedPageIndex, write_mapped_page_index
+
+# Set in each worker process by _init_worker
+_args = None
+_index = None
+_graph = None
+
+
+class _ConvertedPages:
+    """Stands in for the checkpoint in a worker, collecting the pages it converted so that the main process can record
+    them"""
+
+    def __init__(self):
+        self.pages = []
+
+    def page_done(self, fpath: str, old_path: str):
+        self.pages.append(fpath)
+
+
+def _init_worker(args, index_path: str):
+    global _args, _index, _graph
+    _args = args
+    _index = MappedPageIndex(index_path)
+    _graph = open_graph(args.logseq)
+
+
+def _convert_chunk(paths: list[str]) -> tuple[list[str], int, int]:
+    """Converts pages in a worker, and returns those it converted and how many files it wrote and left unchanged"""
+    if _args.dryrun:
+        output = DryRunOutput(graph=_graph)
+    else:
+        output = DirectoryOutput(copy_hash=_args.copy_hash, write_if_changed=_args.write_if_changed, graph=_graph)
+    memory = MemoryTracker(max_memory=_args.max_memory * 1024 * 1024 if _args.max_memory is not None else None)
+    converted = _ConvertedPages()
+    convert_contents(
+        _args,
+        paths,
+        _index.names,
+        _index.new_to_old,
+        memory=memory,
+        checkpoint=converted,
+        output=output,
+        graph=_graph,
+    )
+    return converted.pages, output.written, output.unchanged
+
+
+def convert_contents_in_processes(
+    args,
+    new_paths: set,
+    old_pagenames_to_new_paths: dict,
+    new_to_old_paths: dict,
+    processes: int,
+    chunk: int = 64,
+    checkpoint: Checkpoint = None,
+    output: DirectoryOutput = None,
+):
+    """Same as convert_contents, but converts the pages on a pool of processes, chunk pages at a time
+
+    The page names and paths maps are written once to a memory-mapped index that every worker opens, rather than being
+    pickled for each of them, so the workers share one physical copy of it. Pages converted by the workers are recorded
+    in the checkpoint by this process
+    """
+    if output is None:
+        output = DirectoryOutput(copy_hash=args.copy_hash)
+
+    paths = sorted(new_paths)
+    chunks = [paths[idx : idx + chunk] for idx in range(0, len(paths), chunk)]
+    with tempfile.TemporaryDirectory(prefix="logseqtoobsidian-") as tmpdir:
+        index_path = os.path.join(tmpdir, "pages.idx")
+        write_mapped_page_index(index_path, old_pagenames_to_new_paths, new_to_old_paths)
+        logging.debug(f"converting {len(paths)} pages on {processes} processes sharing {index_path}")
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=(args, index_path)
+        ) as pool:
+            for converted, written, unchanged in pool.map(_convert_chunk, chunks):
+                output.written += written
+                output.unchanged += unchanged
+                if checkpoint is not None:
+                    for fpath in converted:
+                        checkpoint.page_done(fpath, new_to_old_paths[fpath])
@@ -0,0 +1,379 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import traceback
+
+import logseqtoobsidian.convert_notes
+from logseqtoobsidian.convert_notes import (
+    convert_page,
+    decode_page,
+    get_markdown_file_properties,
+    is_alias_property,
+    is_empty_markdown_file,
+    is_markdown_file,
+    is_unaffected_by_rules,
+    journal_path_and_names,
+    page_path_and_names,
+    parse_aliases,
+    read_page,
+)
+from logseqtoobsidian.attachments import attachment_store
+from logseqtoobsidian.output import DirectoryOutput
+from logseqtoobsidian.page_table import PageTable
+
+
+def file_state(fpath: str):
+    """Returns the size and modification time of a file, or None if there is no such file"""
+    try:
+        st = os.stat(fpath)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class GraphIndex:
+    """Page map of a logseq graph, kept up to date one page at a time as pages are added, changed and removed
+
+    The index remembers the state of every file in the journals and pages folders, so that polling the graph only
+    updates the pages whose file changed, rather than scanning every page again. Page names and aliases are recorded
+    per page, and when a page changes the names it had or has are resolved again from the pages that declare them, so
+    the index is always the one a full run would build: page names take precedence over aliases, a name goes to the
+    last page declaring it in scan order, an alias to the first page declaring it by new path, and of the pages going
+    to the same new path only the first in scan order is converted
+    """
+
+    def __init__(self, args):
+        self.args = args
+        # Absolute, so that paths in requests can be compared with the ones in the index
+        self.old_base = os.path.abspath(args.logseq)
+        self.new_base = os.path.abspath(args.output)
+        self.pages = PageTable()
+        # Path in the graph -> (size, mtime) when it was indexed
+        self.sources = {}
+        # Path in the graph -> (new path, page names, aliases) of every page, including those going to the same new
+        # path as a page before them
+        self.records = {}
+        # New path -> the paths in the graph of the pages going to it
+        self.claims = {}
+        # Page name or alias -> the paths in the graph of the pages declaring it
+        self.name_pages = {}
+        self.alias_pages = {}
+
+    def folders(self) -> list[str]:
+        return [os.path.join(self.old_base, "journals"), os.path.join(self.old_base, "pages")]
+
+    def listing(self) -> dict:
+        """Returns the state of every file in the journals and pages folders of the graph"""
+        states = {}
+        for folder in self.folders():
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        st = entry.stat()
+                        states[entry.path] = (st.st_size, st.st_mtime_ns)
+        return states
+
+    def build(self):
+        """Indexes every page of the graph"""
+        for fpath, state in sorted(self.listing().items()):
+            self._add(fpath, state)
+        logging.info(f"indexed {len(self.pages)} pages of {self.old_base}")
+
+    def poll(self) -> list[str]:
+        """Updates the pages whose file was added, changed or removed since they were indexed, and returns their
+        paths in the graph"""
+        states = self.listing()
+        changed = [fpath for fpath, state in states.items() if self.sources.get(fpath) != state]
+        changed += [fpath for fpath in self.sources if fpath not in states]
+        return self.reindex(sorted(changed))
+
+    def reindex(self, paths: list[str]) -> list[str]:
+        """Updates the pages at these paths in the graph (absolute, or relative to it), and returns the paths that
+        changed since they were indexed"""
+        changed = []
+        for path in paths:
+            fpath = self.in_graph(path)
+            if fpath is None:
+                logging.warning(f"not reindexing a file outside of the journals and pages of the graph: {path}")
+                continue
+            state = file_state(fpath)
+            if self.sources.get(fpath) == state:
+                continue
+            self._remove(fpath)
+            if state is not None:
+                self._add(fpath, state)
+            changed.append(fpath)
+            logging.debug(f"reindexed: {fpath}")
+        return changed
+
+    def _add(self, fpath: str, state: tuple):
+        self.sources[fpath] = state
+
+        folder = os.path.basename(os.path.dirname(fpath))
+        if folder == "pages" and not is_markdown_file(fpath):
+            return
+        if is_empty_markdown_file(fpath):
+            return
+        if folder == "journals":
+            new_journals = os.path.join(self.new_base, "journals")
+            new_fpath, names = journal_path_and_names(self.args, new_journals, os.path.basename(fpath))
+        else:
+            new_fpath, names = page_path_and_names(self.args, self.new_base, os.path.basename(fpath))
+
+        properties, _ = get_markdown_file_properties(fpath)
+        aliases = [
+            alias for key, value in properties.items() if is_alias_property(key) for alias in parse_aliases(value)
+        ]
+        self.records[fpath] = (new_fpath, names, aliases)
+        self.claims.setdefault(new_fpath, set()).add(fpath)
+        for name in names:
+            self.name_pages.setdefault(name, set()).add(fpath)
+        for alias in aliases:
+            self.alias_pages.setdefault(alias, set()).add(fpath)
+        self._update(new_fpath, names + aliases)
+
+    def _remove(self, fpath: str):
+        self.sources.pop(fpath, None)
+        record = self.records.pop(fpath, None)
+        if record is None:
+            return
+
+        new_fpath, names, aliases = record
+        _discard(self.claims, new_fpath, fpath)
+        for name in names:
+            _discard(self.name_pages, name, fpath)
+        for alias in aliases:
+            _discard(self.alias_pages, alias, fpath)
+        self._update(new_fpath, names + aliases)
+
+    def _update(self, new_fpath: str, names: list[str]):
+        """Updates which page goes to new_fpath, and the pages that names and the names of those pages resolve to"""
+        affected = set(names)
+        current = self.pages.new_to_old.get(new_fpath)
+        claims = self.claims.get(new_fpath)
+        owner = min(claims, key=scan_order) if claims else None
+        if owner != current:
+            for fpath in [current, owner]:
+                if fpath in self.records:
+                    affected.update(self.records[fpath][1] + self.records[fpath][2])
+            if current is not None:
+                del self.pages.old_to_new[current]
+                self.pages.new_paths.discard(new_fpath)
+            if owner is not None:
+                self.pages.add_page(owner, new_fpath)
+
+        for name in affected:
+            self._resolve(name)
+
+    def _is_converted(self, fpath: str) -> bool:
+        return self.pages.old_to_new.get(fpath) == self.records[fpath][0]
+
+    def _resolve(self, name: str):
+        """Maps name to the page it goes to in a full run, or takes it out if no page declares it"""
+        pages = [fpath for fpath in self.name_pages.get(name, ()) if self._is_converted(fpath)]
+        if pages:
+            self.pages.names[name] = self.records[max(pages, key=scan_order)][0]
+            return
+        declaring = [self.records[fpath][0] for fpath in self.alias_pages.get(name, ()) if self._is_converted(fpath)]
+        if declaring:
+            self.pages.names[name] = min(declaring)
+        else:
+            # Even if its page no longer has a new path, in which case it's already not in the names
+            try:
+                del self.pages.names[name]
+            except KeyError:
+                pass
+
+    def in_graph(self, page: str) -> str:
+        """Returns the path in the graph of a page given as its path, or None if it isn't in the journals or pages"""
+        fpath = os.path.join(self.old_base, page)
+        if os.path.dirname(fpath) in self.folders():
+            return fpath
+        return None
+
+    def find(self, page: str) -> str:
+        """Returns the path in the graph of a page, given as its path (absolute, or relative to the graph) or name"""
+        fpath = self.in_graph(page)
+        if fpath is not None and fpath in self.pages.old_to_new:
+            return fpath
+        new_fpath = self.pages.names.get(page)
+        if new_fpath is not None:
+            return self.pages.new_to_old[new_fpath]
+        raise ValueError(f"no such page in {self.old_base}: {page}")
+
+
+def scan_order(fpath: str) -> tuple:
+    """Sort key of the pages of a graph in the order a full run scans them, journals first"""
+    return os.path.basename(os.path.dirname(fpath)) != "journals", os.path.basename(fpath)
+
+
+def _discard(index: dict, key: str, fpath: str):
+    paths = index.get(key)
+    if paths is not None:
+        paths.discard(fpath)
+        if not paths:
+            del index[key]
+
+
+class AssetIndex:
+    """Remembers the assets copied while serving, along with the state of their source, so that converting a page
+    again doesn't compare (or hash, with --copy_hash) the assets it embeds again unless they changed"""
+
+    def __init__(self, output: DirectoryOutput):
+        self.output = output
+        self.attachments = output.attachments
+        # New path -> (path in the graph, its state when it was copied)
+        self.copied = {}
+
+    def copy_asset(self, src: str, dst: str) -> bool:
+        state = file_state(src)
+        if state is None:
+            raise FileNotFoundError(src)
+        if self.copied.get(dst) == (src, state) and os.path.exists(dst):
+            return False
+        copied = self.output.copy_asset(src, dst)
+        self.copied[dst] = (src, state)
+        return copied
+
+
+class ConversionServer:
+    """Converts pages of a graph on request, with its index loaded once rather than on every run
+
+    Requests and responses are JSON objects, one per line:
+    - {"op": "convert", "page": ...} converts a page, given as its path in the graph or its name, and writes it to the
+      output. With "text": true the converted page is returned as "text", and with "write": false it isn't written
+    - {"op": "reindex", "paths": [...]} updates the index for these paths in the graph
+    - {"op": "ping"} and {"op": "shutdown"}
+    Every response has "ok", and "error" when it's false. Requests are handled one at a time
+    """
+
+    def __init__(self, args):
+        if args.attachment_layout == "shared":
+            # Pages converted one at a time would name colliding assets in the order they're requested
+            raise ValueError("--attachment_layout shared names colliding assets in one run, it can't be used to serve")
+        self.args = args
+        self.index = GraphIndex(args)
+        self.output = DirectoryOutput(
+            copy_hash=args.copy_hash,
+            attachments=attachment_store(args, self.index.new_base),
+            write_if_changed=args.write_if_changed,
+        )
+        self.assets = AssetIndex(self.output)
+        self.lock = threading.Lock()
+        self.server = None
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "shutdown":
+            # Can't wait for the server to stop from one of its own requests
+            threading.Thread(target=self.server.shutdown).start()
+            return {"ok": True}
+        with self.lock:
+            if op == "convert":
+                return self.convert(request)
+            if op == "reindex":
+                return {"ok": True, "changed": self.index.reindex(request.get("paths", []))}
+        raise ValueError(f"unknown op: {op}")
+
+    def convert(self, request: dict) -> dict:
+        index = self.index
+        page = request["page"]
+        # Don't wait for the next poll to pick up changes to the page itself
+        if index.in_graph(page) is not None:
+            index.reindex([page])
+        old_fpath = index.find(page)
+        index.reindex([old_fpath])
+        fpath = index.pages.old_to_new.get(old_fpath)
+        if fpath is None:
+            raise ValueError(f"the page is empty now: {old_fpath}")
+
+        data = read_page(old_fpath)
+        if is_unaffected_by_rules(self.args, data):
+            newlines = decode_page(data)
+        else:
+            logseqtoobsidian.convert_notes.INSIDE_CODE_BLOCK = False
+            newlines = convert_page(
+                self.args, decode_page(data), fpath, index.pages.names, index.pages.new_to_old, output=self.assets
+            )
+
+        response = {"ok": True, "output": fpath}
+        if request.get("write", True):
+            self.output.makedirs(os.path.dirname(fpath))
+            self.output.write_page(fpath, newlines)
+        if request.get("text", False):
+            response["text"] = "".join(newlines)
+        return response
+
+    def poll(self, interval: float, stopped: threading.Event):
+        while not stopped.wait(interval):
+            try:
+                with self.lock:
+                    changed = self.index.poll()
+                if changed:
+                    logging.info(f"reindexed {len(changed)} changed files")
+            except Exception:
+                logging.error(f"polling the graph failed:\n{traceback.format_exc()}")
+
+    def serve(self, socket_path: str, poll_interval: float = 1.0, ready: threading.Event = None):
+        """Indexes the graph, then serves requests on a Unix socket until asked to shut down"""
+        if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+            raise ValueError("serving needs Unix domain sockets, which this platform doesn't have")
+        remove_stale_socket(socket_path)
+
+        self.index.build()
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        response = server.handle(json.loads(line))
+                    except Exception as e:
+                        logging.debug(traceback.format_exc())
+                        response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                    self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+        stopped = threading.Event()
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as self.server:
+            self.server.daemon_threads = True
+            if poll_interval:
+                threading.Thread(target=self.poll, args=(poll_interval, stopped), daemon=True).start()
+            logging.info(f"serving {self.args.logseq} on {socket_path}")
+            if ready is not None:
+                ready.set()
+            try:
+                self.server.serve_forever()
+            finally:
+                stopped.set()
+                os.remove(socket_path)
+
+
+def remove_stale_socket(socket_path: str):
+    """Removes the socket left behind by a server that didn't shut down, but not one that a server is listening on"""
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise ValueError(f"a server is already listening on {socket_path}")
+
+
+def request(socket_path: str, message: dict) -> dict:
+    """Sends a request to a conversion server and returns its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
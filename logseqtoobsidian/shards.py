@@ -0,0 +1,156 @@
+import argparse
+import filecmp
+import hashlib
+import json
+import logging
+import os
+import shutil
+import typing
+
+
+# Written to the root of every shard's output tree, and skipped when merging
+SHARD_MANIFEST = "logseqtoobsidian_shard.json"
+SHARD_MANIFEST_VERSION = 1
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses a shard specification of the form "i/N" into (i, N), for use as an argparse type"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a shard of the form i/N, got '{value}'")
+
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in the range 0..N-1, got '{value}'")
+
+    return index, count
+
+
+def shard_key(old_path: str) -> str:
+    """Given the path of a file in the logseq graph, returns the key used to assign it to a shard
+
+    The key only depends on the file's location inside the graph ("pages/foo.md"), so every machine computes the same
+    shard for it regardless of where the graph or the output are mounted
+    """
+    return os.path.basename(os.path.dirname(old_path)) + "/" + os.path.basename(old_path)
+
+
+def shard_of(old_path: str, count: int) -> int:
+    """Returns the shard in 0..count-1 that the given logseq file belongs to"""
+    digest = hashlib.sha1(shard_key(old_path).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def in_shard(shard: typing.Optional[tuple[int, int]], old_path: str) -> bool:
+    """Checks if the given logseq file should be converted by this shard. Everything is in shard when not sharding"""
+    if shard is None:
+        return True
+
+    index, count = shard
+    return shard_of(old_path, count) == index
+
+
+def page_map_digest(new_base: str, new_to_old_paths: dict) -> str:
+    """Returns a digest of the global page map, which must be identical for every shard of a run"""
+    entries = sorted(
+        shard_key(old_path) + "\t" + os.path.relpath(new_path, new_base).replace(os.sep, "/")
+        for new_path, old_path in new_to_old_paths.items()
+    )
+    digest = hashlib.sha256()
+    for entry in entries:
+        digest.update(entry.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def list_output_files(base: str) -> list[str]:
+    """Returns the sorted relative paths (with "/" separators) of all files under base, except the shard manifest"""
+    out = []
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames.sort()
+        for fname in filenames:
+            relpath = os.path.relpath(os.path.join(dirpath, fname), base).replace(os.sep, "/")
+            if relpath != SHARD_MANIFEST:
+                out.append(relpath)
+    return sorted(out)
+
+
+def write_shard_manifest(new_base: str, shard: tuple[int, int], digest: str):
+    """Records which shard produced the output tree at new_base, and the files it wrote"""
+    files = {}
+    for relpath in list_output_files(new_base):
+        files[relpath] = os.path.getsize(os.path.join(new_base, relpath))
+
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "shard": shard[0],
+        "shard_count": shard[1],
+        "page_map_digest": digest,
+        "files": files,
+    }
+    with open(os.path.join(new_base, SHARD_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def read_shard_manifest(shard_dir: str) -> dict:
+    manifest_path = os.path.join(shard_dir, SHARD_MANIFEST)
+    if not os.path.isfile(manifest_path):
+        raise ValueError(f"'{shard_dir}' is not the output of a sharded run, it has no {SHARD_MANIFEST}")
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != SHARD_MANIFEST_VERSION:
+        raise ValueError(f"unsupported shard manifest version in '{manifest_path}'")
+
+    return manifest
+
+
+def validate_shards(shard_dirs: list[str]) -> list[dict]:
+    """Checks that the given output trees are exactly the shards 0..N-1 of one run, and returns their manifests"""
+    manifests = [read_shard_manifest(shard_dir) for shard_dir in shard_dirs]
+    if not manifests:
+        raise ValueError("no shards given to merge")
+
+    count = manifests[0]["shard_count"]
+    digest = manifests[0]["page_map_digest"]
+    for shard_dir, manifest in zip(shard_dirs, manifests):
+        if manifest["shard_count"] != count:
+            raise ValueError(f"'{shard_dir}' was made with {manifest['shard_count']} shards, expected {count}")
+        if manifest["page_map_digest"] != digest:
+            raise ValueError(f"'{shard_dir}' was converted from a different page map than '{shard_dirs[0]}'")
+        for relpath, size in manifest["files"].items():
+            fpath = os.path.join(shard_dir, relpath)
+            if not os.path.isfile(fpath) or os.path.getsize(fpath) != size:
+                raise ValueError(f"'{fpath}' is missing or differs from the shard manifest")
+
+    indices = sorted(manifest["shard"] for manifest in manifests)
+    if indices != list(range(count)):
+        missing = sorted(set(range(count)) - set(indices))
+        raise ValueError(f"expected shards 0..{count - 1} exactly once each, missing {missing}, got {indices}")
+
+    return manifests
+
+
+def merge_shards(shard_dirs: list[str], new_base: str):
+    """Validates the shards of a run and combines them into the output tree at new_base
+
+    Files can only appear in more than one shard if they're identical, which happens when pages in different shards
+    embed the same asset
+    """
+    manifests = validate_shards(shard_dirs)
+
+    sources = {}
+    for shard_dir, manifest in sorted(zip(shard_dirs, manifests), key=lambda item: item[1]["shard"]):
+        for relpath in manifest["files"]:
+            fpath = os.path.join(shard_dir, relpath)
+            if relpath in sources:
+                if not filecmp.cmp(sources[relpath], fpath, shallow=False):
+                    raise ValueError(f"shards disagree about '{relpath}': {sources[relpath]} != {fpath}")
+                continue
+            sources[relpath] = fpath
+
+    for relpath in sorted(sources):
+        new_fpath = os.path.join(new_base, *relpath.split("/"))
+        logging.info(f"merging: {sources[relpath]} ->\n{' ' * len('INFO: merging: ')}{new_fpath}")
+        os.makedirs(os.path.dirname(new_fpath), exist_ok=True)
+        shutil.copyfile(sources[relpath], new_fpath)
@@ -0,0 +1,186 @@
+import collections
+import fnmatch
+import logging
+import os
+
+from logseqtoobsidian.convert_notes import (
+    convert_front_matter,
+    convert_lines,
+    decode_page,
+    get_markdown_file_properties,
+    is_alias_property,
+    is_markdown_file,
+    journal_path_and_names,
+    page_path_and_names,
+    parse_aliases,
+    parse_properties,
+    property_aliases,
+    read_page,
+)
+from logseqtoobsidian.graph_input import DirectoryGraph
+
+
+class LinkedNames:
+    """Stands in for the page names map when converting a page, recording the names that its links look up
+
+    Every name is reported missing, so that the conversion doesn't need to know where pages go
+    """
+
+    def __init__(self):
+        self.names = []
+
+    def __contains__(self, name: str) -> bool:
+        self.names.append(name)
+        return False
+
+
+def linked_names(args, fpath: str, graph: DirectoryGraph = None) -> tuple[list[str], list[str]]:
+    """Returns the names of the pages that the page at fpath (in the graph) links to once converted, and the aliases
+    that the page declares"""
+    lines = decode_page(read_page(fpath, graph))
+    properties, _ = parse_properties(lines)
+    _, first_line_after_front_matter = convert_front_matter(args, lines)
+    names = LinkedNames()
+    for _ in convert_lines(
+        args, lines[first_line_after_front_matter:], fpath, names, fpath, lambda src, dst: False
+    ):
+        pass
+    return names.names, property_aliases(properties)
+
+
+def graph_page_names(args, old_base: str, graph: DirectoryGraph = None) -> dict:
+    """Returns the markdown pages of the graph, as their path -> the names that links to them use
+
+    Only the journals and pages folders are listed, no page is read
+    """
+    if graph is None:
+        graph = DirectoryGraph()
+    pages = {}
+    old_journals = os.path.join(old_base, "journals")
+    for fname in sorted(graph.listdir(old_journals)):
+        if is_markdown_file(fname):
+            _, names = journal_path_and_names(args, "", fname)
+            pages[os.path.join(old_journals, fname)] = names
+
+    old_pages = os.path.join(old_base, "pages")
+    for fname in sorted(graph.listdir(old_pages)):
+        if is_markdown_file(fname):
+            _, names = page_path_and_names(args, "", fname)
+            pages[os.path.join(old_pages, fname)] = names
+    return pages
+
+
+def graph_aliases(fpaths: list[str], graph: DirectoryGraph = None) -> dict:
+    """Returns the aliases declared by the pages at fpaths, mapped to the first page declaring them"""
+    aliases = {}
+    for fpath in fpaths:
+        properties, _ = get_markdown_file_properties(fpath, graph)
+        for key, value in properties.items():
+            if is_alias_property(key):
+                for alias in parse_aliases(value):
+                    aliases.setdefault(alias, fpath)
+    return aliases
+
+
+def matches_any(patterns: list[str], relpath: str, names: list[str]) -> bool:
+    """Checks if a glob matches the path of a page in the graph, eg pages/project___*.md, or one of its names, eg
+    project/*"""
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(relpath, pattern):
+            return True
+        if any(fnmatch.fnmatchcase(name, pattern) for name in names):
+            return True
+    return False
+
+
+def select_pages(args, old_base: str, graph: DirectoryGraph = None) -> set:
+    """Returns the paths of the pages of the graph selected by --include, --exclude, --from_page and --depth, or None
+    if they select the whole graph
+
+    --include and --exclude decide which pages can be converted. With --from_page, only those of them that are
+    reachable from the given pages, following at most --depth links, are. Only the pages on the way are read: a link
+    that doesn't match the name of a page is followed once a page that was read declares it as an alias. The aliases of
+    every page are only read with --scan_aliases, or if a --from_page is neither the path nor the name of a page
+    """
+    if args.depth is not None and not args.from_page:
+        raise ValueError("--depth is the number of links followed from the pages given with --from_page")
+    if not args.include and not args.exclude and not args.from_page:
+        return None
+
+    pages = graph_page_names(args, old_base, graph)
+    allowed = set()
+    by_name = {}
+    for fpath, names in pages.items():
+        relpath = os.path.relpath(fpath, old_base).replace(os.sep, "/")
+        if args.include and not matches_any(args.include, relpath, names):
+            continue
+        if args.exclude and matches_any(args.exclude, relpath, names):
+            continue
+        allowed.add(fpath)
+        for name in names:
+            by_name.setdefault(name, fpath)
+
+    if not args.from_page:
+        logging.info(f"converting {len(allowed)} of the {len(pages)} pages of the graph")
+        return allowed
+
+    # Alias -> the page declaring it, from the pages read so far, or from every page with --scan_aliases
+    aliases = {}
+    if args.scan_aliases:
+        aliases = {alias: fpath for alias, fpath in graph_aliases(list(pages), graph).items() if fpath in allowed}
+
+    def find(name: str) -> str:
+        if name in by_name:
+            return by_name[name]
+        return aliases.get(name)
+
+    # Path -> the fewest links followed to reach it
+    depths = {}
+    queue = collections.deque()
+    for page in args.from_page:
+        fpath = os.path.join(old_base, page)
+        if fpath not in allowed:
+            fpath = find(page)
+        if fpath is None and not args.scan_aliases:
+            fpath = graph_aliases(list(pages), graph).get(page)
+            fpath = fpath if fpath in allowed else None
+        if fpath is None:
+            raise ValueError(f"--from_page '{page}' is neither a page of {old_base} nor the name of one")
+        if fpath not in depths:
+            depths[fpath] = 0
+            queue.append(fpath)
+
+    def reach(fpath: str, depth: int):
+        if fpath not in depths or depth < depths[fpath]:
+            depths[fpath] = depth
+            queue.append(fpath)
+
+    # Links that don't match a page yet, as name -> the fewest links followed to the pages linking to it
+    pending = {}
+    # Path -> the names it links to, so that a page reached again with fewer links isn't read again
+    links = {}
+    # Breadth first, so that every page is reached with the fewest links
+    while queue:
+        fpath = queue.popleft()
+        depth = depths[fpath]
+        if fpath not in links:
+            links[fpath], declared = linked_names(args, fpath, graph)
+            for alias in declared:
+                if alias in by_name or alias in aliases:
+                    continue
+                aliases[alias] = fpath
+                # Links seen before this page was read
+                if alias in pending:
+                    reach(fpath, pending.pop(alias) + 1)
+        if args.depth is not None and depth >= args.depth:
+            continue
+        for name in links[fpath]:
+            linked = find(name)
+            if linked is not None:
+                reach(linked, depth + 1)
+            elif name not in pending or depth < pending[name]:
+                pending[name] = depth
+
+    selected = set(depths)
+    logging.info(f"converting {len(selected)} of the {len(pages)} pages of the graph, reached from --from_page")
+    return selected
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from logseqtoobsidian.__main__ import build_parser, main
+from logseqtoobsidian.attachments import SharedAttachments
+from logseqtoobsidian.copying import file_digest
+from logseqtoobsidian.server import ConversionServer
+
+
+class TestSharedAttachments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, relpath, data):
+        fpath = os.path.join(self.tmpdir, relpath)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "wb") as f:
+            f.write(data)
+        return fpath
+
+    def test_collisions_are_named_after_their_contents(self):
+        first = self.write("a/image.png", b"first")
+        same = self.write("b/image.png", b"first")
+        other = self.write("c/image.png", b"other")
+        unique = self.write("a/photo.png", b"photo")
+        store = SharedAttachments(os.path.join(self.tmpdir, "vault", "attachments"))
+
+        # Only resolving a collision needs hashing
+        with mock.patch("logseqtoobsidian.copying.file_digest", wraps=file_digest) as digest:
+            self.assertEqual(store.place(first), os.path.join(store.directory, "image.png"))
+            self.assertEqual(store.place(unique), os.path.join(store.directory, "photo.png"))
+            self.assertEqual(digest.call_count, 0)
+
+            self.assertEqual(store.place(same), os.path.join(store.directory, "image.png"))
+            renamed = store.place(other)
+            self.assertRegex(os.path.basename(renamed), r"^image-[0-9a-f]{12}\.png$")
+            self.assertEqual(store.place(other), renamed)
+
+    def test_missing_asset(self):
+        store = SharedAttachments(self.tmpdir)
+        with self.assertRaises(FileNotFoundError):
+            store.place(os.path.join(self.tmpdir, "missing.png"))
+
+
+class TestSharedLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.graph = os.path.join(self.tmpdir, "graph")
+        shutil.copytree("example/logseq_vault", self.graph)
+        with open(os.path.join(self.graph, "pages", "algorithms___sorting.md"), "w") as f:
+            f.write("- ![image.png](../assets/image_1688968010207_0.png)\n")
+        with open(os.path.join(self.graph, "journals", "2025_03_20.md"), "w") as f:
+            f.write("- ![image.png](../assets/image_1688968010207_0.png)\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_assets_are_stored_once(self):
+        vault = os.path.join(self.tmpdir, "vault")
+        main(["--logseq", self.graph, "--output", vault, "--attachment_layout", "shared"])
+
+        copies = [
+            os.path.relpath(os.path.join(dirpath, fname), vault)
+            for dirpath, _, filenames in os.walk(vault)
+            for fname in filenames
+            if fname == "image_1688968010207_0.png"
+        ]
+        self.assertEqual(copies, [os.path.join("attachments", "image_1688968010207_0.png")])
+
+        with open(os.path.join(vault, "algorithms", "sorting.md")) as f:
+            self.assertEqual(f.read(), "- [image.png](../attachments/image_1688968010207_0.png)\n")
+        with open(os.path.join(vault, "journals", "2025_03_20.md")) as f:
+            self.assertEqual(f.read(), "- [image.png](../attachments/image_1688968010207_0.png)\n")
+
+    def test_needs_a_single_run(self):
+        vault = os.path.join(self.tmpdir, "vault")
+        shared = ["--logseq", self.graph, "--output", vault, "--attachment_layout", "shared"]
+        for extra in [["--shard", "0/2"], ["--resume"]]:
+            with self.assertRaises(ValueError):
+                main([*shared, *extra])
+            self.assertFalse(os.path.exists(vault))
+
+        with self.assertRaises(ValueError):
+            ConversionServer(build_parser().parse_args(shared))
+
+        index = os.path.join(self.tmpdir, "pages.json")
+        main([*shared, "--save_index", index])
+        with self.assertRaises(ValueError):
+            main(["filter", "--index", index, "--page", "pages/algorithms___sorting.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
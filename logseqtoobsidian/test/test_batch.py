@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from logseqtoobsidian.__main__ import CustomFormatter, main
+from logseqtoobsidian.batch import job_argv, load_manifest
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_manifest(self, jobs):
+        fpath = os.path.join(self.tmpdir, "manifest.json")
+        with open(fpath, "w") as f:
+            json.dump(jobs, f)
+        return fpath
+
+    def test_job_argv(self):
+        job = {
+            "logseq": "graph",
+            "output": "vault",
+            "options": {"journal_dashes": True, "unindent_once": False, "assets_dir": "files"},
+        }
+        self.assertEqual(
+            job_argv(job), ["--logseq", "graph", "--output", "vault", "--journal_dashes", "--assets_dir", "files"]
+        )
+
+    def test_invalid_manifest(self):
+        with self.assertRaises(ValueError):
+            load_manifest(self.write_manifest({"logseq": "graph"}))
+        with self.assertRaises(ValueError):
+            load_manifest(self.write_manifest([{"output": "vault"}]))
+
+    def test_failed_graph_does_not_stop_the_others(self):
+        for workers in ["1", "2"]:
+            base = os.path.join(self.tmpdir, workers)
+            jobs = [
+                {"logseq": "example/logseq_vault", "output": os.path.join(base, "a")},
+                {"logseq": os.path.join(self.tmpdir, "missing"), "output": os.path.join(base, "b")},
+                {"logseq": "example/logseq_vault", "output": os.path.join(base, "c"), "options": {"no_such_option": 1}},
+                {
+                    "logseq": "example/logseq_vault",
+                    "output_archive": os.path.join(base, "d.zip"),
+                    "options": {"journal_dashes": True},
+                },
+            ]
+            report = os.path.join(self.tmpdir, f"report{workers}.json")
+
+            self.assertEqual(main(["batch", self.write_manifest(jobs), "--jobs", workers, "--report", report]), 1)
+
+            with open(report) as f:
+                results = json.load(f)
+            self.assertEqual([result["status"] for result in results], ["ok", "failed", "failed", "ok"])
+            self.assertIn("ValueError", results[1]["error"])
+            self.assertTrue(os.path.isfile(os.path.join(base, "a", "algorithms.md")))
+            self.assertTrue(os.path.isfile(os.path.join(base, "d.zip")))
+
+    def test_logging_is_set_up_once(self):
+        for _ in range(3):
+            main(["verify", self.tmpdir])
+        handlers = logging.getLogger().handlers
+        self.assertEqual(len([handler for handler in handlers if isinstance(handler.formatter, CustomFormatter)]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import logseqtoobsidian.convert_notes
+from logseqtoobsidian.__main__ import main
+from logseqtoobsidian.checkpoint import CHECKPOINT, CHECKPOINT_LOG
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.logseq_dir = os.path.join(self.tmpdir, "graph")
+        shutil.copytree("example/logseq_vault", self.logseq_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_tree(self, base):
+        tree = {}
+        for dirpath, _, filenames in os.walk(base):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, base)] = f.read()
+        return tree
+
+    def read_log(self, output):
+        with open(os.path.join(output, CHECKPOINT_LOG)) as f:
+            return {json.loads(line)[0] for line in f}
+
+    def run_converter(self, output, *extra, interrupt_after=None):
+        """Runs the converter, raising Interrupted after interrupt_after pages were converted, and returns the pages
+        that were converted"""
+        converted = []
+        convert_page = logseqtoobsidian.convert_notes.convert_page
+
+        def counting_convert_page(args, lines, fpath, *rest, **kwargs):
+            if interrupt_after is not None and len(converted) >= interrupt_after:
+                raise Interrupted()
+            converted.append(fpath)
+            return convert_page(args, lines, fpath, *rest, **kwargs)
+
+        with patch("logseqtoobsidian.convert_notes.convert_page", counting_convert_page), patch(
+            "logseqtoobsidian.pipeline.convert_page", counting_convert_page
+        ):
+            main(["--logseq", self.logseq_dir, "--output", output, "--checkpoint_every", "1", *extra])
+        return converted
+
+    def test_resume_matches_uninterrupted_run(self):
+        for extra in [[], ["--pipeline"]]:
+            full = os.path.join(self.tmpdir, "full" + "".join(extra))
+            all_converted = self.run_converter(full, *extra)
+
+            resumed = os.path.join(self.tmpdir, "resumed" + "".join(extra))
+            with self.assertRaises(Interrupted):
+                self.run_converter(resumed, *extra, interrupt_after=3)
+            self.assertTrue(os.path.exists(os.path.join(resumed, CHECKPOINT)))
+
+            done = self.read_log(resumed)
+            self.assertTrue(done)
+
+            converted = self.run_converter(resumed, "--resume", *extra)
+            # Pages converted before the interruption aren't converted again
+            self.assertEqual(
+                {os.path.relpath(fpath, resumed) for fpath in converted},
+                {os.path.relpath(fpath, full) for fpath in all_converted} - done,
+            )
+            self.assertEqual(self.read_tree(full), self.read_tree(resumed))
+            self.assertFalse(os.path.exists(os.path.join(resumed, CHECKPOINT_LOG)))
+
+    def test_changed_pages_are_converted_again(self):
+        output = os.path.join(self.tmpdir, "out")
+        with self.assertRaises(Interrupted):
+            self.run_converter(output, interrupt_after=3)
+
+        done = sorted(self.read_log(output))
+        for relpath in done[:2]:
+            with open(os.path.join(output, relpath), "a") as f:
+                f.write("edited")
+        self.run_converter(output, "--resume")
+
+        full = os.path.join(self.tmpdir, "full")
+        self.run_converter(full)
+        self.assertEqual(self.read_tree(full), self.read_tree(output))
+
+    def test_resume_needs_a_checkpoint_and_the_same_options(self):
+        output = os.path.join(self.tmpdir, "out")
+        self.run_converter(output)
+        with self.assertRaises(ValueError):
+            self.run_converter(output, "--resume")
+
+        output = os.path.join(self.tmpdir, "interrupted")
+        with self.assertRaises(Interrupted):
+            self.run_converter(output, interrupt_after=1)
+        with self.assertRaises(ValueError):
+            self.run_converter(output, "--resume", "--convert_tags_to_links")
+
+    def test_no_checkpoint_by_default(self):
+        output = os.path.join(self.tmpdir, "out")
+        with patch("logseqtoobsidian.__main__.Checkpoint") as checkpoint:
+            main(["--logseq", self.logseq_dir, "--output", output])
+        checkpoint.assert_not_called()
+        self.assertFalse(os.path.exists(os.path.join(output, CHECKPOINT)))
+
+
+if __name__ == "__main__":
+    unittest.main()
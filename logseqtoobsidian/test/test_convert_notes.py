@@ -6,6 +6,7 @@ from unittest.mock import Mock, patch
 
 from logseqtoobsidian.convert_notes import (
     copy_journals,
+    copy_pages,
     get_markdown_file_properties,
     is_markdown_file,
     is_empty_markdown_file,
@@ -25,7 +26,17 @@ from logseqtoobsidian.convert_notes import (
     unindent_once,
     fix_escapes,
     unencode_filenames_for_links,
+    convert_page,
+    decode_page,
+    is_unaffected_by_rules,
+    parse_aliases,
+    build_alias_index,
+    add_aliases_to_page_names,
+    convert_front_matter,
+    probe_page,
+    PAGE,
 )
+from logseqtoobsidian.graph_input import DirectoryGraph
 
 
 class TestConvertNotes(unittest.TestCase):
@@ -49,6 +60,47 @@ class TestConvertNotes(unittest.TestCase):
         self.assertEqual(({"title": "An Example Title"}, 1), get_markdown_file_properties(tmp_path))
         os.remove(tmp_path)
 
+    def test_get_markdown_file_properties_stops_after_properties(self):
+        with tempfile.NamedTemporaryFile(suffix=".md", delete=False) as tmp:
+            tmp.write(b"title:: An Example Title\n")
+            tmp.write(b"alias:: Another Title\n")
+            tmp.write(b"- Some text\n")
+            tmp.write(b"- key:: not a page property\n")
+            tmp_path = tmp.name
+        self.assertEqual(
+            ({"title": "An Example Title", "alias": "Another Title"}, 2), get_markdown_file_properties(tmp_path)
+        )
+        os.remove(tmp_path)
+
+    def test_parse_aliases(self):
+        self.assertEqual(parse_aliases("foo, [[bar baz]], #qux,"), ["foo", "bar baz", "qux"])
+
+    def test_build_alias_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            page_aliases = {}
+            for name, content in [("a", "alias:: b, c\n- text\n"), ("d", "alias:: c, e\n"), ("f", "- alias:: g\n")]:
+                old_path = os.path.join(tmpdir, name + ".md")
+                with open(old_path, "w") as f:
+                    f.write(content)
+                kind, aliases = probe_page(old_path)
+                self.assertEqual(kind, PAGE)
+                page_aliases["/new/" + name + ".md"] = aliases
+
+            aliases = build_alias_index(page_aliases)
+            self.assertEqual(aliases, {"b": "/new/a.md", "c": "/new/a.md", "e": "/new/d.md"})
+
+            names = {"a": "/new/a.md", "e": "/new/e.md"}
+            add_aliases_to_page_names(aliases, names)
+            self.assertEqual(names, {"a": "/new/a.md", "b": "/new/a.md", "c": "/new/a.md", "e": "/new/e.md"})
+
+    def test_convert_front_matter_aliases(self):
+        args = Mock()
+        args.tag_prop_to_taglist = False
+        self.assertEqual(
+            convert_front_matter(args, ["title:: T\n", 'alias:: a, [[b "c"]]\n', "- text\n"]),
+            (["---\n", "title: T\n", "aliases:\n", '  - "a"\n', '  - "b \\"c\\""\n', "---\n"], 2),
+        )
+
     def test_get_namespace_hierarchy_when_ignore_dot_for_namespace_false(self):
         args = Mock()
         args.ignore_dot_for_namespaces = False
@@ -309,5 +361,120 @@ class TestCopyJournals(unittest.TestCase):
         mock_copyfile.assert_called_once_with(os.path.join(self.old_journals, 'file_with_underscores.md'), expected_new_fpath)
 
 
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.args = type('', (), {})()
+        self.args.journal_dashes = False
+        self.args.dryrun = False
+        self.args.ignore_dot_for_namespaces = False
+        self.args.copy_hash = False
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def scan(self, old_base, new_base, workers):
+        maps = ({}, {}, set(), set(), {})
+        os.makedirs(os.path.join(new_base, "journals"), exist_ok=True)
+        copy_journals(self.args, os.path.join(old_base, "journals"), os.path.join(new_base, "journals"), *maps,
+                      workers=workers)
+        copy_pages(self.args, os.path.join(old_base, "pages"), new_base, *maps, workers=workers)
+        return maps
+
+    def test_workers_give_the_same_maps(self):
+        new_base = os.path.join(self.tmpdir, "vault")
+        sequential = self.scan("example/logseq_vault", new_base, 1)
+        shutil.rmtree(new_base)
+        parallel = self.scan("example/logseq_vault", new_base, 4)
+        self.assertEqual(parallel, sequential)
+        # Filled in the same order too
+        self.assertEqual(list(parallel[4].items()), list(sequential[4].items()))
+        self.assertTrue(os.path.isfile(os.path.join(new_base, "algorithms", "dynamic programming.md")))
+
+    def test_collisions_are_reported(self):
+        old_base = os.path.join(self.tmpdir, "graph")
+        os.makedirs(os.path.join(old_base, "journals"))
+        os.makedirs(os.path.join(old_base, "pages"))
+        for fname, text in [("a.b.md", "- dots\n"), ("a___b.md", "- underscores\n")]:
+            with open(os.path.join(old_base, "pages", fname), "w") as f:
+                f.write(text)
+
+        for workers in [1, 4]:
+            new_base = os.path.join(self.tmpdir, f"vault{workers}")
+            with self.assertLogs(level="WARNING") as logs:
+                old_to_new_paths, new_to_old_paths, _, _, _ = self.scan(old_base, new_base, workers)
+
+            self.assertIn("a___b.md", logs.output[0])
+            self.assertEqual(
+                new_to_old_paths, {os.path.join(new_base, "a", "b.md"): os.path.join(old_base, "pages", "a.b.md")}
+            )
+            self.assertNotIn(os.path.join(old_base, "pages", "a___b.md"), old_to_new_paths)
+            with open(os.path.join(new_base, "a", "b.md")) as f:
+                self.assertEqual(f.read(), "- dots\n")
+
+    def test_aliases_are_collected_while_scanning(self):
+        new_base = os.path.join(self.tmpdir, "vault")
+        page_aliases = {}
+        with patch.object(DirectoryGraph, "open_text", autospec=True, side_effect=DirectoryGraph.open_text) as read:
+            maps = ({}, {}, set(), set(), {})
+            os.makedirs(os.path.join(new_base, "journals"))
+            copy_journals(self.args, "example/logseq_vault/journals", os.path.join(new_base, "journals"), *maps,
+                          page_aliases=page_aliases)
+            copy_pages(self.args, "example/logseq_vault/pages", new_base, *maps, page_aliases=page_aliases)
+
+        # Each page is read once, for both the emptiness check and its aliases
+        read_paths = [call.args[1] for call in read.call_args_list]
+        self.assertEqual(sorted(read_paths), sorted(set(read_paths)))
+        self.assertEqual(page_aliases, {os.path.join(new_base, "aliased page.md"): ["other name", "yet another name"]})
+
+
+class TestIsUnaffectedByRules(unittest.TestCase):
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = True
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+        self.args.engine = "lines"
+
+    def convert(self, data):
+        newlines = convert_page(self.args, decode_page(data), "/path/to/page.md", {}, {"/path/to/page.md": "/old/page.md"})
+        return "".join(newlines).encode("utf-8")
+
+    def test_plain_pages_are_unaffected(self):
+        for data in [
+            b"- a plain note\n\t- with a child\n",
+            b"Just some text - with a hyphen, and no bullets",
+            "- caf\u00e9 \u2603\n".encode("utf-8"),
+            b"",
+        ]:
+            self.assertTrue(is_unaffected_by_rules(self.args, data), data)
+            self.assertEqual(self.convert(data), data)
+
+    def test_pages_that_a_rule_changes_are_affected(self):
+        for data in [
+            b"- [[link]]\n",
+            b"- #tag\n",
+            b"- ![image](image.png)\n",
+            b"- ((block-ref))\n",
+            b"- {{embed ((block-ref))}}\n",
+            b"- a < b\n",
+            b"title:: properties\n",
+            b"- TODO task\n",
+            b"    - spaces\n",
+            b"- ```python\n",
+            b"- text\n-\n- text\n",
+            b"- ends with a hyphen-\n",
+            b"- windows\r\n",
+            b"- invalid \xff utf-8\n",
+        ]:
+            self.assertFalse(is_unaffected_by_rules(self.args, data), data)
+
+    def test_unindent_once_affects_every_page(self):
+        self.args.unindent_once = True
+        self.assertFalse(is_unaffected_by_rules(self.args, b"- a plain note\n"))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,97 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from logseqtoobsidian.copying import copy_file, files_match
+
+
+class TestCopyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, "image.png")
+        self.dst = os.path.join(self.tmpdir, "attachments", "image.png")
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.src, "wb") as f:
+            f.write(b"image content" * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, fpath):
+        with open(fpath, "rb") as f:
+            return f.read()
+
+    def test_copies_and_keeps_modification_time(self):
+        self.assertTrue(copy_file(self.src, self.dst))
+        self.assertEqual(self.read(self.src), self.read(self.dst))
+        self.assertEqual(os.stat(self.src).st_mtime_ns, os.stat(self.dst).st_mtime_ns)
+        self.assertEqual(os.listdir(os.path.dirname(self.dst)), ["image.png"])
+
+    def test_skips_identical_destination(self):
+        copy_file(self.src, self.dst)
+        self.assertFalse(copy_file(self.src, self.dst))
+        self.assertFalse(copy_file(self.src, self.dst, compare_hash=True))
+
+    def test_copies_changed_source(self):
+        copy_file(self.src, self.dst)
+        with open(self.src, "ab") as f:
+            f.write(b"more")
+        self.assertTrue(copy_file(self.src, self.dst))
+        self.assertEqual(self.read(self.src), self.read(self.dst))
+
+    def test_compare_hash_ignores_modification_time(self):
+        shutil.copyfile(self.src, self.dst)
+        os.utime(self.dst, ns=(0, 0))
+        self.assertFalse(files_match(self.src, self.dst))
+        self.assertTrue(files_match(self.src, self.dst, compare_hash=True))
+
+        # Same size and modification time, but different contents
+        with open(self.dst, "r+b") as f:
+            f.write(b"X")
+        os.utime(self.dst, ns=(os.stat(self.src).st_atime_ns, os.stat(self.src).st_mtime_ns))
+        self.assertTrue(files_match(self.src, self.dst))
+        self.assertFalse(files_match(self.src, self.dst, compare_hash=True))
+
+    def test_falls_back_when_kernel_copies_are_unsupported(self):
+        def unsupported(*args):
+            raise OSError(errno.ENOSYS, "not supported")
+
+        with patch("logseqtoobsidian.copying._reflink", return_value=False), patch(
+            "logseqtoobsidian.copying._copy_file_range", side_effect=unsupported
+        ), patch("logseqtoobsidian.copying._sendfile", side_effect=unsupported):
+            self.assertTrue(copy_file(self.src, self.dst))
+        self.assertEqual(self.read(self.src), self.read(self.dst))
+
+    def test_falls_back_when_kernel_copies_copy_nothing(self):
+        with patch("logseqtoobsidian.copying._reflink", return_value=False), patch(
+            "logseqtoobsidian.copying._copy_file_range", return_value=0
+        ), patch("logseqtoobsidian.copying._sendfile", return_value=0):
+            self.assertTrue(copy_file(self.src, self.dst))
+        self.assertEqual(self.read(self.src), self.read(self.dst))
+
+    def test_finishes_a_kernel_copy_that_stops_short(self):
+        def first_chunk(src_fd, dst_fd, offset, count):
+            if offset > 0:
+                return 0
+            return os.copy_file_range(src_fd, dst_fd, 100, offset, offset)
+
+        if not hasattr(os, "copy_file_range"):
+            self.skipTest("copy_file_range isn't available")
+        with patch("logseqtoobsidian.copying._reflink", return_value=False), patch(
+            "logseqtoobsidian.copying._copy_file_range", side_effect=first_chunk
+        ):
+            self.assertTrue(copy_file(self.src, self.dst))
+        self.assertEqual(self.read(self.src), self.read(self.dst))
+
+    def test_missing_source(self):
+        with self.assertRaises(FileNotFoundError):
+            copy_file(os.path.join(self.tmpdir, "missing.png"), self.dst)
+        self.assertEqual(os.listdir(os.path.dirname(self.dst)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
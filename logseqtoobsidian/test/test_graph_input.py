@@ -0,0 +1,108 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from logseqtoobsidian.__main__ import main
+from logseqtoobsidian.graph_input import ArchiveGraph, graph_root, open_graph
+
+GRAPH = "example/logseq_vault"
+
+
+def zip_graph(fpath: str, root: str = ""):
+    with zipfile.ZipFile(fpath, "w") as zf:
+        for dirpath, _, filenames in os.walk(GRAPH):
+            for fname in filenames:
+                src = os.path.join(dirpath, fname)
+                zf.write(src, root + os.path.relpath(src, GRAPH).replace(os.sep, "/"))
+
+
+class TestArchiveGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def convert(self, graph, name, *args):
+        vault = os.path.join(self.tmpdir, name)
+        main(["--logseq", graph, "--output", vault, *args])
+        tree = {}
+        for dirpath, _, filenames in os.walk(vault):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, vault)] = f.read()
+        return tree
+
+    def test_zip_matches_directory(self):
+        expected = self.convert(GRAPH, "vault")
+        for idx, root in enumerate(["", "logseq_vault/"]):
+            archive = os.path.join(self.tmpdir, f"graph{idx}.zip")
+            zip_graph(archive, root)
+            self.assertEqual(self.convert(archive, f"zip{idx}"), expected)
+        self.assertEqual(self.convert(archive, "processes", "--processes", "2"), expected)
+
+    def test_tar_matches_directory(self):
+        expected = self.convert(GRAPH, "vault", "--journal_dashes")
+        archive = os.path.join(self.tmpdir, "graph.tar.gz")
+        with tarfile.open(archive, "w:gz") as tf:
+            tf.add(GRAPH, "graph")
+        self.assertEqual(self.convert(archive, "tar", "--journal_dashes"), expected)
+
+        # Every worker would read the pages of the archive into memory
+        with self.assertRaises(ValueError):
+            self.convert(archive, "processes", "--processes", "2")
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "processes")))
+
+    def test_only_reads_embedded_assets(self):
+        archive = os.path.join(self.tmpdir, "graph.zip")
+        zip_graph(archive)
+        with zipfile.ZipFile(archive, "a") as zf:
+            zf.writestr("assets/unused.png", b"unused")
+
+        opened = []
+        original = ArchiveGraph.open
+
+        def recording_open(graph, fpath):
+            opened.append(os.path.relpath(fpath, archive).replace(os.sep, "/"))
+            return original(graph, fpath)
+
+        ArchiveGraph.open = recording_open
+        try:
+            tree = self.convert(archive, "vault")
+        finally:
+            ArchiveGraph.open = original
+        self.assertNotIn("assets/unused.png", opened)
+        self.assertNotIn(os.path.join("attachments", "unused.png"), tree)
+
+    def test_graph_root(self):
+        self.assertEqual(graph_root(["journals/a.md", "pages/b.md"]), "")
+        self.assertEqual(graph_root(["x/graph/journals/a.md", "x/graph/pages/b.md", "x/pages/c.md"]), "x/graph/")
+        self.assertIsNone(graph_root(["pages/b.md", "assets/c.png"]))
+
+    def test_not_a_graph(self):
+        archive = os.path.join(self.tmpdir, "notes.zip")
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("pages/b.md", "- b")
+        with self.assertRaises(ValueError):
+            open_graph(archive)
+
+        other = os.path.join(self.tmpdir, "notes.txt")
+        with open(other, "w") as f:
+            f.write("- b")
+        with self.assertRaises(ValueError):
+            open_graph(other)
+
+    def test_needs_a_directory_to_resume(self):
+        archive = os.path.join(self.tmpdir, "graph.zip")
+        zip_graph(archive)
+        with self.assertRaises(ValueError):
+            self.convert(archive, "vault", "--resume")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -98,6 +98,98 @@ class TestIntegration(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(self.output_dir, "algorithms", "assets", "image_1688968010207_0.png")))
         self.assertTrue(os.path.exists(os.path.join(self.output_dir, "algorithms", "assets", "image_1688968020649_0.png")))
 
+    def test_aliases(self):
+        result = self.exec([
+                "python",
+                "-m",
+                "logseqtoobsidian.__main__",
+                "--logseq",
+                self.logseq_dir,
+                "--output",
+                self.output_dir,
+            ])
+        self.assertEqual(result.returncode, 0)
+        with open(os.path.join(self.output_dir, "links to aliases.md")) as f:
+            self.assertEqual(
+                f.read(),
+                "- [other name](aliased page.md)\n- [yet another name](aliased page.md)\n- [aliased page](aliased page.md)\n",
+            )
+        with open(os.path.join(self.output_dir, "aliased page.md")) as f:
+            self.assertTrue(f.read().startswith('---\naliases:\n  - "other name"\n  - "yet another name"\n---\n'))
+
+    def test_update_output_skips_unchanged_assets(self):
+        args = [
+            "python",
+            "-m",
+            "logseqtoobsidian.__main__",
+            "--update_output",
+            "--logseq",
+            self.logseq_dir,
+            "--output",
+            self.output_dir,
+        ]
+        result = self.exec(args)
+        self.assertEqual(result.returncode, 0)
+        asset = os.path.join(self.output_dir, "algorithms", "attachments", "image_1688968010207_0.png")
+        inode = os.stat(asset).st_ino
+
+        result = self.exec(args)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(os.stat(asset).st_ino, inode)
+
+    def read_tree(self, base):
+        tree = {}
+        for dirpath, _, filenames in os.walk(base):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, base)] = f.read()
+        return tree
+
+    def test_merged_shards_match_unsharded_output(self):
+        result = self.exec([
+                "python",
+                "-m",
+                "logseqtoobsidian.__main__",
+                "--logseq",
+                self.logseq_dir,
+                "--output",
+                os.path.join(self.output_dir, "full"),
+            ])
+        self.assertEqual(result.returncode, 0)
+
+        shard_dirs = []
+        for i in range(3):
+            shard_dir = os.path.join(self.output_dir, f"shard{i}")
+            result = self.exec([
+                    "python",
+                    "-m",
+                    "logseqtoobsidian.__main__",
+                    "--shard",
+                    f"{i}/3",
+                    "--logseq",
+                    self.logseq_dir,
+                    "--output",
+                    shard_dir,
+                ])
+            self.assertEqual(result.returncode, 0)
+            shard_dirs.append(shard_dir)
+
+        result = self.exec([
+                "python",
+                "-m",
+                "logseqtoobsidian.__main__",
+                "merge",
+                "--output",
+                os.path.join(self.output_dir, "merged"),
+                *shard_dirs,
+            ])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(
+            self.read_tree(os.path.join(self.output_dir, "full")),
+            self.read_tree(os.path.join(self.output_dir, "merged")),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
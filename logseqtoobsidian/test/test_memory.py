@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from logseqtoobsidian.convert_notes import convert_page, convert_page_streaming, read_page, decode_page
+from logseqtoobsidian.memory import MemoryTracker
+
+
+class TestMemoryTracker(unittest.TestCase):
+
+    def test_disabled_tracker_does_nothing(self):
+        memory = MemoryTracker()
+        with memory.phase("scan"), memory.page("page.md"):
+            pass
+        self.assertEqual(memory.phases, {})
+        self.assertEqual(memory.pages, [])
+        self.assertTrue(memory.fits(10**15))
+
+    def test_phases_and_pages(self):
+        memory = MemoryTracker(report=True, largest_pages=2)
+        try:
+            with memory.phase("convert"):
+                for i, size in enumerate([10, 1000, 100]):
+                    with memory.page(f"{i}.md"):
+                        data = bytearray(size * 1024)
+                        del data
+                with memory.phase("assets"):
+                    pass
+        finally:
+            memory.stop()
+
+        self.assertEqual(set(memory.phases), {"convert", "assets"})
+        # The peak of a phase includes the pages and phases nested in it
+        self.assertGreaterEqual(memory.phases["convert"]["peak"], 1000 * 1024)
+        self.assertLess(memory.phases["assets"]["peak"], 1000 * 1024)
+        self.assertEqual([fpath for _, fpath in sorted(memory.pages, reverse=True)], ["1.md", "2.md"])
+
+    def test_fits(self):
+        memory = MemoryTracker(max_memory=100 * 1024 * 1024)
+        with patch("logseqtoobsidian.memory.current_rss", return_value=90 * 1024 * 1024):
+            self.assertTrue(memory.fits(10 * 1024 * 1024))
+            self.assertFalse(memory.fits(11 * 1024 * 1024))
+
+
+class TestConvertPageStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = False
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+        self.args.engine = "lines"
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_matches_convert_page(self):
+        fpath = os.path.join(self.tmpdir, "page.md")
+        for content in [
+            "title:: page\ntags:: a, b\n- TODO [[link]] <b>\n    - ((ref))\n- ```python\n  code\n  ```\n-",
+            "title:: only properties\n",
+            "- no properties\r\n",
+            "",
+        ]:
+            with open(fpath, "w", newline="") as f:
+                f.write(content)
+            lines = decode_page(read_page(fpath))
+            expected = "".join(convert_page(self.args, lines, fpath, {"link": fpath}, {fpath: fpath}))
+
+            convert_page_streaming(self.args, fpath, {"link": fpath}, {fpath: fpath})
+            with open(fpath, newline="") as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(os.listdir(self.tmpdir), ["page.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import random
+import unittest
+
+from logseqtoobsidian.convert_notes import convert_page, decode_page, read_page
+
+
+# Pieces of lines that the rules act on
+PIECES = [
+    "- ",
+    "-",
+    "\t",
+    "  ",
+    "    ",
+    "     ",
+    "collapsed:: true",
+    "  collapsed:: true",
+    "[[page]]",
+    "[[missing page]]",
+    "[[Aug 4th, 2022]]",
+    "#tag",
+    "#[[long tag]]",
+    "![image](image.png)",
+    "![image](image.png){:height 1, :width 2}",
+    "((ref))",
+    "{{embed ((ref))}}",
+    "<",
+    ">",
+    "TODO ",
+    "DONE ",
+    "- TODO",
+    "```python",
+    "- ```TODO",
+    "```",
+    "text",
+    " ",
+    "[[",
+    "![",
+    "\n",
+    "\n",
+    "\n",
+]
+
+
+def random_page(rng: random.Random) -> list[str]:
+    text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 40)))
+    return decode_page(text.encode("utf-8"))
+
+
+class TestMultilineEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = False
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+
+    def convert(self, engine, lines, names=None):
+        self.args.engine = engine
+        copied = []
+
+        class Output:
+            attachments = None
+
+            def copy_asset(self, src, dst):
+                copied.append((src, dst))
+                return True
+
+        newlines = convert_page(
+            self.args,
+            lines,
+            "/out/ns/page.md",
+            names if names is not None else {"page": "/out/page.md"},
+            {"/out/ns/page.md": "/graph/pages/ns___page.md"},
+            output=Output(),
+        )
+        # What's written, as the lines engine can yield a last line that became empty
+        return "".join(newlines), copied
+
+    def assert_same_as_lines(self, lines, names=None):
+        self.assertEqual(self.convert("multiline", lines, names), self.convert("lines", lines, names), lines)
+
+    def test_random_pages(self):
+        rng = random.Random(2)
+        for options in [{}, {"unindent_once": True}, {"convert_tags_to_links": True}]:
+            for name, value in options.items():
+                setattr(self.args, name, value)
+            for _ in range(2000):
+                self.assert_same_as_lines(random_page(rng))
+
+    def test_example_graph(self):
+        for folder in ["journals", "pages"]:
+            old_folder = os.path.join("example/logseq_vault", folder)
+            for fname in sorted(os.listdir(old_folder)):
+                if fname.endswith(".md"):
+                    self.assert_same_as_lines(decode_page(read_page(os.path.join(old_folder, fname))))
+
+    def test_code_block_start(self):
+        lines = ["- ```TODO\n", "\tcode < 1\n", "```\n", "- DONE"]
+        self.assertEqual(
+            self.convert("multiline", lines)[0],
+            "- TODO code block below:\n```TODO\n\tcode \\< 1\n```\n- [X]",
+        )
+        self.assert_same_as_lines(lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
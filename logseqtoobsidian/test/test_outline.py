@@ -0,0 +1,142 @@
+import random
+import unittest
+
+from logseqtoobsidian.convert_notes import (
+    convert_empty_line,
+    convert_indentation,
+    convert_line_contents,
+    convert_page,
+    convert_text_block,
+    decode_page,
+)
+from logseqtoobsidian.outline import CODE, TEXT, indentation_depth, iter_blocks, parse_outline
+from logseqtoobsidian.test.test_multiline import PIECES
+
+
+PAGE = [
+    "- parent\n",
+    "  collapsed:: true\n",
+    "  id:: 1234\n",
+    "  continuation with #tag\n",
+    "\t- child\n",
+    "\t- ```python\n",
+    "\t  if a <  b:\n",
+    "\t      return [[not a link]]\n",
+    "\t  ```\n",
+    "\t\t- under the code\n",
+    "- sibling\n",
+    "  ```\n",
+    "  plain fence\n",
+    "  ```\n",
+    "  after the fence\n",
+]
+
+
+class TestParseOutline(unittest.TestCase):
+
+    def test_indentation_depth(self):
+        self.assertEqual(indentation_depth(""), 0)
+        self.assertEqual(indentation_depth("\t\t"), 2)
+        self.assertEqual(indentation_depth("    "), 1)
+        self.assertEqual(indentation_depth("\t  "), 2)
+
+    def test_tree(self):
+        roots = parse_outline(PAGE)
+        self.assertEqual([block.lines[0] for block in roots], ["- parent\n", "- sibling\n"])
+
+        parent = roots[0]
+        self.assertEqual(parent.properties, [("collapsed", "true"), ("id", "1234")])
+        self.assertEqual(parent.lines[3], "  continuation with #tag\n")
+        self.assertEqual([child.kind for child in parent.children], [TEXT, CODE])
+
+        code = parent.children[1]
+        self.assertEqual(code.depth, 1)
+        self.assertEqual(len(code.lines), 4)
+        self.assertEqual(code.children[0].lines, ["\t\t- under the code\n"])
+
+        sibling = roots[1]
+        self.assertEqual([child.kind for child in sibling.children], [CODE, TEXT])
+        self.assertEqual(sibling.children[1].lines, ["  after the fence\n"])
+
+    def test_iter_blocks_is_in_page_order(self):
+        lines = [line for block in iter_blocks(parse_outline(PAGE)) for line in block.lines]
+        self.assertEqual(lines, PAGE)
+
+    def test_lines_outside_bullets(self):
+        roots = parse_outline(["some text\n", "more text\n", "- bullet\n"])
+        self.assertEqual(roots[0].lines, ["some text\n", "more text\n"])
+        self.assertEqual(roots[1].lines, ["- bullet\n"])
+
+
+class TestConvertOutline(unittest.TestCase):
+
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = False
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+        self.args.engine = "outline"
+
+    def convert(self, lines):
+        return convert_page(self.args, lines, "/out/page.md", {}, {"/out/page.md": "/graph/pages/page.md"})
+
+    def test_convert(self):
+        self.assertEqual(
+            self.convert(PAGE),
+            [
+                "- parent\n",
+                "\tid:: 1234\n",
+                "\tcontinuation with #tag\n",
+                "\t- child\n",
+                "\t- python code block below:\n",
+                "\t```python\n",
+                "\t\tif a <  b:\n",
+                "\t\t    return [[not a link]]\n",
+                "\t\t```\n",
+                "\t\t- under the code\n",
+                "- sibling\n",
+                "\t```\n",
+                "\tplain fence\n",
+                "\t```\n",
+                "\tafter the fence\n",
+            ],
+        )
+
+    def test_text_blocks_match_the_lines_engine(self):
+        page = ["title:: page\n", "- TODO a <b> [[link]]\n", "\t- ((ref)) ![img](img.png){:height 1, :width 2}\n"]
+        outline = self.convert(page)
+        self.args.engine = "lines"
+        self.assertEqual(outline, self.convert(page))
+
+    def test_text_blocks_are_converted_at_once_like_each_line(self):
+        rng = random.Random(3)
+        pieces = [piece for piece in PIECES if "```" not in piece]
+
+        def copy_asset(src, dst):
+            return False
+
+        for _ in range(500):
+            lines = decode_page("".join(rng.choice(pieces) for _ in range(rng.randint(0, 40))).encode("utf-8"))
+            for block in iter_blocks(parse_outline(lines)):
+                if block.kind != TEXT:
+                    continue
+                expected = [
+                    convert_line_contents(
+                        self.args,
+                        convert_empty_line(convert_indentation(line)),
+                        "/out/page.md",
+                        {},
+                        "/graph/page.md",
+                        copy_asset,
+                    )
+                    for idx, line in enumerate(block.lines)
+                    if not (1 <= idx <= len(block.properties) and block.properties[idx - 1] == ("collapsed", "true"))
+                ]
+                converted = convert_text_block(self.args, block, "/out/page.md", {}, "/graph/page.md", copy_asset)
+                self.assertEqual("".join(converted), "".join(expected), block.lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
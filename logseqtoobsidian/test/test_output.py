@@ -0,0 +1,264 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import unittest
+import zipfile
+
+from logseqtoobsidian.__main__ import main
+from logseqtoobsidian.output import ArchiveOutput, DirectoryOutput, archive_format, zstandard, zstd
+from logseqtoobsidian.time_limit import PageTimeout, page_time_limit
+
+
+class SlowReader(io.RawIOBase):
+    """Reads size bytes, sleeping before each read and failing once fail_at bytes are left if given"""
+
+    def __init__(self, size: int, delay: float, fail_at: int = None):
+        self.left = size
+        self.delay = delay
+        self.fail_at = fail_at
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.fail_at is not None and self.left <= self.fail_at:
+            raise OSError("read failed")
+        time.sleep(self.delay)
+        size = min(len(buffer), self.left)
+        buffer[:size] = b"x" * size
+        self.left -= size
+        return size
+
+
+class TestArchiveOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.asset = os.path.join(self.tmpdir, "image.png")
+        with open(self.asset, "wb") as f:
+            f.write(b"image content")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_archive_format(self):
+        self.assertEqual(archive_format("vault.zip"), (".zip", "zip"))
+        self.assertEqual(archive_format("vault.TAR.GZ"), (".tar.gz", "gz"))
+        self.assertEqual(archive_format("vault.tar.zst"), (".tar.zst", "zst"))
+        self.assertEqual(archive_format("vault.gz"), (None, None))
+
+    def read_zip(self, fpath):
+        with zipfile.ZipFile(fpath) as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+
+    def test_entries_are_under_the_archive_name_and_deduplicated(self):
+        fpath = os.path.join(self.tmpdir, "vault.zip")
+        with ArchiveOutput(fpath) as output:
+            base = output.base
+            output.write_page(os.path.join(base, "page.md"), ["- line\n", "- other\n"])
+            with output.open_page(os.path.join(base, "journals", "day.md")) as f:
+                f.write("- streamed\n")
+            self.assertTrue(output.copy_asset(self.asset, os.path.join(base, "attachments", "image.png")))
+            self.assertFalse(output.copy_asset(self.asset, os.path.join(base, "attachments", "image.png")))
+            # The archive only appears once it's complete
+            self.assertFalse(os.path.exists(fpath))
+
+        self.assertEqual(
+            self.read_zip(fpath),
+            {
+                "vault/page.md": b"- line\n- other\n",
+                "vault/journals/day.md": b"- streamed\n",
+                "vault/attachments/image.png": b"image content",
+            },
+        )
+
+    def test_incomplete_archive_is_removed(self):
+        fpath = os.path.join(self.tmpdir, "vault.tar")
+        with self.assertRaises(RuntimeError):
+            with ArchiveOutput(fpath) as output:
+                output.copy_file(self.asset, os.path.join(output.base, "image.png"))
+                raise RuntimeError()
+        self.assertEqual(os.listdir(self.tmpdir), ["image.png"])
+
+    def test_time_limit_waits_for_entries(self):
+        for name in ["vault.tar", "vault.zip"]:
+            fpath = os.path.join(self.tmpdir, name)
+            with ArchiveOutput(fpath) as output:
+                with self.assertRaises(PageTimeout):
+                    with page_time_limit(0.05):
+                        output._add("vault/big.png", SlowReader(256 * 1024, 0.03), 256 * 1024, 0)
+                        time.sleep(1)
+
+            if name.endswith(".zip"):
+                self.assertEqual(self.read_zip(fpath), {"vault/big.png": b"x" * 256 * 1024})
+            else:
+                with tarfile.open(fpath) as tf:
+                    self.assertEqual(tf.extractfile("vault/big.png").read(), b"x" * 256 * 1024)
+
+    def test_failed_entry_discards_the_archive(self):
+        for name in ["vault.tar", "vault.zip"]:
+            fpath = os.path.join(self.tmpdir, name)
+            with self.assertRaises(OSError):
+                with ArchiveOutput(fpath) as output:
+                    try:
+                        output._add("vault/big.png", SlowReader(256 * 1024, 0, fail_at=128 * 1024), 256 * 1024, 0)
+                    except OSError:
+                        # Like a missing asset, which is only reported
+                        pass
+                    with self.assertRaises(OSError):
+                        output.copy_file(self.asset, os.path.join(output.base, "image.png"))
+            self.assertEqual(os.listdir(self.tmpdir), ["image.png"])
+
+    def test_existing_archive_needs_overwrite(self):
+        fpath = os.path.join(self.tmpdir, "vault.tar.gz")
+        ArchiveOutput(fpath).close()
+        with self.assertRaises(ValueError):
+            ArchiveOutput(fpath)
+        ArchiveOutput(fpath, overwrite=True).close()
+
+
+class TestConvertToArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_tree(self, base):
+        tree = {}
+        for dirpath, _, filenames in os.walk(base):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, base).replace(os.sep, "/")] = f.read()
+        return tree
+
+    def read_tar(self, fpath):
+        tree = {}
+        with tarfile.open(fpath) as tf:
+            for member in tf:
+                tree[member.name.split("/", 1)[1]] = tf.extractfile(member).read()
+        return tree
+
+    def convert(self, *args):
+        main(["--logseq", "example/logseq_vault", *args])
+
+    def test_matches_directory_output(self):
+        directory = os.path.join(self.tmpdir, "vault")
+        self.convert("--output", directory)
+        expected = self.read_tree(directory)
+
+        runs = [("vault.tar.gz", []), ("pipelined.tar", ["--pipeline"]), ("streamed.tar", ["--max_memory", "1"])]
+        for name, extra in runs:
+            fpath = os.path.join(self.tmpdir, name)
+            self.convert("--output_archive", fpath, *extra)
+            self.assertEqual(self.read_tar(fpath), expected)
+
+    @unittest.skipIf(zstd is None and zstandard is None, "needs Python 3.14 or the zstandard package")
+    def test_zstandard(self):
+        fpath = os.path.join(self.tmpdir, "vault.tar.zst")
+        self.convert("--output_archive", fpath)
+        self.assertTrue(os.path.getsize(fpath) > 0)
+
+    def test_needs_an_output_directory(self):
+        with self.assertRaises(ValueError):
+            self.convert("--output_archive", os.path.join(self.tmpdir, "vault.zip"), "--shard", "0/2")
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_invalid_graph_leaves_no_archive(self):
+        graph = os.path.join(self.tmpdir, "graph")
+        os.makedirs(os.path.join(graph, "pages"))
+        with self.assertRaises(ValueError):
+            main(["--logseq", graph, "--output_archive", os.path.join(self.tmpdir, "vault.zip")])
+        self.assertEqual(os.listdir(self.tmpdir), ["graph"])
+
+
+
+class TestWriteIfChanged(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.graph = os.path.join(self.tmpdir, "graph")
+        shutil.copytree("example/logseq_vault", self.graph)
+        self.vault = os.path.join(self.tmpdir, "vault")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def convert(self, *args):
+        main(["--logseq", self.graph, "--output", self.vault, *args])
+
+    def age_output(self) -> dict:
+        """Moves the modification time of every file of the output back, so that rewriting one shows, and returns
+        the files with their contents"""
+        tree = {}
+        for dirpath, _, filenames in os.walk(self.vault):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                os.utime(fpath, ns=(10**18, 10**18))
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, self.vault)] = f.read()
+        return tree
+
+    def rewritten(self) -> set:
+        return {
+            os.path.relpath(os.path.join(dirpath, fname), self.vault)
+            for dirpath, _, filenames in os.walk(self.vault)
+            for fname in filenames
+            if os.stat(os.path.join(dirpath, fname)).st_mtime_ns != 10**18
+        }
+
+    def test_unchanged_files_are_left_untouched(self):
+        self.convert()
+        expected = self.age_output()
+
+        for extra in [[], ["--pipeline"], ["--max_memory", "1"]]:
+            self.convert("--write_if_changed", *extra)
+            self.assertEqual(self.rewritten(), set(), extra)
+            self.assertEqual(self.age_output(), expected)
+
+    def test_changed_page_is_written(self):
+        self.convert()
+        self.age_output()
+        with open(os.path.join(self.graph, "pages", "leetcode.md"), "a") as f:
+            f.write("\n- [[algorithms]]\n")
+
+        self.convert("--write_if_changed")
+        self.assertEqual(self.rewritten(), {"leetcode.md"})
+        with open(os.path.join(self.vault, "leetcode.md")) as f:
+            self.assertTrue(f.read().endswith("- [algorithms](algorithms.md)\n"))
+
+    def test_writes_are_counted(self):
+        os.makedirs(self.vault)
+        fpath = os.path.join(self.vault, "page.md")
+        output = DirectoryOutput(write_if_changed=True)
+        output.write_page(fpath, ["- line\n"])
+        output.write_page(fpath, ["- line\n"])
+        with output.open_page(fpath) as f:
+            f.write("- line\n")
+        output.write_page(fpath, ["- other\n"])
+        self.assertEqual((output.written, output.unchanged), (2, 2))
+
+
+class TestDryRun(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.vault = os.path.join(self.tmpdir, "vault")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_nothing_is_written(self):
+        for extra in [[], ["--pipeline"], ["--max_memory", "1"], ["--processes", "2"], ["--write_if_changed"]]:
+            main(["--logseq", "example/logseq_vault", "--output", self.vault, "--dryrun", "--overwrite_output", *extra])
+            written = [fname for _, _, filenames in os.walk(self.vault) for fname in filenames]
+            self.assertEqual(written, [], extra)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from logseqtoobsidian.__main__ import main
+from logseqtoobsidian.page_index import MappedPageIndex, load_page_index, write_mapped_page_index
+
+
+class TestFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.vault = os.path.join(self.tmpdir, "vault")
+        self.index = os.path.join(self.tmpdir, "index.json")
+        main(
+            ["--logseq", "example/logseq_vault", "--output", self.vault, "--journal_dashes", "--save_index", self.index]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def filter(self, page: str, text: bytes) -> bytes:
+        result = subprocess.run(
+            [sys.executable, "-m", "logseqtoobsidian", "filter", "--index", self.index, "--page", page],
+            input=text,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        return result.stdout
+
+    def test_index(self):
+        index, old_to_new_paths, names = load_page_index(self.index)
+        self.assertTrue(index["options"]["journal_dashes"])
+        self.assertEqual(
+            old_to_new_paths[os.path.join(os.path.abspath("example/logseq_vault"), "journals", "2023_12_03.md")],
+            os.path.join(os.path.abspath(self.vault), "journals", "2023-12-03.md"),
+        )
+        self.assertEqual(names["other name"], os.path.join(os.path.abspath(self.vault), "aliased page.md"))
+
+    def test_matches_full_run(self):
+        for page, new_relpath in [
+            ("pages/links to aliases.md", "links to aliases.md"),
+            ("algorithms/dynamic programming", os.path.join("algorithms", "dynamic programming.md")),
+            ("journals/2023_12_03.md", os.path.join("journals", "2023-12-03.md")),
+        ]:
+            with open(os.path.join(self.vault, new_relpath), "rb") as f:
+                expected = f.read()
+            old_fpath = {
+                "algorithms/dynamic programming": "pages/algorithms___dynamic programming.md",
+            }.get(page, page)
+            with open(os.path.join("example/logseq_vault", old_fpath), "rb") as f:
+                self.assertEqual(self.filter(page, f.read()), expected)
+
+    def test_new_page(self):
+        self.assertEqual(
+            self.filter("pages/algorithms___new.md", b"- [[other name]] [[missing]]\n"),
+            b"- [other name](../aliased page.md) #missing\n",
+        )
+
+
+class TestMappedPageIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.tmpdir, "pages.idx")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_as_the_maps(self):
+        rng = random.Random(0)
+        # Non-ASCII names, and an undecodable file name as os.listdir returns it
+        names = {"".join(rng.choice("ab/é_ \udcff") for _ in range(rng.randint(0, 8))): "" for _ in range(2000)}
+        names = {name: f"/vault/{idx}.md" for idx, name in enumerate(names)}
+        new_to_old_paths = {f"/vault/{idx}.md": f"/graph/pages/{idx}.md" for idx in range(len(names))}
+        write_mapped_page_index(self.fpath, names, new_to_old_paths)
+
+        with MappedPageIndex(self.fpath) as index:
+            self.assertEqual(dict(index.names), names)
+            self.assertEqual(dict(index.new_to_old), new_to_old_paths)
+            self.assertEqual(len(index.names), len(names))
+            for name, new_path in names.items():
+                self.assertIn(name, index.names)
+                self.assertEqual(index.names[name], new_path)
+            for missing in ["missing", "", "é" * 9, None]:
+                self.assertNotIn(missing, index.new_to_old)
+            with self.assertRaises(KeyError):
+                index.new_to_old["/vault/missing.md"]
+
+    def test_empty(self):
+        write_mapped_page_index(self.fpath, {}, {})
+        with MappedPageIndex(self.fpath) as index:
+            self.assertEqual(len(index.names), 0)
+            self.assertNotIn("a", index.names)
+
+    def test_not_an_index(self):
+        with open(self.fpath, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            MappedPageIndex(self.fpath)
+
+
+class TestProcesses(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def convert(self, name, *args):
+        vault = os.path.join(self.tmpdir, name)
+        main(["--logseq", "example/logseq_vault", "--output", vault, *args])
+        tree = {}
+        for dirpath, _, filenames in os.walk(vault):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, vault)] = f.read()
+        return tree
+
+    def test_matches_conversion_in_this_process(self):
+        for idx, options in enumerate([[], ["--journal_dashes", "--max_memory", "1"]]):
+            expected = self.convert(f"vault{idx}", *options)
+            self.assertEqual(self.convert(f"processes{idx}", "--processes", "3", *options), expected)
+
+    def test_needs_an_attachment_per_page(self):
+        with self.assertRaises(ValueError):
+            self.convert("shared", "--processes", "2", "--attachment_layout", "shared")
+
+
+if __name__ == "__main__":
+    unittest.main()
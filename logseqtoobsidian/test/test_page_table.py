@@ -0,0 +1,132 @@
+import os
+import random
+import tracemalloc
+import unittest
+
+from logseqtoobsidian.page_table import PageTable, split_path
+
+
+class TestPageTable(unittest.TestCase):
+
+    def setUp(self):
+        self.pages = PageTable()
+        self.old = os.path.join("graph", "pages", "a___b.md")
+        self.new = os.path.join("out", "a", "b.md")
+
+    def test_split_path_round_trips(self):
+        for path in ["a/b/c.md", "a//b", "c.md", "/c.md", "a/b/"]:
+            dirname, basename = split_path(path)
+            self.assertEqual(dirname + basename, path)
+
+    def test_views_stay_in_sync(self):
+        self.pages.old_to_new[self.old] = self.new
+        self.pages.new_to_old[self.new] = self.old
+        self.pages.new_paths.add(self.new)
+        self.pages.names["a/b"] = self.new
+        self.pages.names["a/b.md"] = self.new
+
+        self.assertEqual(len(self.pages), 1)
+        self.assertEqual(self.pages.old_to_new[self.old], self.new)
+        self.assertEqual(self.pages.new_to_old[self.new], self.old)
+        self.assertEqual(list(self.pages.new_paths), [self.new])
+        self.assertEqual(dict(self.pages.names), {"a/b": self.new, "a/b.md": self.new})
+        self.assertEqual(dict(self.pages.new_to_old.items()), {self.new: self.old})
+
+    def test_missing_keys(self):
+        self.assertNotIn(self.new, self.pages.new_paths)
+        self.assertNotIn(self.old, self.pages.old_to_new)
+        self.assertNotIn("a/b", self.pages.names)
+        with self.assertRaises(KeyError):
+            self.pages.new_to_old[self.new]
+        with self.assertRaises(KeyError):
+            self.pages.names["a/b"]
+
+    def test_reassigning_a_page(self):
+        other_new = os.path.join("out", "c.md")
+        self.pages.old_to_new[self.old] = self.new
+        self.pages.old_to_new[self.old] = other_new
+
+        self.assertEqual(self.pages.old_to_new[self.old], other_new)
+        self.assertEqual(self.pages.new_to_old[other_new], self.old)
+        self.assertNotIn(self.new, self.pages.new_to_old)
+
+    def test_directories_are_stored_once(self):
+        for i in range(10):
+            self.pages.old_to_new[os.path.join("graph", "pages", f"{i}.md")] = os.path.join("out", f"{i}.md")
+        self.assertEqual(len(self.pages._dirs), 2)
+        self.assertEqual(len(self.pages.new_paths), 10)
+
+    def test_discard(self):
+        self.pages.old_to_new[self.old] = self.new
+        self.pages.new_paths.discard(self.new)
+        self.assertNotIn(self.new, self.pages.new_paths)
+        self.assertNotIn(self.old, self.pages.old_to_new)
+
+    def test_name_of_a_discarded_page(self):
+        self.pages.old_to_new[self.old] = self.new
+        self.pages.names["a/b"] = self.new
+        self.pages.new_paths.discard(self.new)
+        self.assertNotIn("a/b", self.pages.names)
+        with self.assertRaises(KeyError):
+            self.pages.names["a/b"]
+
+    def test_matches_dicts(self):
+        rng = random.Random(0)
+        old_to_new, names = {}, {}
+        for _ in range(3000):
+            idx = rng.randrange(200)
+            old = os.path.join("graph", "pages", f"{idx}.md")
+            new = os.path.join("out", f"{idx % 7}", f"é {idx}.md")
+            op = rng.random()
+            if op < 0.5:
+                if new in self.pages.new_to_old and self.pages.new_to_old[new] != old:
+                    # A new path belongs to a single page, like the converter never gives one to two pages
+                    continue
+                old_to_new[old] = new
+                self.pages.old_to_new[old] = new
+                names[f"p{idx}"] = new
+                self.pages.names[f"p{idx}"] = new
+            elif op < 0.75 and old in old_to_new:
+                del old_to_new[old]
+                del self.pages.old_to_new[old]
+                self.pages.new_paths.discard(new)
+            elif f"p{idx}" in names:
+                del names[f"p{idx}"]
+                del self.pages.names[f"p{idx}"]
+
+        self.assertEqual(dict(self.pages.old_to_new), old_to_new)
+        self.assertEqual(dict(self.pages.new_to_old), {new: old for old, new in old_to_new.items()})
+        self.assertEqual(set(self.pages.new_paths), set(old_to_new.values()))
+        live = {name: new for name, new in names.items() if new in old_to_new.values()}
+        self.assertEqual({name: self.pages.names[name] for name in self.pages.names if name in self.pages.names}, live)
+        self.assertEqual(len(self.pages.new_to_old), len(old_to_new))
+
+    def test_uses_less_memory_than_dicts(self):
+        def pages():
+            for idx in range(4000):
+                name = f"project {idx % 50}___note number {idx}"
+                old = os.path.join("home", "graph", "pages", f"{name}.md")
+                new = os.path.join("home", "vault", f"project {idx % 50}", f"note number {idx}.md")
+                yield old, new, [f"project {idx % 50}/note number {idx}", f"{name}.md"]
+
+        def measure(old_to_new, new_to_old, new_paths, names):
+            tracemalloc.start()
+            try:
+                for old, new, page_names in pages():
+                    old_to_new[old] = new
+                    new_to_old[new] = old
+                    new_paths.add(new)
+                    for name in page_names:
+                        names[name] = new
+                return tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+
+        dicts = measure({}, {}, set(), {})
+        table = measure(self.pages.old_to_new, self.pages.new_to_old, self.pages.new_paths, self.pages.names)
+        self.assertEqual(len(self.pages.new_to_old), 4000)
+        self.assertLess(table, dicts * 0.7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from logseqtoobsidian.convert_notes import (
+    convert_contents,
+    remove_block_links_embeds,
+    update_image_dimensions,
+    update_links_and_tags,
+)
+from logseqtoobsidian.matching import link_targets, sub_asset_embeds, sub_delimited, sub_image_dimensions
+from logseqtoobsidian.output import DirectoryOutput
+
+
+# Long enough for a quadratic matcher to take seconds, while a linear one takes milliseconds
+LINE_LENGTH = 200_000
+# Generous, so that slow CI machines don't fail the tests
+SECONDS_PER_LINE = 1.0
+
+# Lines full of openers without closers, like pasted minified JSON
+ADVERSARIAL_PIECES = [
+    "![",
+    "[[",
+    "#[[",
+    "((",
+    "{{embed ",
+    "![a](",
+    "![a](b(",
+    "![a](b){:height 1, ",
+    '{"a":[[1,2],[3,',
+    "](",
+    "#",
+]
+
+
+def adversarial_lines(rng: random.Random):
+    for piece in ADVERSARIAL_PIECES:
+        yield piece * (LINE_LENGTH // len(piece))
+    for _ in range(5):
+        line = []
+        length = 0
+        while length < LINE_LENGTH:
+            piece = rng.choice(ADVERSARIAL_PIECES + ["a", " ", "]", ")"])
+            line.append(piece)
+            length += len(piece)
+        yield "".join(line)
+
+
+class TestLinearTime(unittest.TestCase):
+
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = False
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+        self.args.engine = "lines"
+        self.args.page_timeout = None
+
+    def assert_fast(self, convert, line):
+        start = time.perf_counter()
+        convert(line)
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, SECONDS_PER_LINE, f"took {elapsed:.2f}s on a line starting with {line[:40]!r}")
+
+    def test_adversarial_lines(self):
+        matchers = [
+            lambda line: update_links_and_tags(self.args, line, {}, "/out/page.md"),
+            # The matcher of update_assets, without copying any assets
+            lambda line: sub_asset_embeds(line, lambda name, target: ""),
+            update_image_dimensions,
+            remove_block_links_embeds,
+            # The matcher of the verify command, on whole pages
+            link_targets,
+        ]
+        for line in adversarial_lines(random.Random(0)):
+            for convert in matchers:
+                self.assert_fast(convert, line)
+
+
+class TestSameAsRegex(unittest.TestCase):
+    """The linear matchers against the regexes they replace, on random short lines"""
+
+    ALPHABET = ["[", "]", "#", "(", ")", "!", "{", "}", "a", " ", "\n", "{{embed ", "{:height 1, :width 2}"]
+
+    def random_lines(self, count: int = 5000):
+        rng = random.Random(1)
+        for _ in range(count):
+            yield "".join(rng.choice(self.ALPHABET) for _ in range(rng.randint(0, 20)))
+
+    def test_delimited(self):
+        def repl(s):
+            return "<" + s + ">"
+
+        for opener, closer in [("[[", "]]"), ("#[[", "]]"), ("((", "))"), ("{{embed ", "}}")]:
+            pattern = re.compile(re.escape(opener) + ".*?" + re.escape(closer))
+            for line in self.random_lines():
+                self.assertEqual(
+                    sub_delimited(line, opener, closer, repl), pattern.sub(lambda m: repl(m[0]), line), repr(line)
+                )
+
+    def test_image_dimensions(self):
+        def repl(name, target, width):
+            return "<" + name + "|" + target + "|" + width + ">"
+
+        pattern = re.compile(r"!\[(.*?)]\((.*?)\){:height \d*, :width (\d*)}")
+        for line in self.random_lines():
+            self.assertEqual(
+                sub_image_dimensions(line, repl), pattern.sub(lambda m: repl(m[1], m[2], m[3]), line), repr(line)
+            )
+
+    def test_asset_embeds(self):
+        def repl(name, target):
+            return "<" + name + "|" + target + ">"
+
+        pattern = re.compile(r"!\[(.*?)]\((.*?)\)")
+        for line in self.random_lines():
+            if "(" in line.replace("](", ""):
+                # Targets with parentheses are where the two differ
+                continue
+            self.assertEqual(sub_asset_embeds(line, repl), pattern.sub(lambda m: repl(m[1], m[2]), line), repr(line))
+
+    def test_asset_targets_with_parentheses(self):
+        def repl(name, target):
+            return "<" + name + "|" + target + ">"
+
+        self.assertEqual(sub_asset_embeds("![a](image_(1).png) after", repl), "<a|image_(1).png> after")
+        self.assertEqual(sub_asset_embeds("![a](b((c)d)e) ![f](g)", repl), "<a|b((c)d)e> <f|g>")
+        # Unbalanced, so the first ")" ends the target like before
+        self.assertEqual(sub_asset_embeds("![a](b(c) d", repl), "<a|b(c> d")
+
+    def test_link_targets(self):
+        pattern = re.compile(r"\[[^\]\n]*]\((.*?)\)")
+        for line in self.random_lines():
+            if "(" in line.replace("](", ""):
+                continue
+            self.assertEqual(link_targets(line), pattern.findall(line), repr(line))
+
+        self.assertEqual(link_targets("[a](image_(1).png) ![b](c)\n[d](e\n)"), ["image_(1).png", "c"])
+
+
+class TestPageTimeout(unittest.TestCase):
+
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = False
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+        self.args.engine = "lines"
+        self.args.page_timeout = 0.05
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_runaway_page_is_skipped(self):
+        slow = os.path.join(self.tmpdir, "slow.md")
+        fast = os.path.join(self.tmpdir, "fast.md")
+        with open(slow, "w") as f:
+            f.write("- [[link]]\n" * 10)
+        with open(fast, "w") as f:
+            f.write("- [[link]]\n")
+        paths = {slow: slow, fast: fast}
+
+        def slow_update_links_and_tags(args, line, name_to_path, curr_path):
+            time.sleep(0.02)
+            return line.replace("[[link]]", "#link")
+
+        with patch(
+            "logseqtoobsidian.convert_notes.update_links_and_tags", slow_update_links_and_tags
+        ), self.assertLogs(level="WARNING") as logs:
+            convert_contents(self.args, set(paths), {}, paths)
+
+        self.assertIn(slow, logs.output[0])
+        with open(slow) as f:
+            self.assertEqual(f.read(), "- [[link]]\n" * 10)
+        with open(fast) as f:
+            self.assertEqual(f.read(), "- #link\n")
+
+    def test_copying_assets_is_not_timed(self):
+        with open(os.path.join(self.tmpdir, "image.png"), "wb") as f:
+            f.write(b"image content")
+        page = os.path.join(self.tmpdir, "page.md")
+        with open(page, "w") as f:
+            f.write("- ![image](image.png)\n- ![other](other.png)\n")
+        new_page = os.path.join(self.tmpdir, "vault", "page.md")
+        os.makedirs(os.path.dirname(new_page))
+
+        # Copying an asset from slow storage, which takes longer than the time limit of the page
+        output = DirectoryOutput()
+        copy_asset = output.copy_asset
+
+        def slow_copy_asset(src, dst):
+            time.sleep(0.1)
+            return copy_asset(src, dst)
+
+        output.copy_asset = slow_copy_asset
+        with self.assertLogs(level="WARNING") as logs:
+            convert_contents(self.args, {new_page}, {}, {new_page: page}, output=output)
+
+        # Only the missing asset is reported
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("other.png", logs.output[0])
+        with open(new_page) as f:
+            self.assertEqual(f.read(), "- [image](attachments/image.png)\n- [other](other.png)\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from logseqtoobsidian.__main__ import build_parser
+from logseqtoobsidian.convert_notes import convert_contents
+from logseqtoobsidian.pipeline import convert_contents_pipelined
+
+
+PAGES = {
+    "a.md": "title:: A\n- links to [[b]] and [[c]]\n- TODO something <later>\n",
+    "b.md": "- DONE\n    - indented #tag\n- ((block-ref)) {{embed ((x))}}\n",
+    "c.md": "- plain\n-\n",
+}
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.args = type("", (), {})()
+        self.args.convert_tags_to_links = False
+        self.args.unindent_once = False
+        self.args.tag_prop_to_taglist = False
+        self.args.assets_dir = "attachments"
+        self.args.copy_hash = False
+        self.args.engine = "lines"
+        self.args.page_timeout = None
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_vault(self, name):
+        base = os.path.join(self.tmpdir, name)
+        os.makedirs(base)
+        new_to_old_paths = {}
+        names = {}
+        for fname, content in PAGES.items():
+            fpath = os.path.join(base, fname)
+            with open(fpath, "w") as f:
+                f.write(content)
+            new_to_old_paths[fpath] = fpath
+            names[os.path.splitext(fname)[0]] = fpath
+        return base, new_to_old_paths, names
+
+    def read_vault(self, base):
+        out = {}
+        for fname in PAGES:
+            with open(os.path.join(base, fname)) as f:
+                out[fname] = f.read()
+        return out
+
+    def test_matches_sequential_conversion(self):
+        sequential, new_to_old_paths, names = self.make_vault("sequential")
+        convert_contents(self.args, set(new_to_old_paths), names, new_to_old_paths)
+
+        for offload_convert in [False, True]:
+            pipelined, new_to_old_paths, names = self.make_vault(f"pipelined_{offload_convert}")
+            convert_contents_pipelined(
+                self.args, set(new_to_old_paths), names, new_to_old_paths, depth=1, offload_convert=offload_convert
+            )
+            self.assertEqual(self.read_vault(sequential), self.read_vault(pipelined))
+
+    def test_errors_are_raised(self):
+        base, new_to_old_paths, names = self.make_vault("missing")
+        os.remove(os.path.join(base, "b.md"))
+        with self.assertRaises(FileNotFoundError):
+            convert_contents_pipelined(self.args, set(new_to_old_paths), names, new_to_old_paths, depth=1)
+
+    def test_depth_must_be_positive(self):
+        # An asyncio.Queue of size 0 is unbounded, which would read the whole graph ahead
+        for option in ["--pipeline_depth", "--pipeline_io_threads"]:
+            for value in ["0", "-1", "x"]:
+                with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                    build_parser().parse_args(["--logseq", "graph", "--output", "out", "--pipeline", option, value])
+        args = build_parser().parse_args(["--logseq", "graph", "--output", "out", "--pipeline_depth", "1"])
+        self.assertEqual(args.pipeline_depth, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from logseqtoobsidian.__main__ import build_parser, main
+from logseqtoobsidian.server import ConversionServer, GraphIndex, request
+
+
+class TestServe(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.graph = os.path.join(self.tmpdir, "graph")
+        shutil.copytree("example/logseq_vault", self.graph)
+        self.vault = os.path.join(self.tmpdir, "vault")
+        self.socket = os.path.join(self.tmpdir, "serve.sock")
+
+        args = build_parser().parse_args(["--logseq", self.graph, "--output", self.vault])
+        self.server = ConversionServer(args)
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve, args=(self.socket, 0, ready))
+        self.thread.start()
+        self.assertTrue(ready.wait(10))
+
+    def tearDown(self):
+        request(self.socket, {"op": "shutdown"})
+        self.thread.join(10)
+        self.assertFalse(os.path.exists(self.socket))
+        shutil.rmtree(self.tmpdir)
+
+    def write_page(self, relpath, text):
+        with open(os.path.join(self.graph, relpath), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_converts_like_a_full_run(self):
+        full = os.path.join(self.tmpdir, "full")
+        main(["--logseq", self.graph, "--output", full])
+
+        for page in ["pages/links to aliases.md", "journals/2023_12_03.md", "algorithms/dynamic programming"]:
+            response = request(self.socket, {"op": "convert", "page": page})
+            self.assertTrue(response["ok"], response)
+            relpath = os.path.relpath(response["output"], os.path.abspath(self.vault))
+            with open(response["output"], encoding="utf-8") as f:
+                converted = f.read()
+            with open(os.path.join(full, relpath), encoding="utf-8") as f:
+                self.assertEqual(converted, f.read())
+
+    def test_text_without_writing(self):
+        response = request(
+            self.socket, {"op": "convert", "page": "pages/links to aliases.md", "text": True, "write": False}
+        )
+        self.assertIn("[other name](aliased page.md)", response["text"])
+        self.assertFalse(os.path.exists(response["output"]))
+
+    def test_reindex(self):
+        self.write_page("pages/new page.md", "alias:: fresh\n\n- new\n")
+        self.write_page("pages/linking page.md", "- [[fresh]] [[new page]]\n")
+        response = request(self.socket, {"op": "reindex", "paths": ["pages/new page.md"]})
+        self.assertEqual(response["changed"], [os.path.join(os.path.abspath(self.graph), "pages", "new page.md")])
+
+        # The linking page isn't indexed yet, but converting it picks it up
+        text = request(self.socket, {"op": "convert", "page": "pages/linking page.md", "text": True})["text"]
+        self.assertEqual(text, "- [fresh](new page.md) [new page](new page.md)\n")
+
+        # Removing the aliased page takes its names and aliases out of the index
+        os.remove(os.path.join(self.graph, "pages", "aliased page.md"))
+        self.assertEqual(len(self.server.index.poll()), 1)
+        text = request(self.socket, {"op": "convert", "page": "pages/links to aliases.md", "text": True})["text"]
+        self.assertIn("#other_name", text)
+        self.assertNotIn("aliased page.md", text)
+
+    def assert_matches_full_index(self, index):
+        full = GraphIndex(index.args)
+        full.build()
+        self.assertEqual(dict(index.pages.names), dict(full.pages.names))
+        self.assertEqual(dict(index.pages.old_to_new), dict(full.pages.old_to_new))
+
+    def test_removing_a_page_brings_back_the_alias_it_shadowed(self):
+        index = self.server.index
+        self.write_page("pages/other name.md", "- shadows an alias of aliased page\n")
+        index.poll()
+        self.assertEqual(index.pages.names["other name"], os.path.join(index.new_base, "other name.md"))
+        self.assert_matches_full_index(index)
+
+        os.remove(os.path.join(self.graph, "pages", "other name.md"))
+        index.poll()
+        self.assertEqual(index.pages.names["other name"], os.path.join(index.new_base, "aliased page.md"))
+        self.assert_matches_full_index(index)
+
+    def test_removing_one_of_two_pages_with_the_same_name(self):
+        index = self.server.index
+        self.write_page("pages/a.b.md", "- dots\n")
+        self.write_page("pages/a___b.md", "- underscores\n")
+        index.poll()
+        new_fpath = os.path.join(index.new_base, "a", "b.md")
+        # Like a full run, the first page going to a/b.md is converted and the other one left out
+        self.assertEqual(index.pages.new_to_old[new_fpath], os.path.join(index.old_base, "pages", "a.b.md"))
+        self.assert_matches_full_index(index)
+
+        os.remove(os.path.join(self.graph, "pages", "a.b.md"))
+        index.poll()
+        self.assertEqual(index.pages.names["a/b"], new_fpath)
+        self.assertEqual(index.pages.new_to_old[new_fpath], os.path.join(index.old_base, "pages", "a___b.md"))
+        self.assert_matches_full_index(index)
+
+        os.remove(os.path.join(self.graph, "pages", "a___b.md"))
+        index.poll()
+        self.assertNotIn("a/b", index.pages.names)
+        self.assert_matches_full_index(index)
+
+    def test_errors(self):
+        self.assertFalse(request(self.socket, {"op": "convert", "page": "no such page"})["ok"])
+        self.assertIn("unknown op", request(self.socket, {"op": "explode"})["error"])
+        self.assertTrue(request(self.socket, {"op": "ping"})["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
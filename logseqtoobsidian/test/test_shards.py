@@ -0,0 +1,87 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+from logseqtoobsidian.shards import (
+    SHARD_MANIFEST,
+    in_shard,
+    merge_shards,
+    parse_shard,
+    shard_of,
+    write_shard_manifest,
+)
+
+
+class TestShards(unittest.TestCase):
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("0/1"), (0, 1))
+        self.assertEqual(parse_shard("3/4"), (3, 4))
+        for value in ["4/4", "-1/4", "1/0", "1", "a/b"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(value)
+
+    def test_shard_of_ignores_graph_location(self):
+        self.assertEqual(
+            shard_of("/mnt/a/graph/pages/foo.md", 7), shard_of("/other/graph/pages/foo.md", 7)
+        )
+
+    def test_every_page_is_in_exactly_one_shard(self):
+        paths = [f"/graph/pages/page {i}.md" for i in range(100)]
+        for path in paths:
+            owners = [i for i in range(4) if in_shard((i, 4), path)]
+            self.assertEqual(len(owners), 1)
+        self.assertTrue(all(in_shard(None, path) for path in paths))
+
+    def write_shard(self, base, shard, files, digest="digest"):
+        for relpath, content in files.items():
+            fpath = os.path.join(base, relpath)
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+            with open(fpath, "w") as f:
+                f.write(content)
+        write_shard_manifest(base, shard, digest)
+
+    def test_merge_shards(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shard0 = os.path.join(tmpdir, "0")
+            shard1 = os.path.join(tmpdir, "1")
+            merged = os.path.join(tmpdir, "merged")
+            self.write_shard(shard0, (0, 2), {"a.md": "a", "attachments/image.png": "image"})
+            self.write_shard(shard1, (1, 2), {"b/c.md": "c", "attachments/image.png": "image"})
+
+            merge_shards([shard1, shard0], merged)
+
+            self.assertTrue(os.path.isfile(os.path.join(merged, "a.md")))
+            self.assertTrue(os.path.isfile(os.path.join(merged, "b", "c.md")))
+            self.assertTrue(os.path.isfile(os.path.join(merged, "attachments", "image.png")))
+            self.assertFalse(os.path.exists(os.path.join(merged, SHARD_MANIFEST)))
+
+    def test_merge_shards_rejects_missing_shard(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shard0 = os.path.join(tmpdir, "0")
+            self.write_shard(shard0, (0, 2), {"a.md": "a"})
+            with self.assertRaises(ValueError):
+                merge_shards([shard0], os.path.join(tmpdir, "merged"))
+
+    def test_merge_shards_rejects_different_page_maps(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shard0 = os.path.join(tmpdir, "0")
+            shard1 = os.path.join(tmpdir, "1")
+            self.write_shard(shard0, (0, 2), {"a.md": "a"}, digest="one")
+            self.write_shard(shard1, (1, 2), {"b.md": "b"}, digest="two")
+            with self.assertRaises(ValueError):
+                merge_shards([shard0, shard1], os.path.join(tmpdir, "merged"))
+
+    def test_merge_shards_rejects_conflicting_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shard0 = os.path.join(tmpdir, "0")
+            shard1 = os.path.join(tmpdir, "1")
+            self.write_shard(shard0, (0, 2), {"attachments/image.png": "one"})
+            self.write_shard(shard1, (1, 2), {"attachments/image.png": "two"})
+            with self.assertRaises(ValueError):
+                merge_shards([shard0, shard1], os.path.join(tmpdir, "merged"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from logseqtoobsidian.__main__ import build_parser, main
+from logseqtoobsidian.convert_notes import probe_page
+from logseqtoobsidian.graph_input import DirectoryGraph
+from logseqtoobsidian.subgraph import select_pages
+
+
+class TestSubgraph(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def convert(self, name, *args):
+        vault = os.path.join(self.tmpdir, name)
+        main(["--logseq", "example/logseq_vault", "--output", vault, *args])
+        tree = {}
+        for dirpath, _, filenames in os.walk(vault):
+            for fname in filenames:
+                fpath = os.path.join(dirpath, fname)
+                with open(fpath, "rb") as f:
+                    tree[os.path.relpath(fpath, vault).replace(os.sep, "/")] = f.read()
+        return tree
+
+    def test_include_and_exclude(self):
+        tree = self.convert("vault", "--include", "leetcode/*", "--exclude", "pages/*BFS.md")
+        self.assertEqual(sorted(tree), ["leetcode/dynamic programming.md"])
+
+    def test_reachable_pages_are_converted_like_in_a_full_run(self):
+        full = self.convert("full")
+        tree = self.convert("vault", "--from_page", "pages/links to aliases.md")
+        self.assertEqual(sorted(tree), ["aliased page.md", "links to aliases.md"])
+        self.assertEqual(tree, {path: full[path] for path in tree})
+
+    def test_links_leaving_the_subgraph(self):
+        tree = self.convert("vault", "--from_page", "links to aliases", "--depth", "0")
+        # Like links to pages that don't exist
+        self.assertEqual(tree, {"links to aliases.md": b"- #other_name\n- #yet_another_name\n- #aliased_page\n"})
+
+    def test_only_selected_pages_are_scanned(self):
+        with mock.patch("logseqtoobsidian.convert_notes.probe_page", wraps=probe_page) as probe:
+            self.convert("vault", "--from_page", "aliased page", "--depth", "3")
+        self.assertEqual(probe.call_count, 1)
+
+    def select(self, graph, *args):
+        """Returns the pages of graph selected by args, and the files read to select them"""
+        args = build_parser().parse_args(["--logseq", graph, "--output", "vault", *args])
+        opened = []
+        open_text = DirectoryGraph.open_text
+
+        def recording_open_text(reader, fpath):
+            opened.append(fpath)
+            return open_text(reader, fpath)
+
+        def recording_open(reader, fpath):
+            opened.append(fpath)
+            return open(fpath, "rb")
+
+        with mock.patch.object(DirectoryGraph, "open_text", recording_open_text), mock.patch.object(
+            DirectoryGraph, "open", recording_open
+        ):
+            selected = select_pages(args, graph, DirectoryGraph(graph))
+        return {os.path.relpath(fpath, graph) for fpath in selected}, {
+            os.path.relpath(fpath, graph) for fpath in opened
+        }
+
+    def test_unreachable_pages_are_never_read(self):
+        graph = os.path.join(self.tmpdir, "graph")
+        os.makedirs(os.path.join(graph, "journals"))
+        os.makedirs(os.path.join(graph, "pages"))
+        for fname, text in [
+            ("a.md", "- [[nick]] [[b]] [[no such page]]\n"),
+            ("b.md", "- [[c]]\n"),
+            ("c.md", "alias:: nick\n- c\n"),
+            ("d.md", "alias:: other\n- [[a]]\n"),
+        ]:
+            with open(os.path.join(graph, "pages", fname), "w") as f:
+                f.write(text)
+        pages = {os.path.join("pages", fname) for fname in ["a.md", "b.md", "c.md"]}
+
+        # The link to nick is followed once c.md, which declares it, is read
+        selected, opened = self.select(graph, "--from_page", "a")
+        self.assertEqual(selected, pages)
+        self.assertEqual(opened, pages)
+
+        # c.md is one link away through its alias, but no page read within one link declares it
+        selected, opened = self.select(graph, "--from_page", "a", "--depth", "1")
+        self.assertEqual(selected, pages - {os.path.join("pages", "c.md")})
+        self.assertNotIn(os.path.join("pages", "d.md"), opened)
+
+        selected, _ = self.select(graph, "--from_page", "a", "--depth", "1", "--scan_aliases")
+        self.assertEqual(selected, pages)
+
+    def test_invalid_selection(self):
+        with self.assertRaises(ValueError):
+            self.convert("depth", "--depth", "1")
+        with self.assertRaises(ValueError):
+            self.convert("missing", "--from_page", "no such page")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from logseqtoobsidian.__main__ import main
+from logseqtoobsidian.verify import verify_vault
+
+
+class TestVerify(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.vault = os.path.join(self.tmpdir, "vault")
+        main(["--logseq", "example/logseq_vault", "--output", self.vault])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, relpath, text):
+        with open(os.path.join(self.vault, relpath), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_converted_vault_has_no_broken_links(self):
+        self.assertEqual(verify_vault(self.vault), {})
+        self.assertEqual(main(["verify", self.vault, "--jobs", "1"]), 0)
+
+    def test_broken_links_are_grouped_by_page(self):
+        self.write(
+            os.path.join("algorithms", "broken.md"),
+            "- [dp](dynamic programming.md) [missing](missing page.md)\n"
+            + "- ![image](attachments/gone.png) [heading](#Heading) [web](https://example.com/a.md)\n"
+            + "- [encoded](dynamic%20programming.md) [parent](../algorithms/dynamic programming.md#top)\n"
+            + "```\n[in code](not checked.md)\n```\n",
+        )
+        self.write("other.md", "- [missing](missing.md)\n")
+        expected = {
+            "algorithms/broken.md": ["missing page.md", "attachments/gone.png"],
+            "other.md": ["missing.md"],
+        }
+
+        for jobs in [1, 2]:
+            self.assertEqual(verify_vault(self.vault, workers=jobs, chunk=2), expected)
+
+        report = os.path.join(self.tmpdir, "report.json")
+        self.assertEqual(main(["verify", self.vault, "--jobs", "2", "--report", report]), 1)
+        with open(report, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
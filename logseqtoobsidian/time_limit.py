@@ -0,0 +1,78 @@
+import contextlib
+import signal
+import threading
+
+
+class PageTimeout(Exception):
+    """Raised when converting a page takes longer than its time limit"""
+
+
+class _TimeLimit:
+    """State of the time limit of the page being converted"""
+
+    __slots__ = ("paused", "expired")
+
+    def __init__(self):
+        self.paused = False
+        # Set if the alarm went off while the time limit was paused
+        self.expired = False
+
+
+# The time limit in force, if any
+_TIME_LIMIT = None
+
+
+@contextlib.contextmanager
+def page_time_limit(seconds: float):
+    """Raises PageTimeout in the code run inside the context if it runs for longer than seconds
+
+    Uses SIGALRM, so pages are only limited when they are converted on the main thread on Unix. Without seconds, or
+    elsewhere, there is no limit
+    """
+    global _TIME_LIMIT
+    if (
+        not seconds
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    limit = _TimeLimit()
+
+    def on_alarm(signum, frame):
+        if limit.paused:
+            limit.expired = True
+        else:
+            raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    previous_limit, _TIME_LIMIT = _TIME_LIMIT, limit
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        _TIME_LIMIT = previous_limit
+
+
+@contextlib.contextmanager
+def page_time_limit_paused():
+    """Stops the clock of the page time limit in force, if any, while the code run inside the context runs, so that it
+    is never interrupted and its time isn't counted. If the page ran out of time just before, PageTimeout is raised
+    right after
+    """
+    limit = _TIME_LIMIT
+    if limit is None or limit.paused or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    limit.paused = True
+    remaining, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+    try:
+        yield
+    finally:
+        limit.paused = False
+        # A timer that had already run out is restarted with the shortest delay, to raise PageTimeout as it would have
+        signal.setitimer(signal.ITIMER_REAL, 1e-6 if limit.expired or remaining <= 0 else remaining)
@@ -0,0 +1,115 @@
+import concurrent.futures
+import logging
+import os
+import posixpath
+import re
+import urllib.parse
+
+from logseqtoobsidian.matching import link_targets
+
+# Targets that aren't files of the vault, eg https://... or mailto:...
+URL_SCHEME = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+# Set in each worker process, so that the paths of the vault are only sent once per worker
+_vault_files = None
+
+
+def vault_files(vault: str) -> set:
+    """Returns the paths of every file of the vault, relative to it and with / separators"""
+    files = set()
+    for dirpath, _, filenames in os.walk(vault):
+        reldir = os.path.relpath(dirpath, vault).replace(os.sep, "/")
+        for fname in filenames:
+            files.add(posixpath.normpath(posixpath.join(reldir, fname)))
+    return files
+
+
+def page_targets(text: str) -> list[str]:
+    """Returns the targets of the links and embeds of a converted page, leaving out those in code blocks"""
+    if "```" not in text:
+        return link_targets(text)
+
+    outside = []
+    in_code = False
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        elif not in_code:
+            outside.append(line)
+    return link_targets("".join(outside))
+
+
+def resolves(target: str, page_dir: str, files: set) -> bool:
+    """Checks if the target of a link in a page of the folder page_dir of the vault is a file of the vault"""
+    target = target.strip()
+    if target.startswith("<") and target.endswith(">"):
+        target = target[1:-1]
+    target = target.split("#", 1)[0]
+    if not target:
+        # A link to a heading of the page itself
+        return True
+
+    candidates = [target]
+    if "%" in target:
+        # Obsidian accepts both raw and %-encoded paths
+        candidates.append(urllib.parse.unquote(target))
+    for candidate in candidates:
+        if page_dir:
+            candidate = page_dir + "/" + candidate
+        if posixpath.normpath(candidate) in files:
+            return True
+    return False
+
+
+def broken_links(vault: str, page_relpath: str, files: set) -> list[str]:
+    """Returns the targets of the links and embeds of a page of the vault that aren't files of the vault"""
+    with open(os.path.join(vault, page_relpath), "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if "](" not in text:
+        return []
+
+    page_dir = posixpath.dirname(page_relpath)
+    checked = {}
+    broken = []
+    for target in page_targets(text):
+        ok = checked.get(target)
+        if ok is None:
+            ok = checked[target] = URL_SCHEME.match(target) is not None or resolves(target, page_dir, files)
+        if not ok:
+            broken.append(target)
+    return broken
+
+
+def _init_worker(files: set):
+    global _vault_files
+    _vault_files = files
+
+
+def _check_pages(vault: str, page_relpaths: list[str]) -> list[tuple[str, list[str]]]:
+    return [(page, broken_links(vault, page, _vault_files)) for page in page_relpaths]
+
+
+def verify_vault(vault: str, workers: int = 1, chunk: int = 256) -> dict:
+    """Checks every link and embed of every page of a converted vault, and returns the broken ones by page
+
+    The files of the vault are listed once, and looking up a target is a set lookup. With more than one worker the
+    pages are checked by a pool of processes, chunk pages at a time
+    """
+    files = vault_files(vault)
+    pages = sorted(path for path in files if path.lower().endswith(".md"))
+    logging.info(f"checking the links of {len(pages)} pages against {len(files)} files")
+
+    chunks = [pages[idx : idx + chunk] for idx in range(0, len(pages), chunk)]
+    results = []
+    if workers <= 1:
+        _init_worker(files)
+        for pages_chunk in chunks:
+            results.extend(_check_pages(vault, pages_chunk))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(files,)
+        ) as pool:
+            for checked in pool.map(_check_pages, [vault] * len(chunks), chunks):
+                results.extend(checked)
+
+    return {page: broken for page, broken in results if broken}